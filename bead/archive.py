@@ -6,8 +6,10 @@ from cached_property import cached_property
 
 from tracelog import TRACELOG
 from .bead import UnpackableBead
+from . import layouts
 from . import meta
 from . import tech
+from . import verification
 
 from .ziparchive import ZipArchive
 from .exceptions import InvalidArchive
@@ -19,6 +21,11 @@ __all__ = ('Archive', 'InvalidArchive')
 
 CACHE_CONTENT_ID = 'content_id'
 CACHE_INPUT_MAP = 'input_map'
+# stamp of the archive file and the archive directories fully verified in it
+CACHE_VERIFIED = 'verified'
+VERIFIED_ZIP_DIRS = 'zip_dirs'
+# archive directories verified separately - meta is verified with any of them
+ALL_ZIP_DIRS = (layouts.Archive.CODE, layouts.Archive.DATA)
 
 
 def _cached_zip_attribute(cache_key: str, ziparchive_attribute):
@@ -63,7 +70,7 @@ class Archive(UnpackableBead):
 
     def save_cache(self):
         try:
-            self.cache_path.write_text(persistence.dumps(self.cache))
+            tech.fs.replace_file(self.cache_path, persistence.dumps(self.cache))
         except FileNotFoundError:
             pass
 
@@ -117,8 +124,91 @@ class Archive(UnpackableBead):
         # need not match
         self.cache.setdefault(CACHE_INPUT_MAP, ziparchive.input_map)
 
-    def validate(self):
-        self.ziparchive.validate()
+    def rebuild_cache(self):
+        '''
+        Refill the cache from the archive - e.g. when it is stale.
+
+        Only the input map is kept, it need not match the archive.
+        '''
+        self.cache = {
+            key: value for key, value in self.cache.items() if key == CACHE_INPUT_MAP}
+        self._check_and_populate_cache(self.ziparchive)
+
+    def validate(self, jobs=None, zip_dirs=None, paranoid=False, level=verification.FULL):
+        '''
+        Verify the archive - see ZipArchive.validate.
+
+        Successful full verifications are recorded in the cache
+        with the verified archive directories, so they are not repeated
+        until the archive file changes, or `paranoid` verification is requested.
+
+        Returns the verification.Cost of the check - None, if it was not needed.
+        '''
+        level = verification.level(level)
+        if not paranoid and self.is_verified_under(zip_dirs):
+            return None
+        cost = self.ziparchive.validate(jobs=jobs, zip_dirs=zip_dirs, level=level)
+        if level == verification.FULL:
+            self._record_verification(ALL_ZIP_DIRS if zip_dirs is None else zip_dirs)
+        return cost
+
+    @property
+    def is_verified(self):
+        '''
+        Has the archive been fully verified in its current form?
+        '''
+        return self.is_verified_under(None)
+
+    def is_verified_under(self, zip_dirs):
+        '''
+        Have the meta and the members under zip_dirs (all, if None) been fully verified
+        in the current form of the archive?
+        '''
+        verified_zip_dirs = self._verified_zip_dirs()
+        if verified_zip_dirs is None:
+            return False
+        return set(map(str, ALL_ZIP_DIRS if zip_dirs is None else zip_dirs)) <= verified_zip_dirs
+
+    def _verified_zip_dirs(self):
+        '''
+        Archive directories verified in the current form of the archive - None if not verified.
+        '''
+        verified = dict(self.cache.get(CACHE_VERIFIED) or {})
+        verified_zip_dirs = verified.pop(VERIFIED_ZIP_DIRS, None)
+        try:
+            if verified_zip_dirs is None or verified != self._verification_stamp():
+                return None
+        except OSError:
+            return None
+        return set(verified_zip_dirs)
+
+    def _verification_stamp(self):
+        stat = os.stat(self.archive_filename)
+        return {
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'inode': stat.st_ino,
+        }
+
+    def _record_verification(self, zip_dirs):
+        try:
+            verified_zip_dirs = (self._verified_zip_dirs() or set()) | set(map(str, zip_dirs))
+            self.cache[CACHE_VERIFIED] = dict(
+                self._verification_stamp(),
+                **{VERIFIED_ZIP_DIRS: sorted(verified_zip_dirs)})
+            self.save_cache()
+        except OSError:
+            # e.g. read only box - we will verify the archive next time as well
+            TRACELOG(f"Could not record verification of {self.archive_filename}")
+
+    def _record_verified_extraction(self, zip_dir):
+        '''
+        Record, that all members under zip_dir have been verified while extracted.
+
+        Recorded only if the meta has been verified before.
+        '''
+        if self._verified_zip_dirs() is not None:
+            self._record_verification([zip_dir])
 
     @property
     def inputs(self):
@@ -127,8 +217,32 @@ class Archive(UnpackableBead):
         except LookupError:
             return self.ziparchive.inputs
 
-    def extract_dir(self, zip_dir, fs_dir):
-        return self.ziparchive.extract_dir(zip_dir, fs_dir)
+    @property
+    def chunk_size(self):
+        return self.ziparchive.chunk_size
+
+    def verify_chunks(self, zip_path, first_chunk=0, last_chunk=None, jobs=None):
+        return self.ziparchive.verify_chunks(zip_path, first_chunk, last_chunk, jobs=jobs)
+
+    def extract_dir(
+            self, zip_dir, fs_dir,
+            verify=False, jobs=None, readonly=False, store=None, selected=None):
+        result = self.ziparchive.extract_dir(
+            zip_dir, fs_dir,
+            verify=verify, jobs=jobs, readonly=readonly, store=store, selected=selected)
+        # files already in the store are not read from the archive
+        if verify and store is None and selected is None:
+            self._record_verified_extraction(zip_dir)
+        return result
+
+    def open_member(self, zip_path):
+        return self.ziparchive.open_member(zip_path)
+
+    def open_data(self, path):
+        return self.ziparchive.open_data(path)
+
+    def iter_data(self, selected=None):
+        return self.ziparchive.iter_data(selected)
 
     def extract_file(self, zip_path, fs_path):
         return self.ziparchive.extract_file(zip_path, fs_path)
@@ -136,8 +250,11 @@ class Archive(UnpackableBead):
     def unpack_code_to(self, fs_dir):
         self.ziparchive.unpack_code_to(fs_dir)
 
-    def unpack_data_to(self, fs_dir):
-        self.ziparchive.unpack_data_to(fs_dir)
+    def unpack_data_to(
+            self, fs_dir, verify=False, jobs=None, readonly=False, store=None, selected=None):
+        self.extract_dir(
+            layouts.Archive.DATA, fs_dir,
+            verify=verify, jobs=jobs, readonly=readonly, store=store, selected=selected)
 
     def unpack_meta_to(self, workspace):
         workspace.meta = self.ziparchive.meta
@@ -51,7 +51,8 @@ class UnpackableBead(Bead, metaclass=ABCMeta):
         self.unpack_meta_to(workspace)
 
     @abstractmethod
-    def unpack_data_to(self, path):
+    def unpack_data_to(
+            self, path, verify=False, jobs=None, readonly=False, store=None, selected=None):
         pass
 
     @abstractmethod
@@ -0,0 +1,172 @@
+'''
+I am creating beads directly in a box, without a workspace.
+
+Code and data files are given as streams, they are hashed and compressed
+on the fly - nothing is written to disk, but the new archive.
+The archive is published into the box only when it is complete.
+
+    with BeadWriter(box, 'name', kind, inputs) as writer:
+        writer.add_data('result.csv', rows_as_bytes_iterator)
+        writer.add_code('generator.py', source_bytes)
+    bead = writer.archive
+'''
+
+import contextlib
+import os
+import secrets
+
+from .archive import Archive
+from .box import ARCHIVE_COMMENT
+from . import layouts
+from . import tech
+from . import zipcreator
+from . import zipindex
+
+timestamp = tech.timestamp.timestamp
+
+
+def _member_path(directory, path):
+    '''
+    Archive path of the file path relative to directory.
+    '''
+    parts = str(path).replace('\\', '/').split('/')
+    if str(path).startswith('/') or not path or any(part in ('', '.', '..') for part in parts):
+        raise ValueError(f'Invalid file path {path!r}: must be relative, without . or ..')
+    return directory / '/'.join(parts)
+
+
+def _create_partial_file(directory, name):
+    '''
+    Create a new, empty file for the archive under construction.
+
+    Unlike with tempfile.mkstemp, the mode honours the umask,
+    as the file becomes the bead in the box.
+    '''
+    while True:
+        path = directory / f'.{name}_{secrets.token_hex(8)}.partial'
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+        except FileExistsError:
+            continue
+        os.close(fd)
+        return path
+
+
+def _publish(temp_path, archive_path):
+    try:
+        # does not replace an existing bead, unlike rename
+        os.link(temp_path, archive_path)
+    except FileExistsError:
+        raise
+    except OSError:
+        # no hard links on the box's file system
+        if os.path.exists(archive_path):
+            raise FileExistsError(archive_path)
+        os.rename(temp_path, archive_path)
+    else:
+        os.remove(temp_path)
+
+
+class BeadWriter:
+    '''
+    Writer of a new bead into a box.
+
+    `inputs` are meta.InputSpec-s, `input_map` maps input names to bead names.
+
+    The bead is published at `commit()` (or at the end of a with block).
+    Without a commit (or in case of an exception in the with block)
+    nothing remains in the box.
+    '''
+
+    def __init__(self, box, name, kind, inputs=(), input_map=None, freeze_time=None):
+        self.box = box
+        self.name = name
+        self.kind = kind
+        self.inputs = tuple(inputs)
+        self.input_map = dict(input_map or {})
+        self.freeze_time = freeze_time
+        self.archive_path = None
+        self._creator = zipcreator.ZipCreator()
+        self._exit_stack = contextlib.ExitStack()
+        # why the archive can not be completed
+        self._failure = None
+        self._temp_path = _create_partial_file(box.directory, name)
+        try:
+            self._exit_stack.enter_context(
+                self._creator.writing(self._temp_path, ARCHIVE_COMMENT))
+        except:
+            os.remove(self._temp_path)
+            raise
+
+    def add_data(self, path, content, size=None):
+        '''
+        Add output file `path` with content given as bytes, a binary file or an iterable of bytes.
+
+        Give the `size` of streamed content, if known: content of unknown size
+        is spooled to a temporary file for hashing.
+        '''
+        self._add_stream(_member_path(layouts.Archive.DATA, path), content, size)
+
+    def add_code(self, path, content, size=None):
+        '''
+        Add code file `path` - like `add_data`.
+        '''
+        self._add_stream(_member_path(layouts.Archive.CODE, path), content, size)
+
+    def _add_stream(self, zip_path, content, size):
+        try:
+            self._creator.add_stream(zip_path, content, size)
+        except Exception as e:
+            # the member might have been (partially) written without its manifest entry
+            self._failure = e
+            raise
+
+    def commit(self):
+        '''
+        Complete the archive and publish it in the box.
+
+        Raises FileExistsError, if the box already has the bead,
+        and ValueError, if adding a file failed before.
+        '''
+        freeze_time = self.freeze_time or timestamp()
+        try:
+            if self._failure is not None:
+                raise ValueError('Can not commit incomplete bead', self.name) from self._failure
+            self._creator.add_meta(
+                self.kind, self.inputs, self.name, self.input_map, freeze_time)
+            self._exit_stack.close()
+            archive_path = self.box.directory / f'{self.name}_{freeze_time}.zip'
+            _publish(self._temp_path, archive_path)
+        except:
+            self.abort()
+            raise
+        self.archive_path = archive_path
+        zipindex.try_write_index(archive_path)
+        self.box.add_to_index(archive_path)
+        return archive_path
+
+    def abort(self):
+        '''
+        Discard the unfinished archive.
+        '''
+        try:
+            self._exit_stack.close()
+        except Exception:
+            # the archive is discarded anyway
+            pass
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(self._temp_path)
+
+    @property
+    def archive(self):
+        assert self.archive_path is not None, 'not committed'
+        return Archive(self.archive_path, self.box.name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
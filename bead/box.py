@@ -14,12 +14,21 @@ Boxes can be used to:
   (this is naive access control, but could work)
 '''
 
+from bisect import bisect_left, bisect_right
 from datetime import datetime, timedelta
 from glob import iglob, escape as glob_escape
+import functools
+import heapq
 import os
+import re
+import time
 from typing import Iterator, Iterable, Sequence
 
+from tracelog import TRACELOG
+
 from .archive import Archive, InvalidArchive
+from .boxindex import BoxIndex, UnavailableIndex
+from .boxindex import utc_microseconds, time_from_utc_microseconds
 from . import spec as bead_spec
 from .tech.timestamp import time_from_timestamp
 from .import tech
@@ -107,6 +116,8 @@ class Box:
     def __init__(self, name=None, location=None):
         self.location = location
         self.name = name
+        # bead name -> (directory modification time, Timeline)
+        self._timelines = {}
 
     @property
     def directory(self):
@@ -122,18 +133,44 @@ class Box:
         for bead in self._beads(query):
             return bead
 
+    def find_by_content_id(self, content_id) -> Iterator[Archive]:
+        '''
+        Beads with content id (prefix) `content_id` - whatever their name.
+        '''
+        return iter(self._beads([(bead_spec.CONTENT_ID, content_id)]))
+
     def all_beads(self) -> Iterator[Archive]:
         '''
         Iterator for all beads in this Box
         '''
         return iter(self._beads([]))
 
+    @property
+    def index(self):
+        return BoxIndex(self.directory)
+
     def _beads(self, conditions) -> Iterable[Archive]:
         '''
         Retrieve matching beads.
         '''
-        match = compile_conditions(conditions)
+        try:
+            paths = self._indexed_paths(conditions)
+        except UnavailableIndex:
+            return self._scanned_beads(conditions)
+        return self._archives_from(paths)
+
+    def _indexed_paths(self, conditions):
+        try:
+            file_names = self.index.file_names(conditions)
+        except UnavailableIndex as e:
+            TRACELOG(f'Box index is not available, scanning the box directory: {e}')
+            raise
+        return [self.directory / file_name for file_name in file_names]
 
+    def _scanned_paths(self, conditions):
+        '''
+        Paths of candidate files for beads matching conditions - without an index.
+        '''
         bead_names = set(
             value
             for tag, value in conditions
@@ -147,11 +184,36 @@ class Box:
         else:
             glob = '*'
 
-        paths = iglob(Path(glob_escape(self.directory)) / glob)
-        beads = self._archives_from(paths)
+        return iglob(Path(glob_escape(self.directory)) / glob)
+
+    def _scanned_beads(self, conditions) -> Iterable[Archive]:
+        '''
+        Retrieve matching beads - without an index.
+        '''
+        match = compile_conditions(conditions)
+        beads = self._archives_from(self._scanned_paths(conditions))
         candidates = (bead for bead in beads if match(bead))
         return candidates
 
+    def _bead_files(self, conditions) -> Iterator['BeadFile']:
+        '''
+        Retrieve matching beads - without opening the ones with standard file names.
+        '''
+        try:
+            paths = self._indexed_paths(conditions)
+        except UnavailableIndex:
+            if any(tag != bead_spec.BEAD_NAME for tag, _ in conditions):
+                # only names can be matched without opening the archives
+                yield from map(BeadFile.from_archive, self._scanned_beads(conditions))
+                return
+            paths = self._scanned_paths(conditions)
+        for path in paths:
+            freeze_time = freeze_time_from_file_name(path)
+            if freeze_time is not None:
+                yield BeadFile(path, self.name, freeze_time)
+            else:
+                yield from map(BeadFile.from_archive, self._archives_from([path]))
+
     def _archives_from(self, paths):
         for path in paths:
             try:
@@ -167,8 +229,18 @@ class Box:
         zipfilename = (
             self.directory / f'{workspace.name}_{freeze_time}.zip')
         workspace.pack(zipfilename, freeze_time=freeze_time, comment=ARCHIVE_COMMENT)
+        self.add_to_index(zipfilename)
         return zipfilename
 
+    def add_to_index(self, path):
+        '''
+        Add the new archive at path to the box index (if the box has one).
+        '''
+        try:
+            self.index.add(path)
+        except UnavailableIndex as e:
+            TRACELOG(f'Could not index {path}: {e}')
+
     def find_names(self, kind, content_id, timestamp):
         '''
         -> (exact_match, best_guess, best_guess_freeze_time, names)
@@ -179,13 +251,7 @@ class Box:
             names                  = sequence of names (kind matched)
         '''
         assert isinstance(timestamp, datetime)
-        try:
-            filenames = os.listdir(self.directory)
-        except FileNotFoundError:
-            filenames = []
-        paths = (self.directory / fname for fname in filenames)
-        beads = self._archives_from(paths)
-        candidates = (bead for bead in beads if bead.kind == kind)
+        candidates = self._beads([(bead_spec.KIND, kind)])
 
         exact_match            = None
         best_guess             = None
@@ -216,11 +282,67 @@ class Box:
 
         return exact_match, best_guess, best_guess_freeze_time, names
 
+    def timeline(self, name) -> 'Timeline':
+        '''
+        Versions of bead `name` - kept until the box directory changes.
+        '''
+        try:
+            directory_mtime_ns = os.stat(self.directory).st_mtime_ns
+        except OSError:
+            directory_mtime_ns = None
+        cached_mtime_ns, timeline = self._timelines.get(name, (None, None))
+        if directory_mtime_ns is None or cached_mtime_ns != directory_mtime_ns:
+            timeline = Timeline(self._timeline_files(name))
+            # changes within the file system's timestamp resolution would go unnoticed
+            if time.time_ns() - (directory_mtime_ns or 0) > tech.fs.RACY_WINDOW_NS:
+                self._timelines[name] = (directory_mtime_ns, timeline)
+        return timeline
+
+    def _timeline_files(self, name):
+        try:
+            timeline = self.index.timeline(name)
+        except UnavailableIndex:
+            return self._bead_files([(bead_spec.BEAD_NAME, name)])
+        return [
+            BeadFile(self.directory / file_name, self.name, time_from_utc_microseconds(key))
+            for key, file_name in timeline]
+
+    def beads_between(self, name, start, end) -> Iterator[Archive]:
+        '''
+        Versions of bead `name` frozen between start and end (inclusive), in time order.
+        '''
+        for bead_file in self.timeline(name).between(start, end):
+            try:
+                yield bead_file.archive
+            except InvalidArchive:
+                pass
+
     def get_context(self, check_type, check_param, time):
         # in theory timestamps can be [intentionally] duplicated, but let's
         # treat that as an error condition to be fixed ASAP
         conditions = [(check_type, check_param)]
-        return make_context(time, self._beads(conditions))
+        # candidates are compared by the freeze times in their file names (or index),
+        # only the best one is opened - and checked against its file name
+        if check_type == bead_spec.BEAD_NAME:
+            context = self.timeline(check_param).context(time)
+        else:
+            context = make_context(time, self._bead_files(conditions))
+        try:
+            context.best
+        except InvalidArchive as e:
+            TRACELOG(f'Bead file names are not reliable, opening all candidates: {e}')
+            return self.get_opened_context(check_type, check_param, time)
+        # prev and next are opened only when accessed
+        context.get_opened_context = functools.partial(
+            self.get_opened_context, check_type, check_param, time)
+        return context
+
+    def get_opened_context(self, check_type, check_param, time):
+        '''
+        Context from opened candidates - not relying on file names.
+        '''
+        beads = self._beads([(check_type, check_param)])
+        return make_context(time, map(BeadFile.from_archive, beads))
 
 
 class UnionBox:
@@ -228,10 +350,53 @@ class UnionBox:
         self.boxes = tuple(boxes)
 
     def get_context(self, check_type, check_param, time):
+        context = self._merged_context(Box.get_context, check_type, check_param, time)
+        try:
+            context.best
+        except InvalidArchive as e:
+            TRACELOG(f'Bead file names are not reliable, opening all candidates: {e}')
+            return self._merged_context(Box.get_opened_context, check_type, check_param, time)
+        # prev and next are opened only when accessed
+        context.get_opened_context = functools.partial(
+            self._merged_context, Box.get_opened_context, check_type, check_param, time)
+        return context
+
+    def find_bead(self, name, content_id):
+        '''
+        Bead `name` with content id (prefix) `content_id` from the first box having it.
+
+        Falls back to beads with the content id under other names - the bead might
+        have been renamed.
+        '''
+        for box in self.boxes:
+            bead = box.find_bead(name, content_id)
+            if bead:
+                return bead
+        if content_id:
+            for bead in self.find_by_content_id(content_id):
+                return bead
+
+    def find_by_content_id(self, content_id) -> Iterator[Archive]:
+        '''
+        Beads with content id (prefix) `content_id` in all boxes - whatever their name.
+        '''
+        for box in self.boxes:
+            yield from box.find_by_content_id(content_id)
+
+    def beads_between(self, name, start, end) -> Iterator[Archive]:
+        '''
+        Versions of bead `name` frozen between start and end (inclusive) in all boxes,
+        in time order.
+        '''
+        return heapq.merge(
+            *(box.beads_between(name, start, end) for box in self.boxes),
+            key=lambda bead: bead.freeze_time)
+
+    def _merged_context(self, get_box_context, check_type, check_param, time):
         context = None
         for box in self.boxes:
             try:
-                box_context = box.get_context(check_type, check_param, time)
+                box_context = get_box_context(box, check_type, check_param, time)
             except LookupError:
                 continue
             else:
@@ -253,33 +418,160 @@ class UnionBox:
             yield from box.all_beads()
 
 
+# beadname_20170615T075813302092+0200.zip
+_FREEZE_TIME_IN_FILE_NAME = re.compile(r'_([0-9]{8}T[0-9]{12}[-+][0-9]{4})[.]zip$')
+
+
+def freeze_time_from_file_name(path):
+    '''
+    Freeze time encoded in the file name of a bead - None for non-standard names.
+    '''
+    match = _FREEZE_TIME_IN_FILE_NAME.search(os.path.basename(path))
+    if match is None:
+        return None
+    try:
+        return time_from_timestamp(match.group(1))
+    except ValueError:
+        return None
+
+
+class BeadFile:
+    '''
+    A bead in a box with a known freeze time - the archive is opened only when needed.
+
+    Raises InvalidArchive when opened, if the archive is invalid
+    or its freeze time is not the expected one.
+    '''
+
+    def __init__(self, path, box_name, freeze_time):
+        self.path = path
+        self.box_name = box_name
+        self.freeze_time = freeze_time
+        self._archive = None
+
+    @classmethod
+    def from_archive(cls, archive):
+        bead_file = cls(archive.archive_filename, archive.box_name, archive.freeze_time)
+        bead_file._archive = archive
+        return bead_file
+
+    @property
+    def archive(self) -> Archive:
+        if self._archive is None:
+            archive = Archive(self.path, self.box_name)
+            if archive.freeze_time != self.freeze_time:
+                raise InvalidArchive(
+                    self.path, 'Freeze time disagrees with file name', archive.freeze_time_str)
+            self._archive = archive
+        return self._archive
+
+    @property
+    def content_id(self):
+        return self.archive.content_id
+
+
+def _archive_of(bead_file):
+    return bead_file.archive if bead_file else None
+
+
 class BeadContext:
+    '''
+    Beads of a query at, right before and right after time.
+
+    The archives are opened only when accessed.
+    '''
+
     def __init__(self, time, bead, prev, next):
         assert bead is None or bead.freeze_time == time
         assert prev is None or prev.freeze_time < time
         assert next is None or next.freeze_time > time
         assert bead or prev or next
         self.time = time
-        self.bead = bead
-        self.prev = prev
-        self.next = next
+        self.bead_file = bead
+        self.prev_file = prev
+        self.next_file = next
+        # -> context from opened candidates, for when a file is not what its name says
+        self.get_opened_context = None
+        self._opened_context = None
+
+    @property
+    def bead(self):
+        return self._archive('bead_file')
+
+    @property
+    def prev(self):
+        return self._archive('prev_file')
+
+    @property
+    def next(self):
+        return self._archive('next_file')
+
+    def _archive(self, file_attribute):
+        try:
+            return _archive_of(getattr(self, file_attribute))
+        except InvalidArchive as e:
+            if self.get_opened_context is None:
+                raise
+            TRACELOG(f'Bead file names are not reliable, opening all candidates: {e}')
+            if self._opened_context is None:
+                self._opened_context = self.get_opened_context()
+            return _archive_of(getattr(self._opened_context, file_attribute))
+
+    @property
+    def best_file(self):
+        if self.bead_file:
+            return self.bead_file
+        if not self.prev_file:
+            return self.next_file
+        if not self.next_file:
+            return self.prev_file
+        if self.time - self.prev_file.freeze_time < self.next_file.freeze_time - self.time:
+            return self.prev_file
+        return self.next_file
 
     @property
     def best(self):
-        if self.bead:
-            return self.bead
-        if not self.prev:
-            return self.next
-        if not self.next:
-            return self.prev
-        if self.time - self.prev.freeze_time < self.next.freeze_time - self.time:
-            return self.prev
-        return self.next
-
-
-def make_context(time, beads):
+        return self._archive('best_file')
+
+
+class Timeline:
+    '''
+    Versions of a bead ordered by freeze time - for binary searches by time.
+    '''
+
+    def __init__(self, bead_files: Iterable[BeadFile]):
+        bead_files = [(utc_microseconds(f.freeze_time), f) for f in bead_files]
+        bead_files.sort(key=lambda key_file: key_file[0])
+        self.keys = [key for key, _ in bead_files]
+        self.bead_files = [bead_file for _, bead_file in bead_files]
+
+    def __len__(self):
+        return len(self.keys)
+
+    def context(self, time) -> BeadContext:
+        '''
+        Context of the versions at, right before and right after time.
+
+        Raises LookupError if there are no versions.
+        '''
+        key = utc_microseconds(time)
+        start = bisect_left(self.keys, key)
+        end = bisect_right(self.keys, key, lo=start)
+        candidates = self.bead_files[max(start - 1, 0):end + 1]
+        return make_context(time, candidates)
+
+    def between(self, start, end):
+        '''
+        Versions frozen between start and end (inclusive).
+        '''
+        first = bisect_left(self.keys, utc_microseconds(start))
+        last = bisect_right(self.keys, utc_microseconds(end))
+        return self.bead_files[first:last]
+
+
+def make_context(time, bead_files):
     match, prev, next = None, None, None
-    for bead in beads:
+    for bead in bead_files:
         if bead.freeze_time < time:
             if prev is None or prev.freeze_time < bead.freeze_time:
                 prev = bead
@@ -303,8 +595,8 @@ def merge_contexts(context1, context2):
         return context1
     assert context1.time == context2.time
     time = context1.time
-    beads = (
-        context1.bead, context1.prev, context1.next,
-        context2.bead, context2.prev, context2.next)
-    beads = (bead for bead in beads if bead)
-    return make_context(time, beads)
+    bead_files = (
+        context1.bead_file, context1.prev_file, context1.next_file,
+        context2.bead_file, context2.prev_file, context2.next_file)
+    bead_files = (bead_file for bead_file in bead_files if bead_file)
+    return make_context(time, bead_files)
@@ -0,0 +1,385 @@
+'''
+I am an index of the beads in a box directory, kept in an SQLite database in the box.
+
+Queries by name, kind or content id prefix are answered by the index,
+without opening any archive.
+
+The index is created by `bead box reindex` (`BoxIndex.refresh`),
+boxes without an index are scanned by the queries - they do not build it.
+
+An existing index is brought up to date with the directory before queries:
+files are identified by their stat (size, modification time) and the stat
+of their .xmeta cache, so only new or changed archives are opened.
+The whole directory is not even listed, if its modification time has not changed
+since the last refresh.
+Changes are committed in batches, so that other processes can use the index meanwhile
+and an interrupted refresh keeps its work.
+
+Files, that are not valid archives, are remembered as such,
+so that they are not opened again until they change.
+
+Opening an archive is cheap, if it has an up-to-date .xmeta cache -
+these (and the member indexes) are created in bulk by `reindex_archives`.
+'''
+
+from concurrent.futures import ProcessPoolExecutor
+import contextlib
+from datetime import datetime, timedelta, timezone
+import os
+import sqlite3
+import time
+from typing import Iterator, Optional
+
+import attr
+from tracelog import TRACELOG
+
+from .archive import Archive
+from .exceptions import InvalidArchive
+from . import meta
+from . import spec as bead_spec
+from . import tech
+from . import zipindex
+
+parallel = tech.parallel
+persistence = tech.persistence
+
+INDEX_FILE = '.bead-index.sqlite'
+SCHEMA_VERSION = 1
+
+# sidecar files of archives - never archives themselves
+XMETA_SUFFIX = '.xmeta'
+SIDECAR_SUFFIXES = (XMETA_SUFFIX, zipindex.INDEX_SUFFIX)
+
+# archives indexed in a transaction by a refresh
+REFRESH_BATCH_SIZE = 100
+
+SCHEMA = '''
+CREATE TABLE beads (
+    file_name TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    xmeta_mtime_ns INTEGER,
+    -- NULL for invalid archives
+    name TEXT,
+    kind TEXT,
+    content_id TEXT,
+    freeze_time_str TEXT,
+    -- UTC microseconds since the epoch
+    freeze_time INTEGER,
+    inputs TEXT,
+    input_map TEXT
+);
+CREATE INDEX beads_by_name ON beads (name, freeze_time);
+CREATE INDEX beads_by_kind ON beads (kind, freeze_time);
+CREATE INDEX beads_by_content_id ON beads (content_id);
+CREATE TABLE state (
+    key TEXT PRIMARY KEY,
+    value
+);
+'''
+
+DIRECTORY_MTIME_NS = 'directory_mtime_ns'
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+class UnavailableIndex(Exception):
+    '''The index can not be used (e.g. the box is read only)'''
+
+
+def utc_microseconds(timestamp):
+    '''
+    Integer key of a datetime, that orders as the times.
+    '''
+    return (timestamp - EPOCH) // timedelta(microseconds=1)
+
+
+def time_from_utc_microseconds(key):
+    return EPOCH + timedelta(microseconds=key)
+
+
+def _content_id_prefix_range(prefix):
+    # all strings starting with prefix are in [prefix, prefix + max code point)
+    return prefix, prefix + '\U0010ffff'
+
+
+def _condition(check_type, check_param):
+    '''
+    SQL condition and its parameters for a (check-type, check-param) query condition.
+    '''
+    if check_type == bead_spec.BEAD_NAME:
+        return 'name = ?', (check_param,)
+    if check_type == bead_spec.KIND:
+        return 'kind = ?', (check_param,)
+    if check_type == bead_spec.CONTENT_ID:
+        return 'content_id >= ? AND content_id < ?', _content_id_prefix_range(check_param)
+    raise ValueError('Unknown query condition', check_type)
+
+
+def _inputs_json(inputs):
+    return persistence.dumps({
+        input.name: {
+            meta.INPUT_KIND: input.kind,
+            meta.INPUT_CONTENT_ID: input.content_id,
+            meta.INPUT_FREEZE_TIME: input.freeze_time_str}
+        for input in inputs})
+
+
+class BoxIndex:
+
+    def __init__(self, directory):
+        self.directory = tech.fs.Path(directory)
+        self.path = self.directory / INDEX_FILE
+
+    @contextlib.contextmanager
+    def _database(self, create=False):
+        '''
+        Connection to the index in a transaction - concurrent users are serialized.
+
+        The index is (re)created only with `create`, otherwise a missing or outdated index
+        is UnavailableIndex.
+        '''
+        if not create and not os.path.exists(self.path):
+            raise UnavailableIndex(self.path, 'no index, create it with `bead box reindex`')
+        try:
+            db = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        except sqlite3.Error as e:
+            raise UnavailableIndex(self.path, e)
+        try:
+            # keep the journal file, so that transactions do not change the directory
+            db.execute('PRAGMA journal_mode = PERSIST')
+            db.execute('BEGIN IMMEDIATE')
+            if db.execute('PRAGMA user_version').fetchone()[0] != SCHEMA_VERSION:
+                if not create:
+                    raise UnavailableIndex(
+                        self.path, 'outdated index, recreate it with `bead box reindex`')
+                self._create_schema(db)
+            yield db
+            db.execute('COMMIT')
+        except (sqlite3.Error, OSError) as e:
+            raise UnavailableIndex(self.path, e)
+        finally:
+            # rolls back unfinished transactions
+            db.close()
+
+    def _create_schema(self, db):
+        db.execute('DROP TABLE IF EXISTS beads')
+        db.execute('DROP TABLE IF EXISTS state')
+        for statement in SCHEMA.split(';'):
+            if statement.strip():
+                db.execute(statement)
+        db.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+    def file_names(self, conditions):
+        '''
+        Names of the files of valid archives matching all of the (check-type, check-param)
+        conditions - after bringing the index up to date.
+        '''
+        where = ['name IS NOT NULL']
+        parameters = []
+        for sql, sql_parameters in (_condition(*condition) for condition in conditions):
+            where.append(f'({sql})')
+            parameters.extend(sql_parameters)
+        with self._database() as db:
+            self._refresh(db)
+            return [
+                file_name
+                for file_name, in db.execute(
+                    f'SELECT file_name FROM beads WHERE {" AND ".join(where)}'
+                    ' ORDER BY file_name',
+                    parameters)]
+
+    def timeline(self, name):
+        '''
+        [(freeze time key, file name)] of the valid archives of bead `name`
+        ordered by freeze time - after bringing the index up to date.
+
+        Freeze time keys are UTC microseconds, see `utc_microseconds`.
+        '''
+        with self._database() as db:
+            self._refresh(db)
+            return db.execute(
+                'SELECT freeze_time, file_name FROM beads WHERE name = ?'
+                ' ORDER BY freeze_time, file_name',
+                (name,)).fetchall()
+
+    def refresh(self):
+        '''
+        Bring the index up to date with the box directory - creating it if needed.
+        '''
+        with self._database(create=True) as db:
+            self._refresh(db)
+
+    def add(self, path):
+        '''
+        Index (or reindex) the archive at path - a file in the box directory.
+        '''
+        with self._database() as db:
+            stats = {
+                file_name: os.stat(self.directory / file_name)
+                for file_name in _existing(self.directory, path)}
+            self._index(db, os.path.basename(path), stats)
+
+    def _refresh(self, db):
+        directory_mtime_ns = os.stat(self.directory).st_mtime_ns
+        if self._get_state(db, DIRECTORY_MTIME_NS) == directory_mtime_ns:
+            return
+        refresh_start_ns = time.time_ns()
+        stats = _directory_stats(self.directory)
+        indexed = {
+            file_name: stamp
+            for file_name, *stamp in db.execute(
+                'SELECT file_name, size, mtime_ns, xmeta_mtime_ns FROM beads')}
+        archive_names = _archive_names(stats)
+        changed = [
+            file_name
+            for file_name in archive_names
+            if indexed.get(file_name) != _stamp(file_name, stats)]
+        for count, file_name in enumerate(changed, 1):
+            self._index(db, file_name, stats)
+            if count % REFRESH_BATCH_SIZE == 0:
+                db.execute('COMMIT')
+                db.execute('BEGIN IMMEDIATE')
+        removed = indexed.keys() - set(archive_names)
+        db.executemany('DELETE FROM beads WHERE file_name = ?', ((name,) for name in removed))
+        # a directory modified just before might be listed again on the next refresh
+        if refresh_start_ns - directory_mtime_ns > tech.fs.RACY_WINDOW_NS:
+            self._set_state(db, DIRECTORY_MTIME_NS, directory_mtime_ns)
+        else:
+            self._set_state(db, DIRECTORY_MTIME_NS, None)
+        TRACELOG(
+            f'{self.directory}: {len(archive_names)} files,'
+            f' indexed {len(changed)}, removed {len(removed)}')
+
+    def _index(self, db, file_name, stats):
+        path = self.directory / file_name
+        size, mtime_ns, xmeta_mtime_ns = _stamp(file_name, stats)
+        try:
+            archive = Archive(path)
+            row = (
+                archive.name,
+                archive.kind,
+                archive.content_id,
+                archive.freeze_time_str,
+                utc_microseconds(archive.freeze_time),
+                _inputs_json(archive.inputs),
+                persistence.dumps(archive.input_map))
+        except InvalidArchive:
+            row = (None,) * 7
+        db.execute(
+            'INSERT OR REPLACE INTO beads VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (file_name, size, mtime_ns, xmeta_mtime_ns) + row)
+
+    def _get_state(self, db, key):
+        for value, in db.execute('SELECT value FROM state WHERE key = ?', (key,)):
+            return value
+
+    def _set_state(self, db, key, value):
+        db.execute('INSERT OR REPLACE INTO state VALUES (?, ?)', (key, value))
+
+
+def _xmeta_name(file_name):
+    return os.path.splitext(file_name)[0] + XMETA_SUFFIX
+
+
+def _stamp(file_name, stats):
+    stat = stats[file_name]
+    xmeta_stat = stats.get(_xmeta_name(file_name))
+    return [stat.st_size, stat.st_mtime_ns, xmeta_stat and xmeta_stat.st_mtime_ns]
+
+
+def _existing(directory, path):
+    file_name = os.path.basename(path)
+    for name in (file_name, _xmeta_name(file_name)):
+        if os.path.exists(directory / name):
+            yield name
+
+
+def _directory_stats(directory):
+    '''
+    Stats of the regular files in directory by their names.
+    '''
+    stats = {}
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            try:
+                if entry.is_file():
+                    stats[entry.name] = entry.stat()
+            except FileNotFoundError:
+                pass
+    return stats
+
+
+def _archive_names(stats):
+    return [
+        file_name for file_name in stats
+        if not file_name.startswith('.') and not file_name.endswith(SIDECAR_SUFFIXES)]
+
+
+def _has_current_sidecars(directory, file_name, stats):
+    xmeta_stat = stats.get(_xmeta_name(file_name))
+    return (
+        xmeta_stat is not None
+        and xmeta_stat.st_mtime_ns >= stats[file_name].st_mtime_ns
+        and zipindex.has_current_index(directory / file_name))
+
+
+def archives_to_reindex(directory):
+    '''
+    Names of the files in directory without up-to-date .xmeta cache and member index.
+    '''
+    directory = tech.fs.Path(directory)
+    stats = _directory_stats(directory)
+    return sorted(
+        file_name
+        for file_name in _archive_names(stats)
+        if not _has_current_sidecars(directory, file_name, stats))
+
+
+@attr.s(auto_attribs=True, frozen=True)
+class ReindexResult:
+    path: str
+    size: int
+    # why the file is not a valid archive - None for valid archives
+    error: Optional[str] = None
+
+
+def reindex_archive(path) -> ReindexResult:
+    '''
+    Create the .xmeta cache and member index of the archive at path.
+
+    Both are replaced atomically, so an interrupted reindex leaves no partial files.
+    '''
+    try:
+        size = os.path.getsize(path)
+    except OSError as e:
+        return ReindexResult(path, 0, str(e))
+    try:
+        archive = Archive(path)
+        # the cache is stale, if the archive was replaced
+        archive.rebuild_cache()
+        archive.save_cache()
+        zipindex.write_index(path)
+    except InvalidArchive as e:
+        details = ''.join(f', {arg}' for arg in e.args[1:])
+        return ReindexResult(path, size, f'not a valid bead archive{details}')
+    except OSError as e:
+        return ReindexResult(path, size, str(e))
+    except Exception as e:
+        # e.g. missing meta members - one bad file must not stop a reindex
+        return ReindexResult(path, size, f'not a valid bead archive, {e!r}')
+    return ReindexResult(path, size)
+
+
+def reindex_archives(paths, jobs=None) -> Iterator[ReindexResult]:
+    '''
+    Reindex archives by `jobs` processes in parallel (see `tech.parallel.jobs` for the default).
+
+    Results are yielded as the archives are done, in order.
+    '''
+    jobs = parallel.jobs(jobs)
+    if jobs == 1:
+        yield from map(reindex_archive, paths)
+        return
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        yield from executor.map(reindex_archive, paths, chunksize=16)
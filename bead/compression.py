@@ -0,0 +1,199 @@
+'''
+I am deciding how to compress archive members.
+
+Compression methods are given as specs: a method name optionally followed by
+a compression level, e.g. 'stored', 'deflated', 'deflated:1', 'bz2:9', 'lzma'.
+
+A workspace can configure its compression policy in layouts.Workspace.COMPRESSION:
+
+{
+    "method": "deflated:6",
+    "probe": true,
+    "rules": {
+        ".csv": "lzma",
+        ".parquet": "stored"
+    }
+}
+
+where "method" is the default method, "probe" enables storing members, whose
+first block does not compress, and "rules" gives methods by file extension.
+All keys are optional.
+
+The default method can be overridden with the BEAD_ZIP_COMPRESSION environment variable.
+'''
+
+import os
+import threading
+import zipfile
+import zlib
+
+import attr
+
+from . import layouts
+from . import tech
+
+persistence = tech.persistence
+
+COMPRESSION_ENV_VAR = 'BEAD_ZIP_COMPRESSION'
+
+COMPRESS_TYPES = {
+    'stored': zipfile.ZIP_STORED,
+    'off': zipfile.ZIP_STORED,
+    'deflated': zipfile.ZIP_DEFLATED,
+    'bz2': zipfile.ZIP_BZIP2,
+    'lzma': zipfile.ZIP_LZMA,
+}
+
+LEVELS = {
+    zipfile.ZIP_DEFLATED: range(0, 10),
+    zipfile.ZIP_BZIP2: range(1, 10),
+}
+
+# config keys
+METHOD = 'method'
+PROBE = 'probe'
+RULES = 'rules'
+
+# already compressed formats - compressing them again is a waste of time
+INCOMPRESSIBLE_EXTENSIONS = (
+    '.gz', '.tgz', '.bz2', '.xz', '.lz4', '.zst', '.zip', '.7z', '.rar', '.jar', '.whl',
+    '.png', '.jpg', '.jpeg', '.gif', '.webp', '.mp3', '.mp4', '.mkv', '.mov', '.avi',
+    '.parquet', '.orc')
+
+_HAS_COMPRESS_LEVEL = hasattr(zipfile.ZipInfo, 'compress_level')
+
+# members smaller than this are not probed
+PROBE_MIN_SIZE = 4096
+# members, whose first block compresses worse than this ratio are stored
+PROBE_MAX_RATIO = 0.95
+
+
+@attr.s(auto_attribs=True, frozen=True)
+class Method:
+    spec: str
+    compress_type: int
+    level: int = None
+
+    def apply(self, zipinfo):
+        zipinfo.compress_type = self.compress_type
+        if _HAS_COMPRESS_LEVEL:
+            zipinfo.compress_level = self.level
+        else:
+            # ZipInfo.compress_level is public only from Python 3.13,
+            # before that ZipFile.open(zipinfo, 'w') uses this attribute
+            zipinfo._compresslevel = self.level
+
+
+def parse_method(spec):
+    '''
+    Method from its spec - raises ValueError on invalid specs.
+    '''
+    name, _, level = spec.partition(':')
+    try:
+        compress_type = COMPRESS_TYPES[name]
+    except KeyError:
+        raise ValueError(f'Unknown compression method: {spec!r}')
+    if not level:
+        return Method(spec, compress_type)
+    try:
+        level = int(level)
+    except ValueError:
+        raise ValueError(f'Invalid compression level: {spec!r}')
+    if level not in LEVELS.get(compress_type, ()):
+        raise ValueError(f'Invalid compression level: {spec!r}')
+    return Method(spec, compress_type, level)
+
+
+STORED = parse_method('stored')
+DEFLATED = parse_method('deflated')
+
+
+def is_incompressible(block):
+    '''
+    Does the first block of a member compress badly?
+    '''
+    return len(zlib.compress(block, 1)) > PROBE_MAX_RATIO * len(block)
+
+
+@attr.s(auto_attribs=True, frozen=True)
+class Policy:
+    default: Method = DEFLATED
+    probe: bool = True
+    rules: dict = attr.Factory(
+        lambda: {extension: STORED for extension in INCOMPRESSIBLE_EXTENSIONS})
+
+    def method_for(self, zip_path, first_block):
+        '''
+        Method for compressing a member, given its first block.
+        '''
+        extension = os.path.splitext(zip_path)[1].lower()
+        try:
+            return self.rules[extension]
+        except KeyError:
+            pass
+        if self.probe and len(first_block) >= PROBE_MIN_SIZE and is_incompressible(first_block):
+            return STORED
+        return self.default
+
+    @classmethod
+    def from_config(cls, config):
+        '''
+        Policy from a workspace compression config - raises ValueError on invalid config.
+        '''
+        policy = cls()
+        rules = dict(policy.rules)
+        for extension, spec in config.get(RULES, {}).items():
+            rules[extension.lower()] = parse_method(spec)
+        return cls(
+            default=parse_method(config.get(METHOD, policy.default.spec)),
+            probe=bool(config.get(PROBE, policy.probe)),
+            rules=rules)
+
+
+def workspace_policy(workspace):
+    '''
+    Compression policy of workspace, the default method can be overridden by environment.
+    '''
+    try:
+        config = persistence.file_load(workspace.directory / layouts.Workspace.COMPRESSION)
+    except FileNotFoundError:
+        config = {}
+    except persistence.ReadError:
+        raise ValueError('Malformed compression config', workspace.directory)
+    user_compression_preference = os.environ.get(COMPRESSION_ENV_VAR)
+    if user_compression_preference:
+        config = dict(config, **{METHOD: user_compression_preference})
+    return Policy.from_config(config)
+
+
+# stats keys
+FILES = 'files'
+BYTES_IN = 'bytes_in'
+BYTES_OUT = 'bytes_out'
+SECONDS = 'seconds'
+
+
+class Stats:
+    '''
+    Compression statistics by method spec.
+    '''
+
+    def __init__(self, by_method=None):
+        self.by_method = by_method or {}
+        self._lock = threading.Lock()
+
+    def add(self, method, zipinfo, seconds):
+        with self._lock:
+            stats = self.by_method.setdefault(
+                method.spec, {FILES: 0, BYTES_IN: 0, BYTES_OUT: 0, SECONDS: 0.0})
+            stats[FILES] += 1
+            stats[BYTES_IN] += zipinfo.file_size
+            stats[BYTES_OUT] += zipinfo.compress_size
+            stats[SECONDS] += seconds
+
+    def save(self, path):
+        persistence.file_dump(self.by_method, path)
+
+    @classmethod
+    def load(cls, path):
+        return cls(persistence.file_load(path))
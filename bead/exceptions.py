@@ -1,2 +1,10 @@
 class InvalidArchive(Exception):
     """Not a valid bead archive"""
+
+
+class DamagedArchive(InvalidArchive):
+    """Archive members are missing or do not match their manifest hashes"""
+
+    def __init__(self, filename, damaged_members):
+        super().__init__(filename, damaged_members)
+        self.damaged_members = damaged_members
@@ -0,0 +1,138 @@
+'''
+I am remembering the hashes of workspace files saved last time.
+
+Files are identified by their stat (size, modification time, inode),
+so unchanged files need not be hashed again on the next save
+and changes since the last save can be found without reading any file.
+'''
+
+import os
+import threading
+import time
+
+import attr
+
+from . import layouts
+from . import tech
+
+persistence = tech.persistence
+
+# cache keys
+VERSION = 'version'
+SAVED_AT_NS = 'saved_at_ns'
+FILES = 'files'
+
+# file entry keys
+SIZE = 'size'
+MTIME_NS = 'mtime_ns'
+INODE = 'inode'
+HASH = 'hash'
+CHUNK_HASHES = 'chunk_hashes'
+
+
+def _stamp(stat):
+    return {SIZE: stat.st_size, MTIME_NS: stat.st_mtime_ns, INODE: stat.st_ino}
+
+
+def _has_stamp(entry, stat):
+    return {key: entry[key] for key in (SIZE, MTIME_NS, INODE)} == _stamp(stat)
+
+
+@attr.s(auto_attribs=True, frozen=True)
+class FileChanges:
+    new: tuple
+    changed: tuple
+    deleted: tuple
+
+    def __bool__(self):
+        return bool(self.new or self.changed or self.deleted)
+
+
+class HashCache:
+    '''
+    Hashes of files keyed by their archive path, valid only for the same `version`.
+
+    `version` identifies the hashing (meta version, chunk size):
+    hashes made with a different version are ignored.
+    '''
+
+    def __init__(self, path, version=None):
+        self.path = path
+        self.version = version
+        self._lock = threading.Lock()
+        self._saved_at_ns = 0
+        self._old_files = {}
+        self._files = {}
+        self._load()
+
+    @classmethod
+    def for_workspace(cls, workspace, version=None):
+        return cls(workspace.directory / layouts.Workspace.HASH_CACHE, version)
+
+    @property
+    def exists(self):
+        return self._saved_at_ns != 0
+
+    def _load(self):
+        try:
+            cache = persistence.file_load(self.path)
+        except (OSError, persistence.ReadError):
+            return
+        if self.version is not None and cache.get(VERSION) != self.version:
+            return
+        self._saved_at_ns = cache.get(SAVED_AT_NS, 0)
+        self._old_files = cache.get(FILES, {})
+
+    def _is_unchanged(self, entry, stat):
+        if entry is None or not _has_stamp(entry, stat):
+            return False
+        # files modified just before the cache was saved might have changed since
+        return stat.st_mtime_ns < self._saved_at_ns - tech.fs.RACY_WINDOW_NS
+
+    def get(self, zip_path, stat):
+        '''
+        Cached (hash, chunk hashes) for an unchanged file, None otherwise.
+        '''
+        entry = self._old_files.get(zip_path)
+        if not self._is_unchanged(entry, stat):
+            return None
+        hash = entry[HASH]
+        return hash, entry.get(CHUNK_HASHES, [hash])
+
+    def put(self, zip_path, stat, hash, chunk_hashes):
+        entry = dict(_stamp(stat), **{HASH: hash})
+        if len(chunk_hashes) > 1:
+            entry[CHUNK_HASHES] = chunk_hashes
+        with self._lock:
+            self._files[zip_path] = entry
+
+    def save(self):
+        '''
+        Replace the cache with the files put since loading.
+        '''
+        cache = {VERSION: self.version, SAVED_AT_NS: time.time_ns(), FILES: self._files}
+        tech.fs.replace_file(self.path, persistence.dumps(cache))
+
+    def changes(self, files, zip_dir):
+        '''
+        Changes under zip_dir since the cache was saved.
+
+        The current files under zip_dir are given as (path, zip_path) pairs.
+        Only the stat of files is compared, their content is not read.
+        '''
+        new = []
+        changed = []
+        seen = set()
+        for path, zip_path in files:
+            seen.add(zip_path)
+            entry = self._old_files.get(zip_path)
+            if entry is None:
+                new.append(zip_path)
+            elif not _has_stamp(entry, os.stat(path)):
+                changed.append(zip_path)
+        zip_dir_prefix = zip_dir + '/'
+        deleted = sorted(
+            zip_path
+            for zip_path in self._old_files
+            if zip_path.startswith(zip_dir_prefix) and zip_path not in seen)
+        return FileChanges(tuple(new), tuple(changed), tuple(deleted))
@@ -0,0 +1,191 @@
+'''
+I am a content addressed store of input files, shared by workspaces.
+
+Every data file of a loaded bead is extracted into the store only once,
+keyed by its content hash from the bead's manifest,
+input directories are filled with hard links to the stored files
+(or reflinks/copies, where hard links are not possible, and on Windows).
+Inputs are read only, so sharing their files is safe.
+
+Stored files are verified against their hash when added, and get a fixed
+modification time. Files already in the store are used only with the expected
+size and this modification time - any write to them changes it -,
+other files are extracted (and verified) again, replacing the changed ones.
+
+The store is optional, it is enabled by the BEAD_INPUT_STORE environment variable
+(the store's directory). With BEAD_INPUT_STORE_MAX_SIZE (in bytes)
+least recently used files not linked from any input are evicted
+over the given size.
+
+Layout:
+    objects/<first 2 characters of hash>/<hash>
+    tmp/                                            - files being added
+'''
+
+import contextlib
+import os
+import shutil
+import time
+
+from tracelog import TRACELOG
+
+from . import tech
+
+fs = tech.fs
+
+STORE_ENV_VAR = 'BEAD_INPUT_STORE'
+MAX_SIZE_ENV_VAR = 'BEAD_INPUT_STORE_MAX_SIZE'
+
+OBJECTS = 'objects'
+TMP = 'tmp'
+
+# modification time of stored files (2001-09-09) - representable on all file systems
+OBJECT_MTIME_NS = 10 ** 18
+
+# read only files can be removed only after making them writable on Windows,
+# which would make all their hard links - the stored file - writable as well
+HARD_LINKS = os.name == 'posix'
+
+# ioctl request to clone a file on Linux (btrfs, xfs, ...), see ioctl_ficlone(2)
+FICLONE = 0x40049409
+
+
+class InputStore:
+
+    def __init__(self, directory, max_size=None):
+        self.directory = fs.Path(directory)
+        self.max_size = max_size
+        self.bytes_added = 0
+
+    @classmethod
+    def from_environment(cls):
+        '''
+        Store configured by environment variables, None if not configured.
+
+        Raises ValueError on an invalid max size.
+        '''
+        directory = os.environ.get(STORE_ENV_VAR)
+        if not directory:
+            return None
+        max_size = os.environ.get(MAX_SIZE_ENV_VAR)
+        if max_size:
+            try:
+                max_size = int(max_size)
+            except ValueError:
+                raise ValueError(f'Invalid {MAX_SIZE_ENV_VAR}: {max_size!r}')
+        return cls(directory, max_size or None)
+
+    def object_path(self, hash):
+        return self.directory / OBJECTS / hash[:2] / hash
+
+    def has(self, hash, size):
+        '''
+        Is there an unchanged stored file with hash and size?
+        '''
+        object_path = self.object_path(hash)
+        try:
+            stat = os.stat(object_path)
+        except FileNotFoundError:
+            return False
+        if stat.st_size == size and stat.st_mtime_ns == OBJECT_MTIME_NS:
+            return True
+        TRACELOG(f'{object_path} has changed, replacing it')
+        return False
+
+    @contextlib.contextmanager
+    def staging(self):
+        '''
+        Temporary directory for files to be added - on the same file system as the store.
+        '''
+        with fs.temp_dir(self.directory / TMP) as staging_dir:
+            yield staging_dir
+
+    def add(self, hash, path):
+        '''
+        Move the (verified, read only) file at path into the store.
+        '''
+        object_path = self.object_path(hash)
+        fs.ensure_directory(os.path.dirname(object_path))
+        size = os.path.getsize(path)
+        os.utime(path, ns=(time.time_ns(), OBJECT_MTIME_NS))
+        os.replace(path, object_path)
+        self.bytes_added += size
+
+    def link(self, hash, fs_path):
+        '''
+        Make the stored file with hash available at fs_path.
+
+        Returns False if the file is not in the store (e.g. it was just evicted).
+        '''
+        object_path = self.object_path(hash)
+        if HARD_LINKS:
+            try:
+                os.link(object_path, fs_path)
+                return True
+            except FileNotFoundError:
+                return False
+            except OSError:
+                # e.g. different file system, too many links
+                pass
+        try:
+            _reflink(object_path, fs_path)
+        except FileNotFoundError:
+            return False
+        except OSError:
+            _copy(object_path, fs_path)
+        # mark as used for eviction (changes ctime)
+        os.utime(object_path, ns=(time.time_ns(), OBJECT_MTIME_NS))
+        return True
+
+    def _objects(self):
+        for root, _dirs, files in os.walk(self.directory / OBJECTS):
+            for file in files:
+                path = os.path.join(root, file)
+                try:
+                    yield path, os.stat(path)
+                except FileNotFoundError:
+                    pass
+
+    def evict(self):
+        '''
+        Remove least recently used files, that are not linked from inputs, over max_size.
+
+        Linking and unlinking files changes their ctime, which is used as last use time.
+        '''
+        if self.max_size is None:
+            return
+        objects = list(self._objects())
+        size = sum(stat.st_size for _path, stat in objects)
+        evicted = 0
+        unused = sorted(
+            ((path, stat) for path, stat in objects if stat.st_nlink == 1),
+            key=lambda path_stat: path_stat[1].st_ctime_ns)
+        for path, stat in unused:
+            if size <= self.max_size:
+                break
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path)
+                evicted += 1
+            size -= stat.st_size
+        TRACELOG(f'{self.directory}: {len(objects)} files, evicted {evicted}, size {size}')
+
+
+def _reflink(source, target):
+    try:
+        import fcntl
+    except ImportError:
+        raise OSError('reflinks are not supported')
+    with open(source, 'rb') as source_file:
+        try:
+            with fs.create_file(target, readonly=True) as target_file:
+                fcntl.ioctl(target_file.fileno(), FICLONE, source_file.fileno())
+        except OSError:
+            with contextlib.suppress(OSError):
+                os.remove(target)
+            raise
+
+
+def _copy(source, target):
+    with open(source, 'rb') as source_file:
+        with fs.create_file(target, readonly=True) as target_file:
+            shutil.copyfileobj(source_file, target_file, tech.securehash.READ_BLOCK_SIZE)
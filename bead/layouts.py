@@ -15,6 +15,8 @@ class Archive:
 
     BEAD_META = META / 'bead'
     MANIFEST = META / 'manifest'
+    # chunk size and chunk hashes of big files (tree hashing meta versions only)
+    CHUNKS = META / 'chunks'
 
     # volatile content, not included in generation of content_id
     INPUT_MAP = META / 'input.map'
@@ -29,3 +31,8 @@ class Workspace:
 
     BEAD_META = META / 'bead'
     INPUT_MAP = META / 'input.map'
+    # hashes of files saved last time, see bead.hashcache
+    HASH_CACHE = META / 'hash.cache'
+    # compression policy config and statistics of the last save, see bead.compression
+    COMPRESSION = META / 'compression'
+    COMPRESSION_STATS = META / 'compression.stats'
@@ -16,6 +16,8 @@ with the following minimum structure:
             kind: ...,
             content_id: ...,
             freeze_time: ...,
+            include: [...],  # optional, glob patterns of files to load
+            exclude: [...],  # optional, glob patterns of files not to load
         },
         ...
     },
@@ -25,7 +27,10 @@ with the following minimum structure:
 }
 '''
 
+import fnmatch
+
 from .tech.timestamp import time_from_timestamp
+from .tech import securehash
 import attr
 
 # Metadata versions determine the content_id used and potentially
@@ -40,6 +45,8 @@ INPUTS = 'inputs'
 INPUT_KIND         = 'kind'
 INPUT_CONTENT_ID   = 'content_id'
 INPUT_FREEZE_TIME  = 'freeze_time'
+INPUT_INCLUDE      = 'include'
+INPUT_EXCLUDE      = 'exclude'
 
 
 class ValidatingStr(str):
@@ -84,6 +91,24 @@ class InputSpec:
         return time_from_timestamp(self.freeze_time_str)
 
 
+def file_selector(include=(), exclude=()):
+    '''
+    Predicate on input file paths (relative to the input directory) - None for all files.
+
+    A file is selected, if it matches any of the `include` glob patterns (if there is any)
+    and none of the `exclude` patterns.
+    Patterns are matched with fnmatch: `*` matches `/` as well.
+    '''
+    if not include and not exclude:
+        return None
+
+    def is_selected(path):
+        return (
+            (not include or any(fnmatch.fnmatchcase(path, pattern) for pattern in include))
+            and not any(fnmatch.fnmatchcase(path, pattern) for pattern in exclude))
+    return is_selected
+
+
 def parse_inputs(meta):
     '''
     Parse and yield input specification from meta as records.
@@ -101,3 +126,87 @@ def parse_inputs(meta):
 # Archive meta:
 FREEZE_TIME = 'freeze_time'
 FREEZE_NAME = 'freeze_name'
+
+
+@attr.s(auto_attribs=True, frozen=True)
+class MetaVersion:
+    '''
+    Processing differences between meta versions.
+    '''
+    # value of META_VERSION in archive meta, generated with `uuidgen -t`
+    id: str
+    # short name for humans
+    name: str
+    # algorithm for hashing files (manifest entries) and the manifest itself (content_id)
+    hash_algorithm: str
+    # big files are hashed as a tree of chunks, see `securehash.TreeHasher`
+    # the chunk size is stored in the archive (layouts.Archive.CHUNKS)
+    tree_hash: bool = False
+
+    def hasher(self, size, chunk_size=None, executor=None):
+        '''
+        Incremental hasher for manifest entries.
+        '''
+        if self.tree_hash:
+            return securehash.TreeHasher(size, self.hash_algorithm, chunk_size, executor)
+        return securehash.Hasher(size, self.hash_algorithm)
+
+    def hash_file(self, file, file_size, chunk_size=None, executor=None):
+        '''
+        Manifest entry for the content of file.
+
+        Closes the file.
+        '''
+        hasher = self.hasher(file_size, chunk_size, executor)
+        return securehash.update_from_file(hasher, file).hexdigest()
+
+    def hash_bytes(self, bytes, chunk_size=None):
+        hasher = self.hasher(len(bytes), chunk_size)
+        hasher.update(bytes)
+        return hasher.hexdigest()
+
+    def content_id(self, manifest_file, manifest_size):
+        '''
+        Content id from the manifest.
+
+        Closes the file.
+        '''
+        return securehash.file(manifest_file, manifest_size, self.hash_algorithm)
+
+
+META_VERSION_SHA512 = MetaVersion(
+    id='aaa947a6-1f7a-11e6-ba3a-0021cc73492e',
+    name='sha512',
+    hash_algorithm=securehash.SHA512)
+META_VERSION_BLAKE2B = MetaVersion(
+    id='15672ea8-cab7-11f1-a9d6-02fc00000001',
+    name='blake2b',
+    hash_algorithm=securehash.BLAKE2B)
+# the id changed, when tree nodes got their own hash domain - see securehash.tree_root
+META_VERSION_BLAKE2B_TREE = MetaVersion(
+    id='3a5e0c9c-cac4-11f1-8d21-02fc00000001',
+    name='blake2b-tree',
+    hash_algorithm=securehash.BLAKE2B,
+    tree_hash=True)
+
+META_VERSIONS = (META_VERSION_SHA512, META_VERSION_BLAKE2B, META_VERSION_BLAKE2B_TREE)
+# used for new archives
+DEFAULT_META_VERSION = META_VERSION_BLAKE2B
+# used for new archives with tree hashing meta versions
+DEFAULT_TREE_CHUNK_SIZE = 64 * 1024 ** 2
+
+# keys in layouts.Archive.CHUNKS
+CHUNK_SIZE = 'chunk_size'
+CHUNK_HASHES = 'chunk_hashes'
+
+
+def get_meta_version(id_or_name):
+    '''
+    Find a known meta version by its id or name.
+
+    raises LookupError for unknown meta versions.
+    '''
+    for meta_version in META_VERSIONS:
+        if id_or_name in (meta_version.id, meta_version.name):
+            return meta_version
+    raise LookupError('Unknown meta version', id_or_name)
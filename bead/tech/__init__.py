@@ -6,6 +6,7 @@ Technologies
 
 from . import identifier
 from . import fs
+from . import parallel
 from . import persistence
 from . import securehash
 from . import timestamp
@@ -1,9 +1,20 @@
+from collections import Counter
 import io
 import os
 import stat
 import contextlib
+import functools
 import shutil
+import sys
 import tempfile
+import threading
+
+from tracelog import TRACELOG
+
+
+# Files modified this close before a point in time might have been modified again
+# within the file system's timestamp resolution without changing their stat.
+RACY_WINDOW_NS = 2 * 10 ** 9
 
 
 class Path(str):
@@ -37,6 +48,33 @@ def write_file(path, content):
         f.write(content)
 
 
+def replace_file(path, content):
+    '''
+    Write content to path through a temporary file, that replaces the old file:
+    concurrent readers never see a partial file.
+    '''
+    directory, name = os.path.split(path)
+    temp_path = os.path.join(directory, f'.{name}.{os.getpid()}.{threading.get_ident()}')
+    try:
+        write_file(temp_path, content)
+        os.replace(temp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(temp_path)
+        raise
+
+
+def read_at(path, offset, length):
+    '''
+    Read `length` bytes from `offset` of file at `path`.
+
+    Uses its own file handle, so it is safe to use from multiple threads.
+    '''
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        return f.read(length)
+
+
 def read_file(path):
     with io.open(path, 'rt', encoding='utf-8') as f:
         return f.read()
@@ -76,8 +114,131 @@ def all_subpaths(dir, followlinks=False):
             yield root / file
 
 
-def rmtree(root, *args, **kwargs):
-    for path in all_subpaths(root, followlinks=False):
-        if not os.path.islink(path):
+def create_file(path, readonly=False):
+    '''
+    Open a new (or truncated) file for writing in binary mode.
+
+    With `readonly` the file is created without write permissions
+    - the returned file object is still writable.
+    '''
+    mode = 0o444 if readonly else 0o666
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0), mode)
+    return os.fdopen(fd, 'wb')
+
+
+# shutil.rmtree uses the same condition for its fd based implementation
+_RMTREE_USES_FDS = (
+    {os.open, os.unlink, os.rmdir} <= os.supports_dir_fd
+    and os.scandir in os.supports_fd
+    and os.stat in os.supports_follow_symlinks)
+
+
+def rmtree(root, ignore_errors=False):
+    '''
+    Remove directory tree at root in a single pass, read only files and directories included.
+
+    Write permission is granted only to those files and directories,
+    where removal fails otherwise.
+    Symbolic links are removed, but not followed.
+
+    The number of system calls made is reported to the TRACELOG.
+    '''
+    syscalls = Counter()
+    try:
+        if _RMTREE_USES_FDS:
+            _rmtree_fd(root, syscalls, ignore_errors)
+        else:
+            _rmtree_paths(root, syscalls, ignore_errors)
+    finally:
+        TRACELOG(f'rmtree {root}: {dict(syscalls)}')
+
+
+def _rmtree_fd(root, syscalls, ignore_errors):
+    try:
+        syscalls['open'] += 1
+        fd = os.open(root, os.O_RDONLY | os.O_DIRECTORY | os.O_NOFOLLOW)
+    except OSError:
+        if ignore_errors:
+            return
+        raise
+    try:
+        _remove_directory_content(fd, syscalls, ignore_errors)
+    finally:
+        os.close(fd)
+    try:
+        syscalls['rmdir'] += 1
+        os.rmdir(root)
+    except OSError:
+        if not ignore_errors:
+            raise
+
+
+def _remove_directory_content(dir_fd, syscalls, ignore_errors):
+    '''
+    Remove everything from the open directory dir_fd, using paths relative to it.
+    '''
+    syscalls['scandir'] += 1
+    with os.scandir(dir_fd) as scan:
+        entries = [(entry.name, entry.is_dir(follow_symlinks=False)) for entry in scan]
+
+    made_writable = False
+    for name, is_dir in entries:
+        try:
+            if is_dir:
+                syscalls['open'] += 1
+                fd = os.open(name, os.O_RDONLY | os.O_DIRECTORY | os.O_NOFOLLOW, dir_fd=dir_fd)
+                try:
+                    _remove_directory_content(fd, syscalls, ignore_errors)
+                finally:
+                    os.close(fd)
+            remove = functools.partial(os.rmdir if is_dir else os.unlink, name, dir_fd=dir_fd)
+            try:
+                syscalls['rmdir' if is_dir else 'unlink'] += 1
+                remove()
+            except PermissionError:
+                if made_writable:
+                    raise
+                # removing entries requires write permission on their directory
+                syscalls['fstat'] += 1
+                syscalls['fchmod'] += 1
+                os.fchmod(dir_fd, os.fstat(dir_fd).st_mode | stat.S_IWRITE)
+                made_writable = True
+                syscalls['rmdir' if is_dir else 'unlink'] += 1
+                remove()
+        except OSError:
+            if not ignore_errors:
+                raise
+
+
+def _is_hard_linked_file(path):
+    stat_result = os.lstat(path)
+    return stat.S_ISREG(stat_result.st_mode) and stat_result.st_nlink > 1
+
+
+def _rmtree_paths(root, syscalls, ignore_errors):
+    # e.g. on Windows, where read only files can not be removed
+    hard_linked_files = []
+
+    def make_writable_and_retry(function, path, _exc):
+        try:
+            if _is_hard_linked_file(path):
+                # its other links (e.g. in an input store) would become writable as well
+                hard_linked_files.append(path)
+                return
+            if hard_linked_files and os.path.isdir(path):
+                # not empty
+                return
+            syscalls['chmod'] += 1
             make_writable(path)
-    shutil.rmtree(root, *args, **kwargs)
+            function(path)
+        except OSError:
+            if not ignore_errors:
+                raise
+
+    if sys.version_info >= (3, 12):
+        shutil.rmtree(root, onexc=make_writable_and_retry)
+    else:
+        shutil.rmtree(root, onerror=make_writable_and_retry)
+    if hard_linked_files and not ignore_errors:
+        raise PermissionError(
+            'Can not remove read only files with multiple links', hard_linked_files)
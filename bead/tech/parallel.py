@@ -0,0 +1,21 @@
+'''
+I am deciding how many workers to use for parallelizable work.
+'''
+
+import os
+
+JOBS_ENV_VAR = 'BEAD_JOBS'
+
+
+def jobs(requested=None):
+    '''
+    Number of workers to use.
+
+    Explicitly requested number > $BEAD_JOBS > number of CPUs.
+    '''
+    if requested is None:
+        try:
+            requested = int(os.environ[JOBS_ENV_VAR])
+        except (KeyError, ValueError):
+            requested = os.cpu_count() or 1
+    return max(1, requested)
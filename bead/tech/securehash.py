@@ -2,10 +2,17 @@
 I am providing the content hash functions.
 '''
 
+from concurrent.futures import ThreadPoolExecutor
 import hashlib
+import threading
 
 READ_BLOCK_SIZE = 1024 ** 2
 
+# supported hash algorithms (hashlib names)
+SHA512 = 'sha512'
+BLAKE2B = 'blake2b'
+ALGORITHMS = (SHA512, BLAKE2B)
+
 # hashes are created from {length of content}:content;
 # similarity to http://cr.yp.to/proto/netstrings.txt are not accidental:
 # length is hashed with content AND there is a known suffix
@@ -19,39 +26,218 @@ def _add_suffix(hash, size):
     hash.update(f';{size}'.encode('ascii'))
 
 
-def file(file, file_size):
+# Tree nodes are hashed in their own domain: hashed leaf content always starts
+# with its length (see `_add_prefix`) - an ASCII digit, never this byte.
+# Thus no content can have the same hash as a tree node.
+TREE_NODE_PREFIX = b'\x01'
+
+
+class Hasher:
     '''
-    Read file and return sha512 hash for its content.
+    Incremental version of `file` - for hashing content while it is processed.
 
-    Closes the file.
-    Can process BIG files.
+    The content size must be known in advance.
+    '''
+
+    def __init__(self, size, algorithm=SHA512):
+        assert algorithm in ALGORITHMS, algorithm
+        self.size = size
+        self.bytes_hashed = 0
+        self.hash = hashlib.new(algorithm)
+        _add_prefix(self.hash, size)
+
+    def update(self, block):
+        self.bytes_hashed += len(block)
+        self.hash.update(block)
+
+    def hexdigest(self):
+        hash = self.hash.copy()
+        _add_suffix(hash, self.size)
+        return str(hash.hexdigest())
+
+
+class ChunkExecutor(ThreadPoolExecutor):
+    '''
+    Thread pool for hashing the chunks of `TreeHasher`s in parallel.
+
+    Chunks waiting for hashing are buffered in memory: the pool limits them
+    (together with the ones being hashed) to a few more than its workers
+    for all the hashers sharing it.
+    '''
+
+    EXTRA_PENDING_CHUNKS = 2
+
+    def __init__(self, max_workers):
+        super().__init__(max_workers=max_workers)
+        self.chunk_slots = threading.BoundedSemaphore(max_workers + self.EXTRA_PENDING_CHUNKS)
+
+    def submit_chunk(self, chunk, algorithm):
+        '''
+        Future hash of chunk - waits while too many chunks are pending.
+        '''
+        self.chunk_slots.acquire()
+        try:
+            return self.submit(self._hash_chunk, chunk, algorithm)
+        except BaseException:
+            self.chunk_slots.release()
+            raise
+
+    def _hash_chunk(self, chunk, algorithm):
+        try:
+            return bytes(chunk, algorithm)
+        finally:
+            self.chunk_slots.release()
+
+
+class TreeHasher:
+    '''
+    Incremental tree hash - for hashing BIG content on many cores.
+
+    The content is split into `chunk_size` chunks, that are hashed
+    independently, the hash of the content is calculated from the chunk hashes
+    (see `tree_root`).
+    Chunks are hashed while the content arrives, except with a `ChunkExecutor`
+    for content bigger than a chunk: then they are buffered and hashed in parallel.
+
+    Content fitting into a single chunk has the same hash as with `Hasher`.
+    '''
+
+    def __init__(self, size, algorithm, chunk_size, executor: 'ChunkExecutor' = None):
+        assert algorithm in ALGORITHMS, algorithm
+        assert chunk_size > 0
+        self.size = size
+        self.algorithm = algorithm
+        self.chunk_size = chunk_size
+        self.executor = executor if size > chunk_size else None
+        self.bytes_hashed = 0
+        self._chunk_hashes = []
+        self._pending_hashes = []
+        self._chunks_started = 0
+        # Hasher of the current chunk, or - with an executor - its content:
+        # blocks are copied, so callers can reuse their buffers
+        self._chunk = None
+        self._chunk_length = 0
+
+    def update(self, block):
+        self.bytes_hashed += len(block)
+        view = memoryview(block)
+        while view:
+            if self._chunk is None:
+                self._start_chunk()
+            part = view[:self.chunk_size - self._chunk_length]
+            view = view[len(part):]
+            if self.executor is None:
+                self._chunk.update(part)
+            else:
+                self._chunk += part
+            self._chunk_length += len(part)
+            if self._chunk_length == self.chunk_size:
+                self._end_chunk()
+
+    def _start_chunk(self):
+        if self.executor is None:
+            offset = self._chunks_started * self.chunk_size
+            self._chunk = Hasher(min(self.chunk_size, self.size - offset), self.algorithm)
+        else:
+            self._chunk = bytearray()
+        self._chunks_started += 1
+
+    def _end_chunk(self):
+        chunk = self._chunk
+        self._chunk = None
+        self._chunk_length = 0
+        if self.executor is None:
+            self._chunk_hashes.append(chunk.hexdigest())
+        else:
+            self._pending_hashes.append(self.executor.submit_chunk(chunk, self.algorithm))
+
+    @property
+    def chunk_hashes(self):
+        '''
+        Hashes of all chunks - the content must have been fully hashed.
+        '''
+        if self._chunks_started == 0:
+            # empty content
+            self._start_chunk()
+        if self._chunk is not None:
+            self._end_chunk()
+        self._chunk_hashes.extend(pending.result() for pending in self._pending_hashes)
+        self._pending_hashes = []
+        return list(self._chunk_hashes)
+
+    def hexdigest(self):
+        return tree_root(self.chunk_hashes, self.size, self.chunk_size, self.algorithm)
+
+
+def chunk_count(size, chunk_size):
+    return max(1, -(-size // chunk_size))
+
+
+def tree_root(chunk_hashes, size, chunk_size, algorithm=SHA512):
     '''
+    Combine chunk hashes into the hash of the whole content.
+    '''
+    assert len(chunk_hashes) == chunk_count(size, chunk_size)
+    if len(chunk_hashes) == 1:
+        return chunk_hashes[0]
+    hash = hashlib.new(algorithm)
+    hash.update(TREE_NODE_PREFIX)
+    hash.update(f'{size}:{chunk_size}:{",".join(chunk_hashes)}'.encode('ascii'))
+    return str(hash.hexdigest())
+
+
+def tree_chunk_hashes(
+        read_at, size, chunk_size, algorithm=SHA512, executor=None, chunk_indexes=None):
+    '''
+    Hash chunks of a content with random access.
+
+    Chunks are read with `read_at(offset, length)`, which must be usable from
+    multiple threads, when an executor is given.
+    All chunks are hashed, unless `chunk_indexes` selects some of them.
+    '''
+    if chunk_indexes is None:
+        chunk_indexes = range(chunk_count(size, chunk_size))
+
+    def hash_chunk(index):
+        offset = index * chunk_size
+        return bytes(read_at(offset, min(chunk_size, size - offset)), algorithm)
 
-    hash = hashlib.sha512()
-    _add_prefix(hash, file_size)
+    if executor is None:
+        return [hash_chunk(index) for index in chunk_indexes]
+    return list(executor.map(hash_chunk, chunk_indexes))
 
-    bytes_read = 0
 
+def update_from_file(hasher, file):
+    '''
+    Feed all content of file to hasher.
+
+    Closes the file.
+    '''
     with file:
         while True:
             block = file.read(READ_BLOCK_SIZE)
             if not block:
                 break
-            bytes_read += len(block)
-            hash.update(block)
+            hasher.update(block)
+    return hasher
 
-    assert bytes_read == file_size
 
-    _add_suffix(hash, file_size)
-    return str(hash.hexdigest())
+def file(file, file_size, algorithm=SHA512):
+    '''
+    Read file and return hash for its content.
 
+    Closes the file.
+    Can process BIG files.
+    '''
+    hasher = update_from_file(Hasher(file_size, algorithm), file)
+    assert hasher.bytes_hashed == file_size
+    return hasher.hexdigest()
 
-def bytes(bytes):
+
+def bytes(bytes, algorithm=SHA512):
     '''
-    Return sha512 hash for bytes.
+    Return hash for bytes.
     '''
-    hash = hashlib.sha512()
-    _add_prefix(hash, len(bytes))
-    hash.update(bytes)
-    _add_suffix(hash, len(bytes))
-    return str(hash.hexdigest())
+    hasher = Hasher(len(bytes), algorithm)
+    hasher.update(bytes)
+    return hasher.hexdigest()
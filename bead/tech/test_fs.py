@@ -2,7 +2,10 @@
 from ..test import TestCase, skipIf
 from . import fs as m
 
+from collections import Counter
 import os
+import stat
+from unittest import mock
 
 
 class TestPath(TestCase):
@@ -119,6 +122,70 @@ class Test_all_subpaths(TestCase):
         assert all_paths == self.__paths
 
 
+class Test_rmtree(TestCase):
+
+    def test_read_only_tree_is_removed(self):
+        self.given_a_read_only_directory_tree()
+        self.when_removed()
+        self.then_tree_is_removed()
+
+    def test_symlinked_directory_is_not_followed(self):
+        self.given_a_read_only_directory_tree()
+        self.given_a_symlink_to_an_outside_directory()
+        self.when_removed()
+        self.then_tree_is_removed()
+        self.then_outside_directory_is_intact()
+
+    def test_missing_directory_with_ignore_errors(self):
+        m.rmtree(self.new_temp_dir() / 'missing', ignore_errors=True)
+
+    @skipIf(not hasattr(os, 'link'), 'hard links are not supported')
+    def test_hard_linked_files_are_not_made_writable(self):
+        # path based removal makes read only files writable, when it can not remove them
+        root = self.new_temp_dir() / 'root'
+        os.makedirs(root)
+        with m.create_file(root / 'f', readonly=True) as file:
+            file.write(b'content')
+        outside = self.new_temp_dir() / 'f'
+        os.link(root / 'f', outside)
+
+        with mock.patch('os.unlink', side_effect=PermissionError):
+            self.assertRaises(PermissionError, m._rmtree_paths, root, Counter(), False)
+        assert 0 == stat.S_IMODE(os.stat(outside).st_mode) & 0o222
+
+    # implementation
+
+    __root = None
+    __outside = None
+
+    def given_a_read_only_directory_tree(self):
+        self.__root = root = self.new_temp_dir() / 'root'
+        os.makedirs(root / 'a/b')
+        for f in ('f', 'a/f', 'a/b/f'):
+            with m.create_file(root / f, readonly=True) as file:
+                file.write(b'content')
+        for d in ('a/b', 'a', ''):
+            m.make_readonly(root / d)
+
+    @skipIf(not hasattr(os, 'symlink'), 'symlinks are not supported')
+    def given_a_symlink_to_an_outside_directory(self):
+        self.__outside = self.new_temp_dir()
+        m.write_file(self.__outside / 'file', b'outside')
+        m.make_writable(self.__root)
+        os.symlink(self.__outside, self.__root / 'link')
+        m.make_readonly(self.__root)
+
+    def when_removed(self):
+        m.rmtree(self.__root)
+
+    def then_tree_is_removed(self):
+        assert not os.path.exists(self.__root)
+
+    def then_outside_directory_is_intact(self):
+        with open(self.__outside / 'file', 'rb') as f:
+            assert b'outside' == f.read()
+
+
 class Test_read_write_file(TestCase):
 
     def test(self):
@@ -127,3 +194,21 @@ class Test_read_write_file(TestCase):
         content = u'Test_read_write_file testfile content / áíőóüú@!#@!#$$@'
         m.write_file(testfile, content)
         assert content == m.read_file(testfile)
+
+
+class Test_replace_file(TestCase):
+
+    def test_file_is_replaced(self):
+        root = self.new_temp_dir()
+        m.write_file(root / 'file', 'old')
+        m.replace_file(root / 'file', 'new')
+        assert 'new' == m.read_file(root / 'file')
+        assert ['file'] == os.listdir(root)
+
+    def test_failed_write_leaves_the_old_file(self):
+        root = self.new_temp_dir()
+        m.write_file(root / 'file', 'old')
+        with mock.patch('os.replace', side_effect=OSError):
+            self.assertRaises(OSError, m.replace_file, root / 'file', 'new')
+        assert 'old' == m.read_file(root / 'file')
+        assert ['file'] == os.listdir(root)
@@ -0,0 +1,20 @@
+from ..test import TestCase, setenv
+from . import parallel as m
+
+
+class Test_jobs(TestCase):
+
+    def test_requested(self):
+        with setenv(m.JOBS_ENV_VAR, '3'):
+            assert 5 == m.jobs(5)
+
+    def test_environment(self):
+        with setenv(m.JOBS_ENV_VAR, '3'):
+            assert 3 == m.jobs()
+
+    def test_malformed_environment_is_ignored(self):
+        with setenv(m.JOBS_ENV_VAR, 'many'):
+            assert m.jobs() >= 1
+
+    def test_at_least_one(self):
+        assert 1 == m.jobs(0)
@@ -1,4 +1,7 @@
 import os
+import threading
+import time
+from unittest import mock
 
 from ..test import TestCase
 from .. import tech
@@ -65,3 +68,107 @@ class Test(TestCase):
 
     def then_the_hashes_are_the_same(self):
         assert self.__hashresult[0] == self.__hashresult[1]
+
+
+class Test_Hasher(TestCase):
+
+    def test_incremental_hash_is_the_same_as_bytes_hash(self):
+        hasher = securehash.Hasher(len(b'some bytes'))
+        hasher.update(b'some ')
+        hasher.update(b'bytes')
+        assert securehash.bytes(b'some bytes') == hasher.hexdigest()
+
+    def test_algorithms_are_different(self):
+        hashes = {
+            securehash.bytes(b'some bytes', algorithm)
+            for algorithm in securehash.ALGORITHMS}
+        assert len(securehash.ALGORITHMS) == len(hashes)
+
+
+class Test_TreeHasher(TestCase):
+
+    CONTENT = bytes(range(256)) * 10
+
+    def test_streaming_hash_is_the_same_as_positional_hash(self):
+        for chunk_size in (1, 100, 2559, 2560):
+            hasher = securehash.TreeHasher(len(self.CONTENT), securehash.BLAKE2B, chunk_size)
+            for i in range(0, len(self.CONTENT), 7):
+                hasher.update(self.CONTENT[i:i + 7])
+
+            def read_at(offset, length):
+                return self.CONTENT[offset:offset + length]
+            chunk_hashes = securehash.tree_chunk_hashes(
+                read_at, len(self.CONTENT), chunk_size, securehash.BLAKE2B)
+            assert chunk_hashes == hasher.chunk_hashes
+            assert hasher.hexdigest() == securehash.tree_root(
+                chunk_hashes, len(self.CONTENT), chunk_size, securehash.BLAKE2B)
+
+    def test_parallel_hash_is_the_same_as_serial_hash(self):
+        serial = securehash.TreeHasher(len(self.CONTENT), securehash.BLAKE2B, 100)
+        serial.update(self.CONTENT)
+        with securehash.ChunkExecutor(max_workers=3) as executor:
+            parallel = securehash.TreeHasher(len(self.CONTENT), securehash.BLAKE2B, 100, executor)
+            parallel.update(self.CONTENT)
+            assert serial.hexdigest() == parallel.hexdigest()
+
+    def test_pending_chunks_are_limited_for_all_hashers(self):
+        hashing = threading.Event()
+        hash_chunk = securehash.bytes
+
+        def blocked_hash_chunk(chunk, algorithm):
+            hashing.wait()
+            return hash_chunk(chunk, algorithm)
+
+        with securehash.ChunkExecutor(max_workers=1) as executor, \
+                mock.patch.object(securehash, 'bytes', blocked_hash_chunk):
+            hashers = [
+                securehash.TreeHasher(len(self.CONTENT), securehash.BLAKE2B, 100, executor)
+                for _ in range(2)]
+
+            def pending_chunks():
+                return sum(len(hasher._pending_hashes) for hasher in hashers)
+
+            feeders = [
+                threading.Thread(target=hasher.update, args=(self.CONTENT,))
+                for hasher in hashers]
+            for feeder in feeders:
+                feeder.start()
+            limit = 1 + executor.EXTRA_PENDING_CHUNKS
+            deadline = time.monotonic() + 5
+            while pending_chunks() < limit and time.monotonic() < deadline:
+                time.sleep(0.01)
+            time.sleep(0.05)
+            assert limit == pending_chunks()
+            hashing.set()
+            for feeder in feeders:
+                feeder.join()
+            tree_hashes = {hasher.hexdigest() for hasher in hashers}
+
+        serial = securehash.TreeHasher(len(self.CONTENT), securehash.BLAKE2B, 100)
+        serial.update(self.CONTENT)
+        assert {serial.hexdigest()} == tree_hashes
+
+    def test_single_chunk_content_is_hashed_while_it_arrives(self):
+        with securehash.ChunkExecutor(max_workers=1) as executor:
+            hasher = securehash.TreeHasher(
+                len(self.CONTENT), securehash.BLAKE2B, len(self.CONTENT), executor)
+            with mock.patch.object(executor, 'submit_chunk') as submit_chunk:
+                hasher.update(self.CONTENT)
+                assert securehash.bytes(self.CONTENT, securehash.BLAKE2B) == hasher.hexdigest()
+        submit_chunk.assert_not_called()
+
+    def test_single_chunk_content_has_plain_hash(self):
+        hasher = securehash.TreeHasher(len(self.CONTENT), securehash.BLAKE2B, len(self.CONTENT))
+        hasher.update(self.CONTENT)
+        assert securehash.bytes(self.CONTENT, securehash.BLAKE2B) == hasher.hexdigest()
+
+    def test_empty_content_has_plain_hash(self):
+        hasher = securehash.TreeHasher(0, securehash.BLAKE2B, 100)
+        assert securehash.bytes(b'', securehash.BLAKE2B) == hasher.hexdigest()
+
+    def test_chunk_size_changes_hash(self):
+        def tree_hash(chunk_size):
+            hasher = securehash.TreeHasher(len(self.CONTENT), securehash.BLAKE2B, chunk_size)
+            hasher.update(self.CONTENT)
+            return hasher.hexdigest()
+        assert tree_hash(100) != tree_hash(200)
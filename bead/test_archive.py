@@ -1,10 +1,33 @@
-from .test import TestCase
+from .test import TestCase, setenv
 from . import archive as m
 
+from concurrent.futures import ThreadPoolExecutor
 import os
+from unittest import mock
+import warnings
 import zipfile
 
 from . import layouts
+from . import meta
+from . import tech
+from . import workspace
+from . import zipindex
+from . import zipopener
+from .exceptions import DamagedArchive, InvalidArchive
+
+persistence = tech.persistence
+securehash = tech.securehash
+
+
+# simplified meta - yields invalid BEADs, sufficient for unit testing
+BEAD_META = b'''
+    {
+        "meta_version": "aaa947a6-1f7a-11e6-ba3a-0021cc73492e",
+        "kind": "TEST-FAKE",
+        "freeze_time": "20200913T173910000000+0000",
+        "inputs": {}
+    }
+'''
 
 
 class Test_Archive(TestCase):
@@ -25,6 +48,37 @@ class Test_Archive(TestCase):
         self.when_a_nonexistent_directory_is_extracted()
         self.then_an_empty_directory_is_created()
 
+    def test_verified_extract_dir(self):
+        self.given_a_bead()
+        self.when_a_directory_is_extracted_with_verification()
+        self.then_directory_has_the_expected_files()
+        self.then_file1_has_the_expected_content()
+
+    def test_verified_extract_dir_removes_damaged_files(self):
+        self.given_a_bead()
+        self.given_file2_is_damaged()
+        self.when_a_damaged_directory_is_extracted_with_verification()
+        self.then_destination_directory_is_removed()
+
+    def test_parallel_extract_dir(self):
+        self.given_a_bead_with_many_files()
+        self.when_many_files_are_extracted_in_parallel()
+        self.then_many_files_are_extracted()
+
+    def test_parallel_extract_dir_reads_the_central_directory_once(self):
+        self.given_a_bead_with_many_files()
+        zipopener.close_all()
+        with mock.patch.object(zipindex, 'open_zip', wraps=zipindex.open_zip) as open_zip:
+            self.when_many_files_are_extracted_in_parallel()
+        self.then_many_files_are_extracted()
+        assert 1 == open_zip.call_count
+
+    def test_parallel_verified_extract_dir_removes_damaged_files(self):
+        self.given_a_bead()
+        self.given_file2_is_damaged()
+        self.when_a_damaged_directory_is_extracted_with_verification(jobs=4)
+        self.then_destination_directory_is_removed()
+
     def test_content_id(self):
         self.given_a_bead()
         self.when_content_id_is_checked()
@@ -38,24 +92,49 @@ class Test_Archive(TestCase):
     __content_id = None
 
     def given_a_bead(self):
-        # yields an invalid BEAD (meta is simplified), sufficient for unit testing
         self.__bead = self.new_temp_dir() / 'bead.zip'
         with zipfile.ZipFile(self.__bead, 'w') as z:
-            z.writestr(
-                layouts.Archive.BEAD_META,
-                b'''
-                    {
-                        "meta_version": "aaa947a6-1f7a-11e6-ba3a-0021cc73492e",
-                        "kind": "TEST-FAKE",
-                        "freeze_time": "20200913T173910000000+0000",
-                        "inputs": {}
-                    }
-                ''')
+            z.writestr(layouts.Archive.BEAD_META, BEAD_META)
             z.writestr('somefile1', b'''somefile1's known content''')
             z.writestr('path/file1', b'''?? file1's known content''')
             z.writestr('path/to/file1', b'''file1's known content''')
             z.writestr('path/to/file2', b'''file2's known content''')
-            z.writestr(layouts.Archive.MANIFEST, b'some manifest')
+            z.writestr(
+                layouts.Archive.MANIFEST,
+                persistence.dumps({
+                    'path/to/file1': securehash.bytes(b'''file1's known content'''),
+                    'path/to/file2': securehash.bytes(b'''file2's known content'''),
+                }))
+
+    def given_a_bead_with_many_files(self):
+        self.__bead = self.new_temp_dir() / 'bead.zip'
+        manifest = {}
+        with zipfile.ZipFile(self.__bead, 'w') as z:
+            z.writestr(layouts.Archive.BEAD_META, BEAD_META)
+            for i in range(100):
+                content = f'content {i}'.encode() * i
+                name = f'path/dir{i % 7}/sub{i % 3}/file{i}'
+                z.writestr(name, content)
+                manifest[name] = securehash.bytes(content)
+            z.writestr(layouts.Archive.MANIFEST, persistence.dumps(manifest))
+
+    def when_many_files_are_extracted_in_parallel(self):
+        self.__extracteddir = self.new_temp_dir() / 'destination dir'
+        bead = m.Archive(self.__bead)
+        bead.extract_dir('path', self.__extracteddir, verify=True, jobs=4)
+
+    def then_many_files_are_extracted(self):
+        for i in range(100):
+            path = os.path.join(self.__extracteddir, f'dir{i % 7}/sub{i % 3}/file{i}')
+            with open(path, 'rb') as f:
+                assert f'content {i}'.encode() * i == f.read()
+
+    def given_file2_is_damaged(self):
+        with zipfile.ZipFile(self.__bead, 'a') as z:
+            with warnings.catch_warnings():
+                # duplicate name in zip file
+                warnings.simplefilter('ignore')
+                z.writestr('path/to/file2', b'''file2's damaged content''')
 
     def when_file1_is_extracted(self):
         self.__extractedfile = self.new_temp_dir() / 'extracted_file'
@@ -90,3 +169,116 @@ class Test_Archive(TestCase):
     def then_an_empty_directory_is_created(self):
         assert os.path.isdir(self.__extracteddir)
         assert [] == os.listdir(self.__extracteddir)
+
+    def when_a_directory_is_extracted_with_verification(self):
+        self.__extracteddir = self.new_temp_dir() / 'destination dir'
+        bead = m.Archive(self.__bead)
+        bead.extract_dir('path/to', self.__extracteddir, verify=True)
+        self.__extractedfile = os.path.join(self.__extracteddir, 'file1')
+
+    def when_a_damaged_directory_is_extracted_with_verification(self, jobs=None):
+        self.__extracteddir = self.new_temp_dir() / 'destination dir'
+        bead = m.Archive(self.__bead)
+        with self.assertRaises(DamagedArchive) as cm:
+            bead.extract_dir('path/to', self.__extracteddir, verify=True, jobs=jobs)
+        assert ['path/to/file2'] == cm.exception.damaged_members
+
+    def then_destination_directory_is_removed(self):
+        assert not os.path.exists(self.__extracteddir)
+
+
+DATA_FILES = {
+    'file1': b'file1 content',
+    'dir/file2': b'file2 content ' * 1000,
+    'dir/file3': b'',
+}
+
+
+class Test_data_readers(TestCase):
+
+    def test_open_data(self):
+        bead = self.make_bead()
+        for path, content in DATA_FILES.items():
+            with bead.open_data(path) as f:
+                assert content == f.read()
+
+    def test_tree_hashed_data_is_verified(self):
+        with setenv('BEAD_META_VERSION', 'blake2b-tree'), setenv('BEAD_TREE_CHUNK_SIZE', '1000'):
+            bead = self.make_bead()
+        with bead.open_data('dir/file2') as f:
+            assert DATA_FILES['dir/file2'] == f.read()
+
+    def test_damaged_data_raises_at_end(self):
+        bead = self.make_bead(damaged='dir/file2')
+        with bead.open_data('dir/file2') as f:
+            f.read(10)
+            self.assertRaises(DamagedArchive, f.read)
+
+    def test_missing_data(self):
+        bead = self.make_bead()
+        self.assertRaises(DamagedArchive, bead.open_data, 'missing')
+
+    def test_iter_data(self):
+        bead = self.make_bead()
+        contents = {path: f.read() for path, f in bead.iter_data()}
+        assert DATA_FILES == contents
+
+    def test_iter_selected_data(self):
+        bead = self.make_bead()
+        paths = [path for path, _f in bead.iter_data(lambda path: path.startswith('dir/'))]
+        assert ['dir/file2', 'dir/file3'] == sorted(paths)
+
+    def test_concurrent_readers(self):
+        bead = self.make_bead()
+
+        def read(path):
+            with bead.open_data(path) as f:
+                return f.read()
+
+        paths = list(DATA_FILES) * 20
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            assert [DATA_FILES[path] for path in paths] == list(executor.map(read, paths))
+
+    # implementation
+
+    def make_bead(self, damaged=None):
+        ws = workspace.Workspace(self.new_temp_dir() / 'ws')
+        ws.create('kind')
+        for path, content in DATA_FILES.items():
+            tech.fs.ensure_directory(os.path.dirname(ws.directory / 'output' / path))
+            tech.fs.write_file(ws.directory / 'output' / path, content)
+        archive_path = self.new_temp_dir() / 'bead.zip'
+        ws.pack(archive_path, tech.timestamp.timestamp(), comment='')
+        if damaged:
+            with zipfile.ZipFile(archive_path, 'a') as z:
+                with warnings.catch_warnings():
+                    warnings.simplefilter('ignore')
+                    z.writestr(layouts.Archive.DATA / damaged, b'damaged content')
+        return m.Archive(archive_path)
+
+
+class Test_tree_hash_forgery(TestCase):
+
+    def test_content_looking_like_a_tree_node_is_not_accepted(self):
+        # the forged content must fit into a single chunk
+        with setenv('BEAD_META_VERSION', 'blake2b-tree'), setenv('BEAD_TREE_CHUNK_SIZE', '4096'):
+            bead = Test_data_readers.make_bead(self)
+        zip_path = layouts.Archive.DATA / 'dir/file2'
+        with zipfile.ZipFile(bead.archive_filename) as z:
+            chunks = persistence.loads(z.read(layouts.Archive.CHUNKS).decode('utf-8'))
+            size = z.getinfo(zip_path).file_size
+        chunk_hashes = chunks[meta.CHUNK_HASHES][zip_path]
+        # the serialization of the tree node of the original content
+        forged_content = (
+            f'tree:{size}:{chunks[meta.CHUNK_SIZE]}:' + ','.join(chunk_hashes)).encode('ascii')
+        forged_path = self.new_temp_dir() / 'forged.zip'
+        with zipfile.ZipFile(bead.archive_filename) as z:
+            with zipfile.ZipFile(forged_path, 'w') as forged:
+                for info in z.infolist():
+                    content = forged_content if info.filename == zip_path else z.read(info)
+                    forged.writestr(info.filename, content)
+
+        forged_bead = m.Archive(forged_path)
+        assert bead.content_id == forged_bead.content_id
+        with self.assertRaises(InvalidArchive):
+            forged_bead.validate(paranoid=True)
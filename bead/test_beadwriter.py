@@ -0,0 +1,125 @@
+from .test import TestCase, setenv
+from . import beadwriter as m
+
+import io
+import os
+import stat
+
+from .box import Box
+from . import meta
+from . import zipindex
+
+CONTENT = b'streamed content\n' * 1000
+INPUT = meta.InputSpec('in', 'input-kind', 'input-content-id', '20200101T000000000000+0000')
+FREEZE_TIME = '20210101T000000000000+0000'
+
+
+class Test_BeadWriter(TestCase):
+
+    def test_streamed_files_are_stored(self):
+        box = self.given_a_box()
+        with m.BeadWriter(box, 'bead', 'kind') as writer:
+            writer.add_data('bytes', CONTENT)
+            blocks = (CONTENT[i:i + 100] for i in range(0, len(CONTENT), 100))
+            writer.add_data('dir/iterator', blocks)
+            writer.add_data('file', io.BytesIO(CONTENT))
+            writer.add_data('sized-file', io.BytesIO(CONTENT), size=len(CONTENT))
+            writer.add_code('code.py', b'print(1)\n')
+        archive = writer.archive
+        archive.validate()
+        for path in ('bytes', 'dir/iterator', 'file', 'sized-file'):
+            with archive.open_data(path) as f:
+                assert CONTENT == f.read()
+        assert 'kind' == archive.kind
+
+    def test_committed_bead_is_added_to_the_box_index(self):
+        box = self.given_a_box()
+        box.index.refresh()
+        with m.BeadWriter(box, 'bead', 'kind', freeze_time=FREEZE_TIME) as writer:
+            writer.add_data('file', CONTENT)
+
+        with box.index._database() as db:
+            rows = db.execute('SELECT file_name, kind FROM beads').fetchall()
+        assert [(f'bead_{FREEZE_TIME}.zip', 'kind')] == rows
+        assert zipindex.has_current_index(writer.archive_path)
+
+    def test_tree_hashed_bead(self):
+        box = self.given_a_box()
+        with setenv('BEAD_META_VERSION', 'blake2b-tree'), setenv('BEAD_TREE_CHUNK_SIZE', '1000'):
+            with m.BeadWriter(box, 'bead', 'kind') as writer:
+                writer.add_data('file', io.BytesIO(CONTENT))
+                writer.add_data('sized-file', io.BytesIO(CONTENT), size=len(CONTENT))
+        writer.archive.validate()
+
+    def test_inputs_are_recorded(self):
+        box = self.given_a_box()
+        with m.BeadWriter(
+            box, 'bead', 'kind', inputs=[INPUT], input_map={'in': 'input-bead'},
+            freeze_time=FREEZE_TIME
+        ) as writer:
+            pass
+        archive = writer.archive
+        assert (INPUT,) == archive.inputs
+        assert {'in': 'input-bead'} == archive.input_map
+        assert FREEZE_TIME == archive.freeze_time_str
+        assert box.directory / f'bead_{FREEZE_TIME}.zip' == writer.archive_path
+
+    def test_nothing_remains_after_error(self):
+        box = self.given_a_box()
+        with self.assertRaises(ZeroDivisionError):
+            with m.BeadWriter(box, 'bead', 'kind') as writer:
+                writer.add_data('file', CONTENT)
+                1 / 0
+        assert [] == os.listdir(box.directory)
+
+    def test_wrong_size_is_an_error(self):
+        box = self.given_a_box()
+        with self.assertRaises(ValueError):
+            with m.BeadWriter(box, 'bead', 'kind') as writer:
+                writer.add_data('file', io.BytesIO(CONTENT), size=len(CONTENT) + 1)
+        assert [] == os.listdir(box.directory)
+
+    def test_failed_add_prevents_commit(self):
+        box = self.given_a_box()
+        writer = m.BeadWriter(box, 'bead', 'kind')
+        writer.add_data('file', CONTENT)
+        with self.assertRaises(ValueError):
+            writer.add_data('wrong-size', io.BytesIO(CONTENT), size=len(CONTENT) + 1)
+        writer.add_data('file2', CONTENT)
+
+        self.assertRaises(ValueError, writer.commit)
+        assert [] == os.listdir(box.directory)
+
+    def test_bead_mode_honours_umask(self):
+        box = self.given_a_box()
+        umask = os.umask(0o027)
+        try:
+            with m.BeadWriter(box, 'bead', 'kind') as writer:
+                writer.add_data('file', CONTENT)
+        finally:
+            os.umask(umask)
+        assert 0o640 == stat.S_IMODE(os.stat(writer.archive_path).st_mode)
+
+    def test_existing_bead_is_not_replaced(self):
+        box = self.given_a_box()
+        with m.BeadWriter(box, 'bead', 'kind', freeze_time=FREEZE_TIME) as writer:
+            writer.add_data('file', b'original')
+        writer = m.BeadWriter(box, 'bead', 'kind', freeze_time=FREEZE_TIME)
+        writer.add_data('file', b'replacement')
+        self.assertRaises(FileExistsError, writer.commit)
+        assert [f'bead_{FREEZE_TIME}.zip'] == sorted(
+            f for f in os.listdir(box.directory) if f.endswith('.zip'))
+        with box.find_bead('bead', '').open_data('file') as f:
+            assert b'original' == f.read()
+
+    def test_invalid_paths(self):
+        box = self.given_a_box()
+        writer = m.BeadWriter(box, 'bead', 'kind')
+        self.addCleanup(writer.abort)
+        for path in ('/absolute', '../outside', 'dir/../file', 'dir//file', ''):
+            self.assertRaises(ValueError, writer.add_data, path, b'')
+
+    # implementation
+
+    def given_a_box(self):
+        return Box('box', self.new_temp_dir())
@@ -1,5 +1,11 @@
 from .test import TestCase
-from .box import Box
+from .box import Box, UnionBox
+
+import os
+from unittest import mock
+
+from .archive import Archive
+from .boxindex import UnavailableIndex
 from .tech.fs import write_file, rmtree
 from .tech.timestamp import time_from_user
 from .workspace import Workspace
@@ -53,6 +59,32 @@ class Test_box_with_beads(TestCase):
         matches = box.get_context(bead_spec.BEAD_NAME, 'BEAD3', timestamp)
         assert 'BEAD3' == matches.best.name
 
+    def test_get_context_opens_only_the_best_bead(self, box, timestamp):
+        box.index.refresh()
+        with mock.patch('bead.box.Archive', wraps=Archive) as archive:
+            context = box.get_context(bead_spec.KIND, 'test-bead1', timestamp)
+            assert 'bead1' == context.best.name
+        archive.assert_called_once()
+
+    def test_get_context_with_misleading_file_name(self, box, timestamp):
+        bead2 = box.directory / 'bead2_20160704T162800000000+0200.zip'
+        os.rename(bead2, box.directory / 'bead2_20160704T162800000099+0200.zip')
+
+        context = box.get_context(bead_spec.BEAD_NAME, 'bead2', timestamp)
+        assert '20160704T162800000000+0200' == context.best.freeze_time_str
+        context = UnionBox([box]).get_context(bead_spec.BEAD_NAME, 'bead2', timestamp)
+        assert '20160704T162800000000+0200' == context.best.freeze_time_str
+
+    def test_prev_and_next(self, box):
+        def context_at(timestamp):
+            return UnionBox([box]).get_context(
+                bead_spec.KIND, 'test-bead1', time_from_user(timestamp))
+
+        context = context_at('20160704T000000000000+0300')
+        assert (None, None, 'bead1') == (context.bead, context.prev, context.next.name)
+        context = context_at('20160704T000000000000+0100')
+        assert (None, 'bead1', None) == (context.bead, context.prev.name, context.next)
+
 
 class Test_box_methods_tolerate_junk_in_box(Test_box_with_beads):
 
@@ -62,3 +94,100 @@ class Test_box_methods_tolerate_junk_in_box(Test_box_with_beads):
         # add junk
         write_file(box.directory / 'some-non-bead-file', 'random bits')
         return box
+
+
+class Test_timeline(TestCase):
+
+    # fixtures
+    def box(self):
+        box = Box('test', self.new_temp_dir())
+        for freeze_time in (
+            '20160704T100000000000+0000',
+            '20160704T110000000000+0000',
+            '20160704T120000000000+0000',
+        ):
+            ws = Workspace(self.new_temp_dir() / 'bead')
+            ws.create('kind')
+            box.store(ws, freeze_time)
+        return box
+
+    # tests
+    def test_context(self, box):
+        context = box.get_context(
+            bead_spec.BEAD_NAME, 'bead', time_from_user('20160704T113000000000+0000'))
+        assert '20160704T110000000000+0000' == context.prev.freeze_time_str
+        assert '20160704T120000000000+0000' == context.next.freeze_time_str
+        assert context.bead is None
+
+    def test_exact_match(self, box):
+        context = box.timeline('bead').context(time_from_user('20160704T110000000000+0000'))
+        assert '20160704T110000000000+0000' == context.bead.freeze_time_str
+        assert '20160704T100000000000+0000' == context.prev.freeze_time_str
+        assert '20160704T120000000000+0000' == context.next.freeze_time_str
+
+    def test_beads_between(self, box):
+        beads = UnionBox([box]).beads_between(
+            'bead',
+            time_from_user('20160704T100000000001+0000'),
+            time_from_user('20160704T120000000000+0000'))
+        assert ['20160704T110000000000+0000', '20160704T120000000000+0000'] == [
+            bead.freeze_time_str for bead in beads]
+
+    def test_unknown_bead(self, box):
+        assert 0 == len(box.timeline('unknown'))
+        self.assertRaises(
+            LookupError,
+            box.get_context, bead_spec.BEAD_NAME, 'unknown', time_from_user('20160704'))
+
+    def test_timeline_is_kept_while_the_box_is_unchanged(self, box):
+        # make the directory's modification time older than its timestamp resolution
+        os.utime(box.directory, ns=(0, 0))
+        box.timeline('bead')
+        with mock.patch.object(box, '_timeline_files') as timeline_files:
+            assert 3 == len(box.timeline('bead'))
+        timeline_files.assert_not_called()
+
+    def test_prev_and_next_skip_invalid_files(self, box):
+        write_file(box.directory / 'bead_20160704T103000000000+0000.zip', 'junk')
+        write_file(box.directory / 'bead_20160704T113000000000+0000.zip', 'junk')
+        with mock.patch.object(Box, 'index', mock.PropertyMock(side_effect=UnavailableIndex)):
+            for get_context in (box.get_context, UnionBox([box]).get_context):
+                context = get_context(
+                    bead_spec.BEAD_NAME, 'bead', time_from_user('20160704T110000000000+0000'))
+                assert '20160704T100000000000+0000' == context.prev.freeze_time_str
+                assert '20160704T120000000000+0000' == context.next.freeze_time_str
+
+    def test_timeline_without_index(self, box):
+        with mock.patch.object(Box, 'index', mock.PropertyMock(side_effect=UnavailableIndex)):
+            assert 3 == len(box.timeline('bead'))
+            context = box.get_context(
+                bead_spec.BEAD_NAME, 'bead', time_from_user('20160704T113000000000+0000'))
+        assert '20160704T110000000000+0000' == context.prev.freeze_time_str
+
+
+class Test_find_by_content_id(TestCase):
+
+    # fixtures
+    def box(self):
+        return Test_box_with_beads.box(self)
+
+    def content_id(self, box):
+        return box.find_bead('bead2', '').content_id
+
+    # tests
+    def test_prefix(self, box, content_id):
+        assert ['bead2'] == [bead.name for bead in box.find_by_content_id(content_id[:8])]
+
+    def test_renamed_bead_is_found(self, box, content_id):
+        bead2 = box.directory / 'bead2_20160704T162800000000+0200.zip'
+        os.rename(bead2, box.directory / 'renamed_20160704T162800000000+0200.zip')
+
+        assert box.find_bead('bead2', content_id) is None
+        assert 'renamed' == UnionBox([box]).find_bead('bead2', content_id).name
+
+    def test_name_match_is_preferred(self, box, content_id):
+        renamed = box.directory / 'renamed_20160704T162800000000+0200.zip'
+        os.link(box.directory / 'bead2_20160704T162800000000+0200.zip', renamed)
+
+        assert 'bead2' == UnionBox([box]).find_bead('bead2', content_id).name
+        assert 2 == len(list(UnionBox([box]).find_by_content_id(content_id)))
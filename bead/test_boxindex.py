@@ -0,0 +1,213 @@
+from .test import TestCase
+from . import boxindex as m
+
+import os
+import shutil
+import zipfile
+from unittest import mock
+
+from .archive import Archive
+from .box import Box
+from .workspace import Workspace
+from . import layouts
+from . import spec as bead_spec
+from . import zipopener
+
+TS1 = '20160704T000000000000+0200'
+TS2 = '20160704T162800000000+0200'
+
+
+def make_box_with_beads(new_temp_dir):
+    box = Box('test', new_temp_dir())
+
+    def add_bead(name, kind, freeze_time):
+        ws = Workspace(new_temp_dir() / name)
+        ws.create(kind)
+        box.store(ws, freeze_time)
+
+    add_bead('bead1', 'kind1', TS1)
+    add_bead('bead1', 'kind1', TS2)
+    add_bead('bead2', 'kind2', TS1)
+    return box
+
+
+class Test_BoxIndex(TestCase):
+
+    def test_queries(self):
+        box = self.given_a_box_with_beads()
+        index = m.BoxIndex(box.directory)
+        index.refresh()
+        content_id = Archive(box.directory / f'bead1_{TS1}.zip').content_id
+
+        assert [f'bead1_{TS1}.zip', f'bead1_{TS2}.zip'] == index.file_names(
+            [(bead_spec.BEAD_NAME, 'bead1')])
+        assert [f'bead2_{TS1}.zip'] == index.file_names([(bead_spec.KIND, 'kind2')])
+        assert [f'bead1_{TS1}.zip'] == index.file_names(
+            [(bead_spec.BEAD_NAME, 'bead1'), (bead_spec.CONTENT_ID, content_id[:10])])
+        assert 3 == len(index.file_names([]))
+        assert os.path.exists(box.directory / m.INDEX_FILE)
+
+    def test_new_and_removed_files_are_found(self):
+        box = self.given_a_box_with_beads()
+        index = m.BoxIndex(box.directory)
+        index.refresh()
+        shutil.copy(box.directory / f'bead2_{TS1}.zip', box.directory / f'bead3_{TS1}.zip')
+        os.remove(box.directory / f'bead1_{TS1}.zip')
+
+        assert [f'bead1_{TS2}.zip', f'bead2_{TS1}.zip', f'bead3_{TS1}.zip'] == (
+            index.file_names([]))
+
+    def test_only_changed_files_are_opened(self):
+        box = self.given_a_box_with_beads()
+        index = m.BoxIndex(box.directory)
+        index.refresh()
+        with open(box.directory / 'junk', 'w') as f:
+            f.write('not a zip file')
+
+        with mock.patch.object(m, 'Archive', wraps=Archive) as archive:
+            index.refresh()
+            index.refresh()
+        archive.assert_called_once_with(box.directory / 'junk')
+        assert 3 == len(index.file_names([]))
+
+    def test_unchanged_directory_is_not_listed(self):
+        box = self.given_a_box_with_beads()
+        index = m.BoxIndex(box.directory)
+        index.refresh()
+        # make the directory's modification time older than its timestamp resolution
+        os.utime(box.directory, ns=(0, 0))
+        index.refresh()
+
+        with mock.patch.object(m, '_directory_stats') as directory_stats:
+            assert 3 == len(index.file_names([]))
+        directory_stats.assert_not_called()
+
+    def test_changed_input_map_is_reindexed(self):
+        box = self.given_a_box_with_beads()
+        index = m.BoxIndex(box.directory)
+        index.refresh()
+        Archive(box.directory / f'bead2_{TS1}.zip').input_map = {'input': 'renamed'}
+
+        index.refresh()
+        with index._database() as db:
+            [(input_map,)] = db.execute(
+                'SELECT input_map FROM beads WHERE name = ?', ('bead2',)).fetchall()
+        assert {'input': 'renamed'} == m.persistence.loads(input_map)
+
+    def test_queries_do_not_create_the_index(self):
+        box = self.given_a_box_with_beads()
+
+        with mock.patch('bead.box.Archive', wraps=Archive) as archive:
+            assert 'bead2' == box.find_bead('bead2', '').name
+        archive.assert_called_once_with(box.directory / f'bead2_{TS1}.zip', box.name)
+        assert 3 == len(list(box.all_beads()))
+        assert not os.path.exists(box.directory / m.INDEX_FILE)
+        self.assertRaises(m.UnavailableIndex, m.BoxIndex(box.directory).file_names, [])
+
+    def test_box_works_with_broken_index(self):
+        box = self.given_a_box_with_beads()
+        os.mkdir(box.directory / m.INDEX_FILE)
+
+        assert 3 == len(list(box.all_beads()))
+        assert 'bead2' == box.find_bead('bead2', '').name
+
+    def test_interrupted_refresh_keeps_indexed_batches(self):
+        box = self.given_a_box_with_beads()
+        index = m.BoxIndex(box.directory)
+        index_archive = index._index
+        indexed = []
+
+        def index_two_archives(db, file_name, stats):
+            if len(indexed) == 2:
+                raise KeyboardInterrupt
+            index_archive(db, file_name, stats)
+            indexed.append(file_name)
+
+        with mock.patch.object(m, 'REFRESH_BATCH_SIZE', 1), \
+                mock.patch.object(index, '_index', side_effect=index_two_archives):
+            self.assertRaises(KeyboardInterrupt, index.refresh)
+
+        with index._database() as db:
+            [(count,)] = db.execute('SELECT count(*) FROM beads').fetchall()
+        assert 2 == count
+
+    # implementation
+
+    def given_a_box_with_beads(self):
+        return make_box_with_beads(self.new_temp_dir)
+
+
+class Test_reindex(TestCase):
+
+    def test_archives_without_sidecars_are_reindexed(self):
+        box = self.given_a_box_with_beads()
+        file_names = m.archives_to_reindex(box.directory)
+        assert [f'bead1_{TS1}.zip', f'bead1_{TS2}.zip', f'bead2_{TS1}.zip', 'junk'] == file_names
+
+        results = list(m.reindex_archives([box.directory / f for f in file_names], jobs=2))
+
+        assert [box.directory / f for f in file_names] == [result.path for result in results]
+        assert [None, None, None] == [result.error for result in results[:3]]
+        assert 'not a valid bead archive' in results[3].error
+        assert ['junk'] == m.archives_to_reindex(box.directory)
+        assert os.path.exists(box.directory / f'bead1_{TS1}.xmeta')
+        assert m.zipindex.has_current_index(box.directory / f'bead1_{TS1}.zip')
+
+    def test_archive_without_manifest_is_reported(self):
+        box = self.given_a_box_with_beads()
+        source = box.directory / f'bead2_{TS1}.zip'
+        no_manifest = box.directory / f'no-manifest_{TS1}.zip'
+        with zipfile.ZipFile(source) as z, zipfile.ZipFile(no_manifest, 'w') as target:
+            for info in z.infolist():
+                if info.filename != layouts.Archive.MANIFEST:
+                    target.writestr(info, z.read(info))
+
+        results = list(m.reindex_archives([no_manifest, source], jobs=2))
+
+        assert 'not a valid bead archive' in results[0].error
+        assert results[1].error is None
+        assert 3 == len(list(box.all_beads()))
+
+    def test_replaced_archive_is_reindexed(self):
+        box = self.given_a_box_with_beads()
+        path = box.directory / f'bead1_{TS1}.zip'
+        m.reindex_archive(path)
+        Archive(path).input_map = {'input': 'bead'}
+        shutil.copy(box.directory / f'bead2_{TS1}.zip', path)
+        os.utime(box.directory / f'bead1_{TS1}.xmeta', ns=(0, 0))
+        zipopener.close_all()
+
+        assert f'bead1_{TS1}.zip' in m.archives_to_reindex(box.directory)
+        assert m.reindex_archive(path).error is None
+        assert f'bead1_{TS1}.zip' not in m.archives_to_reindex(box.directory)
+        archive = Archive(path)
+        assert 'kind2' == archive.kind
+        assert Archive(box.directory / f'bead2_{TS1}.zip').content_id == archive.content_id
+        assert {'input': 'bead'} == archive.input_map
+
+    def test_unexpected_errors_are_reported(self):
+        box = self.given_a_box_with_beads()
+        with mock.patch.object(m, 'Archive', side_effect=KeyError('unexpected')):
+            result = m.reindex_archive(box.directory / f'bead2_{TS1}.zip')
+        assert 'unexpected' in result.error
+
+    def test_reindex_continues_where_it_stopped(self):
+        box = self.given_a_box_with_beads()
+        m.reindex_archive(box.directory / f'bead1_{TS1}.zip')
+
+        assert f'bead1_{TS1}.zip' not in m.archives_to_reindex(box.directory)
+
+    def test_changed_archive_is_reindexed(self):
+        box = self.given_a_box_with_beads()
+        m.reindex_archive(box.directory / f'bead1_{TS1}.zip')
+        os.utime(box.directory / f'bead1_{TS1}.xmeta', ns=(0, 0))
+
+        assert f'bead1_{TS1}.zip' in m.archives_to_reindex(box.directory)
+
+    # implementation
+
+    def given_a_box_with_beads(self):
+        box = make_box_with_beads(self.new_temp_dir)
+        with open(box.directory / 'junk', 'w') as f:
+            f.write('not a zip file')
+        return box
@@ -0,0 +1,122 @@
+from .test import TestCase, setenv
+from . import compression as m
+
+import os
+import zipfile
+
+from .archive import Archive
+from . import tech
+from . import workspace
+
+write_file = tech.fs.write_file
+timestamp = tech.timestamp.timestamp
+
+COMPRESSIBLE = b'compressible ' * 1000
+INCOMPRESSIBLE = os.urandom(10000)
+
+
+class Test_parse_method(TestCase):
+
+    def test_method_without_level(self):
+        method = m.parse_method('lzma')
+        assert zipfile.ZIP_LZMA == method.compress_type
+        assert method.level is None
+
+    def test_method_with_level(self):
+        method = m.parse_method('deflated:1')
+        assert zipfile.ZIP_DEFLATED == method.compress_type
+        assert 1 == method.level
+
+    def test_unknown_method(self):
+        self.assertRaises(ValueError, m.parse_method, 'zstd')
+
+    def test_invalid_level(self):
+        self.assertRaises(ValueError, m.parse_method, 'deflated:10')
+        self.assertRaises(ValueError, m.parse_method, 'deflated:x')
+        self.assertRaises(ValueError, m.parse_method, 'stored:1')
+
+
+class Test_Policy(TestCase):
+
+    def test_compressed_formats_are_stored(self):
+        assert m.STORED == m.Policy().method_for('data/image.PNG', COMPRESSIBLE)
+
+    def test_incompressible_content_is_stored(self):
+        assert m.STORED == m.Policy().method_for('data/file', INCOMPRESSIBLE)
+
+    def test_compressible_content_uses_default(self):
+        assert m.DEFLATED == m.Policy().method_for('data/file', COMPRESSIBLE)
+
+    def test_without_probe_default_is_used(self):
+        policy = m.Policy(probe=False)
+        assert m.DEFLATED == policy.method_for('data/file', INCOMPRESSIBLE)
+
+    def test_config(self):
+        policy = m.Policy.from_config(
+            {'method': 'bz2:9', 'probe': False, 'rules': {'.CSV': 'lzma'}})
+        assert m.parse_method('bz2:9') == policy.method_for('data/file', INCOMPRESSIBLE)
+        assert m.parse_method('lzma') == policy.method_for('data/a.csv', COMPRESSIBLE)
+        assert m.STORED == policy.method_for('data/a.zip', COMPRESSIBLE)
+
+    def test_documented_config_is_valid(self):
+        doc = m.__doc__
+        config = doc[doc.index('\n{\n'):doc.index('\n}\n') + 2]
+        policy = m.Policy.from_config(tech.persistence.loads(config))
+        assert m.parse_method('lzma') == policy.method_for('data/a.csv', COMPRESSIBLE)
+
+
+class Test_workspace_compression(TestCase):
+
+    def test_members_are_compressed_by_policy(self):
+        self.given_a_workspace_with_compression_config()
+        self.when_saved()
+        self.then_members_are_compressed_by_policy()
+        self.then_archive_is_valid()
+        self.then_stats_are_available()
+
+    def test_environment_overrides_default_method(self):
+        self.given_a_workspace_with_compression_config()
+        with setenv(m.COMPRESSION_ENV_VAR, 'stored'):
+            self.when_saved()
+        self.then_compress_type_is(zipfile.ZIP_STORED, 'data/compressible')
+        self.then_compress_type_is(zipfile.ZIP_LZMA, 'data/table.csv')
+
+    # implementation
+
+    __workspace = None
+    __archive = None
+
+    def given_a_workspace_with_compression_config(self):
+        self.__workspace = workspace.Workspace(self.new_temp_dir() / 'ws')
+        self.__workspace.create('kind')
+        directory = self.__workspace.directory
+        write_file(directory / 'output/compressible', COMPRESSIBLE)
+        write_file(directory / 'output/incompressible', INCOMPRESSIBLE)
+        write_file(directory / 'output/table.csv', COMPRESSIBLE)
+        write_file(directory / 'output/archive.zip', COMPRESSIBLE)
+        write_file(
+            directory / '.bead-meta/compression',
+            '{"method": "bz2", "rules": {".csv": "lzma"}}')
+
+    def when_saved(self):
+        self.__archive = self.new_temp_dir() / 'bead.zip'
+        self.__workspace.pack(self.__archive, timestamp(), comment='')
+
+    def then_compress_type_is(self, compress_type, zip_path):
+        with zipfile.ZipFile(self.__archive) as z:
+            assert compress_type == z.getinfo(zip_path).compress_type
+
+    def then_members_are_compressed_by_policy(self):
+        self.then_compress_type_is(zipfile.ZIP_BZIP2, 'data/compressible')
+        self.then_compress_type_is(zipfile.ZIP_STORED, 'data/incompressible')
+        self.then_compress_type_is(zipfile.ZIP_LZMA, 'data/table.csv')
+        self.then_compress_type_is(zipfile.ZIP_STORED, 'data/archive.zip')
+
+    def then_archive_is_valid(self):
+        Archive(self.__archive).validate()
+
+    def then_stats_are_available(self):
+        stats = self.__workspace.compression_stats.by_method
+        assert {'bz2', 'lzma', 'stored'} == set(stats)
+        assert 2 == stats['stored'][m.FILES]
+        assert stats['lzma'][m.BYTES_OUT] < stats['lzma'][m.BYTES_IN]
@@ -0,0 +1,89 @@
+from .test import TestCase
+from . import hashcache as m
+
+import os
+import time
+
+from . import tech
+
+write_file = tech.fs.write_file
+
+AN_HOUR_AGO_NS = time.time_ns() - 3600 * 10 ** 9
+
+
+class Test_HashCache(TestCase):
+
+    def test_unchanged_file_has_cached_hash(self):
+        self.given_a_saved_cache_with_an_old_file()
+        self.when_cache_is_reloaded()
+        self.then_file_has_cached_hash()
+
+    def test_changed_file_has_no_cached_hash(self):
+        self.given_a_saved_cache_with_an_old_file()
+        self.given_file_is_changed()
+        self.when_cache_is_reloaded()
+        self.then_file_has_no_cached_hash()
+
+    def test_recently_modified_file_has_no_cached_hash(self):
+        self.given_a_saved_cache_with_a_recently_modified_file()
+        self.when_cache_is_reloaded()
+        self.then_file_has_no_cached_hash()
+
+    def test_hashes_of_other_version_are_ignored(self):
+        self.given_a_saved_cache_with_an_old_file()
+        self.when_cache_is_reloaded(version='other')
+        self.then_file_has_no_cached_hash()
+
+    def test_changes(self):
+        self.given_a_saved_cache_with_an_old_file()
+        self.given_file_is_changed()
+        self.when_cache_is_reloaded()
+        self.then_changes_are(changed=('data/file',))
+
+    def test_new_and_deleted_files(self):
+        self.given_a_saved_cache_with_an_old_file()
+        self.when_cache_is_reloaded()
+        self.then_changes_of_renamed_file_are_new_and_deleted()
+
+    # implementation
+
+    __cache_path = None
+    __file = None
+    __cache = None
+
+    def given_a_saved_cache_with_an_old_file(self):
+        self.__save_cache_with_file(mtime_ns=AN_HOUR_AGO_NS)
+
+    def given_a_saved_cache_with_a_recently_modified_file(self):
+        self.__save_cache_with_file(mtime_ns=None)
+
+    def __save_cache_with_file(self, mtime_ns):
+        directory = self.new_temp_dir()
+        self.__cache_path = directory / 'cache'
+        self.__file = directory / 'file'
+        write_file(self.__file, 'content')
+        if mtime_ns is not None:
+            os.utime(self.__file, ns=(mtime_ns, mtime_ns))
+        cache = m.HashCache(self.__cache_path, 'version')
+        cache.put('data/file', os.stat(self.__file), 'hash', ['hash'])
+        cache.save()
+
+    def given_file_is_changed(self):
+        write_file(self.__file, 'changed content')
+
+    def when_cache_is_reloaded(self, version='version'):
+        self.__cache = m.HashCache(self.__cache_path, version)
+
+    def then_file_has_cached_hash(self):
+        assert ('hash', ['hash']) == self.__cache.get('data/file', os.stat(self.__file))
+
+    def then_file_has_no_cached_hash(self):
+        assert self.__cache.get('data/file', os.stat(self.__file)) is None
+
+    def then_changes_are(self, new=(), changed=(), deleted=()):
+        changes = self.__cache.changes([(self.__file, 'data/file')], 'data')
+        assert m.FileChanges(new, changed, deleted) == changes
+
+    def then_changes_of_renamed_file_are_new_and_deleted(self):
+        changes = self.__cache.changes([(self.__file, 'data/renamed')], 'data')
+        assert m.FileChanges(('data/renamed',), (), ('data/file',)) == changes
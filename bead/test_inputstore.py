@@ -0,0 +1,188 @@
+from .test import TestCase, setenv, skipIf
+from . import inputstore as m
+
+import os
+from unittest import mock
+import warnings
+import zipfile
+
+from .archive import Archive
+from .exceptions import DamagedArchive
+from . import layouts
+from . import tech
+from . import workspace
+from . import zipopener
+
+write_file = tech.fs.write_file
+timestamp = tech.timestamp.timestamp
+
+FILES = {
+    'output/file1': b'content 1',
+    'output/dir/file2': b'content 2',
+    'output/dir/same-as-file1': b'content 1',
+}
+
+
+class Test_InputStore(TestCase):
+
+    @skipIf(not m.HARD_LINKS, 'inputs get copies of stored files e.g. on Windows')
+    def test_inputs_are_linked_to_stored_files(self):
+        self.given_a_store()
+        self.given_a_bead()
+        self.when_loaded_into_workspaces('ws1', 'ws2')
+        self.then_inputs_have_the_bead_files('ws1', 'ws2')
+        self.then_files_are_shared('ws1', 'ws2')
+
+    def test_stored_files_are_not_extracted_again(self):
+        self.given_a_store()
+        self.given_a_bead()
+        self.when_loaded_into_workspaces('ws1')
+        self.given_a_store()
+        self.when_loaded_into_workspaces('ws2')
+        assert 0 == self.__store.bytes_added
+
+    def test_damaged_files_are_not_stored(self):
+        self.given_a_store()
+        self.given_a_damaged_bead()
+        self.assertRaises(DamagedArchive, self.when_loaded_into_workspaces, 'ws1')
+        assert not self.__store.has(self.__manifest['data/dir/file2'], len(b'content 2'))
+
+    def test_changed_stored_files_are_replaced(self):
+        self.given_a_store()
+        self.given_a_bead()
+        self.when_loaded_into_workspaces('ws1')
+        self.given_a_changed_stored_file('content 1', b'poisoned!')
+        self.when_loaded_into_workspaces('ws2')
+        self.then_inputs_have_the_bead_files('ws2')
+        self.then_stored_files_are('content 1', 'content 2')
+
+    def test_copies_are_used_if_links_are_not_possible(self):
+        self.given_a_store()
+        self.given_a_bead()
+        with mock.patch('os.link', side_effect=OSError):
+            self.when_loaded_into_workspaces('ws1')
+        self.then_inputs_have_the_bead_files('ws1')
+
+    def test_inputs_with_copies_can_be_unloaded(self):
+        self.given_a_store()
+        self.given_a_bead()
+        with mock.patch.object(m, 'HARD_LINKS', False):
+            self.when_loaded_into_workspaces('ws1')
+        self.then_inputs_have_the_bead_files('ws1')
+        self.then_input_files_are_not_linked('ws1')
+        self.when_unloaded_from_workspaces('ws1')
+        self.then_stored_files_are('content 1', 'content 2')
+
+    def test_unused_files_are_evicted_over_max_size(self):
+        self.given_a_store(max_size=0)
+        self.given_a_bead()
+        self.when_loaded_into_workspaces('ws1', 'ws2')
+        self.then_stored_files_are('content 1', 'content 2')
+        self.when_unloaded_from_workspaces('ws1')
+        self.when_evicted()
+        self.then_stored_files_are('content 1', 'content 2')
+        self.when_unloaded_from_workspaces('ws2')
+        self.when_evicted()
+        self.then_stored_files_are()
+        self.when_loaded_into_workspaces('ws3')
+        self.then_inputs_have_the_bead_files('ws3')
+
+    def test_from_environment(self):
+        with setenv(m.STORE_ENV_VAR, ''):
+            assert m.InputStore.from_environment() is None
+        with setenv(m.STORE_ENV_VAR, 'store'), setenv(m.MAX_SIZE_ENV_VAR, '1000'):
+            store = m.InputStore.from_environment()
+            assert ('store', 1000) == (store.directory, store.max_size)
+        with setenv(m.STORE_ENV_VAR, 'store'), setenv(m.MAX_SIZE_ENV_VAR, '1G'):
+            self.assertRaises(ValueError, m.InputStore.from_environment)
+
+    # implementation
+
+    __store = None
+    __store_dir = None
+    __bead = None
+    __manifest = None
+    __workspaces = None
+    __workspaces_dir = None
+
+    def given_a_store(self, max_size=None):
+        if self.__store_dir is None:
+            self.__store_dir = self.new_temp_dir() / 'store'
+        self.__store = m.InputStore(self.__store_dir, max_size)
+
+    def given_a_bead(self):
+        root = self.new_temp_dir()
+        ws = workspace.Workspace(root / 'bead')
+        ws.create('kind')
+        for path, content in FILES.items():
+            tech.fs.ensure_directory(os.path.dirname(ws.directory / path))
+            write_file(ws.directory / path, content)
+        self.__bead = root / 'bead.zip'
+        ws.pack(self.__bead, timestamp(), comment='')
+        self.__manifest = Archive(self.__bead).ziparchive.manifest
+
+    def given_a_damaged_bead(self):
+        self.given_a_bead()
+        with zipfile.ZipFile(self.__bead, 'a') as z:
+            with warnings.catch_warnings():
+                # duplicate name
+                warnings.simplefilter('ignore')
+                z.writestr(layouts.Archive.DATA / 'dir/file2', b'damaged')
+        # forget the central directory read before the change
+        zipopener.close_all()
+
+    def given_a_changed_stored_file(self, content, new_content):
+        for path, _stat in self.__store._objects():
+            with open(path, 'rb') as f:
+                if f.read() == content.encode():
+                    tech.fs.make_writable(path)
+                    write_file(path, new_content)
+                    tech.fs.make_readonly(path)
+
+    def _workspace(self, name):
+        if self.__workspaces is None:
+            self.__workspaces = {}
+            self.__workspaces_dir = self.new_temp_dir()
+        if name not in self.__workspaces:
+            ws = workspace.Workspace(self.__workspaces_dir / name)
+            ws.create('kind')
+            self.__workspaces[name] = ws
+        return self.__workspaces[name]
+
+    def when_loaded_into_workspaces(self, *names):
+        for name in names:
+            self._workspace(name).load('input', Archive(self.__bead), store=self.__store)
+
+    def when_unloaded_from_workspaces(self, *names):
+        for name in names:
+            self._workspace(name).unload('input')
+
+    def when_evicted(self):
+        self.__store.evict()
+
+    def _input_path(self, name, path):
+        return self._workspace(name).directory / 'input/input' / path[len('output/'):]
+
+    def then_inputs_have_the_bead_files(self, *names):
+        for name in names:
+            for path, content in FILES.items():
+                with open(self._input_path(name, path), 'rb') as f:
+                    assert content == f.read()
+
+    def then_files_are_shared(self, *names):
+        for path in FILES:
+            inodes = {os.stat(self._input_path(name, path)).st_ino for name in names}
+            assert 1 == len(inodes)
+        assert 2 == len(list(self.__store._objects()))
+
+    def then_input_files_are_not_linked(self, *names):
+        for name in names:
+            for path in FILES:
+                assert 1 == os.stat(self._input_path(name, path)).st_nlink
+
+    def then_stored_files_are(self, *contents):
+        stored_contents = set()
+        for path, _stat in self.__store._objects():
+            with open(path, 'rb') as f:
+                stored_contents.add(f.read().decode())
+        assert set(contents) == stored_contents
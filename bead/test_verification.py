@@ -0,0 +1,22 @@
+from .test import TestCase, setenv
+from . import verification as m
+
+
+class Test_level(TestCase):
+
+    def test_requested_level(self):
+        with setenv(m.LEVEL_ENV_VAR, m.STRUCTURE):
+            assert m.CRC == m.level(m.CRC)
+
+    def test_level_from_environment(self):
+        with setenv(m.LEVEL_ENV_VAR, m.CRC):
+            assert m.CRC == m.level()
+
+    def test_default_level_is_full(self):
+        with setenv(m.LEVEL_ENV_VAR, ''):
+            assert m.FULL == m.level()
+
+    def test_unknown_level(self):
+        self.assertRaises(ValueError, m.level, 'sha1')
+        with setenv(m.LEVEL_ENV_VAR, 'sha1'):
+            self.assertRaises(ValueError, m.level)
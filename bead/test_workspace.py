@@ -1,13 +1,20 @@
-from bead.exceptions import InvalidArchive
-from .test import TestCase, chdir
+from bead.exceptions import InvalidArchive, DamagedArchive
+from .test import TestCase, chdir, setenv
 from . import workspace as m
 
 import os
+from unittest import mock
 import zipfile
 
 from .archive import Archive
 from . import layouts
+from . import meta
 from . import tech
+from . import verification
+from . import zipcreator
+from . import zipindex
+from . import zipopener
+from . import zipwriter
 
 write_file = tech.fs.write_file
 ensure_directory = tech.fs.ensure_directory
@@ -103,6 +110,18 @@ class Test_pack(TestCase):
         self.when_archived()
         self.then_archive_has_comment()
 
+    def test_archive_is_indexed(self):
+        self.given_a_workspace()
+        self.when_archived()
+        self.then_archive_has_an_up_to_date_index()
+
+    def test_file_bigger_than_read_block(self):
+        self.given_a_workspace()
+        self.given_a_big_output_file()
+        self.when_archived()
+        self.then_archive_is_valid_bead()
+        self.then_big_output_file_is_archived()
+
     # implementation
 
     __workspace_dir = None
@@ -112,6 +131,7 @@ class Test_pack(TestCase):
     __OUTPUT1 = b'o1'
     assert __SOURCE2 != __SOURCE1
     __BEAD_COMMENT = 'custom bead comment'
+    __BIG_OUTPUT = os.urandom(tech.securehash.READ_BLOCK_SIZE * 5 // 2)
 
     @property
     def workspace(self):
@@ -132,6 +152,11 @@ class Test_pack(TestCase):
         ensure_directory(self.__workspace_dir / 'subdir')
         write_file(self.__workspace_dir / 'subdir/source2', self.__SOURCE2)
 
+    def given_a_big_output_file(self):
+        write_file(
+            self.__workspace_dir / layouts.Workspace.OUTPUT / 'big',
+            self.__BIG_OUTPUT)
+
     def when_archived(self):
         self.__zipfile = self.new_temp_dir() / 'bead.zip'
         self.workspace.pack(self.__zipfile, timestamp(), self.__BEAD_COMMENT)
@@ -152,6 +177,13 @@ class Test_pack(TestCase):
         bead = Archive(self.__zipfile)
         bead.validate()
 
+    def then_archive_has_an_up_to_date_index(self):
+        assert zipindex.read_index(self.__zipfile) is not None
+
+    def then_big_output_file_is_archived(self):
+        with zipfile.ZipFile(self.__zipfile) as z:
+            assert self.__BIG_OUTPUT == z.read(layouts.Archive.DATA / 'big')
+
     def then_archive_has_comment(self):
         with zipfile.ZipFile(self.__zipfile) as z:
             assert self.__BEAD_COMMENT == z.comment.decode('utf-8')
@@ -186,12 +218,191 @@ class Test_pack_stability(TestCase):
         bead2 = make_bead()
         assert bead1.content_id == bead2.content_id
 
+    def test_parallel_compression_makes_the_same_archive_as_serial(self):
+        workspace = m.Workspace(self.new_temp_dir() / 'a bead')
+        workspace.create(A_KIND)
+        write_file(workspace.directory / 'source1', 'code to produce output')
+        for i in range(3):
+            ensure_directory(workspace.directory / f'output/dir{i}')
+        for i in range(20):
+            write_file(workspace.directory / f'output/dir{i % 3}/output{i}', f'output {i}' * i)
+        write_file(workspace.directory / 'output/big', os.urandom(3 * 1024 ** 2))
+
+        def pack(jobs):
+            archive = self.new_temp_dir() / 'bead.zip'
+            with setenv('BEAD_JOBS', str(jobs)):
+                workspace.pack(archive, '20150910T093724802366+0200', comment='')
+            # meta members have the current time as modification time
+            # and so can differ - they are placed last
+            with zipfile.ZipFile(archive) as z:
+                first_meta_member = z.getinfo(layouts.Archive.MANIFEST)
+                for info in z.infolist():
+                    if info.filename.startswith(layouts.Archive.META):
+                        first_meta_member = min(
+                            first_meta_member, info, key=lambda info: info.header_offset)
+                manifest = z.read(layouts.Archive.MANIFEST)
+            with open(archive, 'rb') as f:
+                return f.read(first_meta_member.header_offset), manifest
+
+        serial = pack(jobs=1)
+        assert serial == pack(jobs=3)
+        assert serial == pack(jobs=8)
+
+        # big files are compressed directly into the archive, the others are spilled next to it
+        with mock.patch.object(zipcreator, 'DIRECT_WRITE_MIN_SIZE', 1024 ** 2), \
+                mock.patch.object(zipwriter, 'spill_file', wraps=zipwriter.spill_file) as spill:
+            assert serial == pack(jobs=3)
+        spill_directories = {call[0][0] for call in spill.call_args_list}
+        assert 21 == spill.call_count
+        assert 1 == len(spill_directories)
+        assert os.path.exists(os.path.join(spill_directories.pop(), 'bead.zip'))
+
+
+class Test_incremental_save(TestCase):
+
+    def make_workspace(self):
+        workspace = m.Workspace(self.new_temp_dir() / 'a bead')
+        workspace.create(A_KIND)
+        write_file(workspace.directory / 'source1', 'code to produce output')
+        write_file(workspace.directory / 'output/output1', 'output')
+        # not modified recently
+        for path in ('source1', 'output/output1'):
+            os.utime(workspace.directory / path, (1_500_000_000, 1_500_000_000))
+        return workspace
+
+    def pack(self, workspace):
+        archive = self.new_temp_dir() / 'bead.zip'
+        workspace.pack(archive, timestamp(), comment='')
+        return Archive(archive)
+
+    def poison_cached_hash(self, workspace, zip_path):
+        cache_path = workspace.directory / layouts.Workspace.HASH_CACHE
+        cache = tech.persistence.file_load(cache_path)
+        cache['files'][zip_path]['hash'] = 'poisoned'
+        tech.persistence.file_dump(cache, cache_path)
+
+    def test_cached_hashes_are_used_for_unchanged_files(self):
+        workspace = self.make_workspace()
+        self.pack(workspace)
+        self.poison_cached_hash(workspace, 'data/output1')
+
+        bead = self.pack(workspace)
+
+        assert 'poisoned' == bead.ziparchive.manifest['data/output1']
+
+    def test_changed_files_are_hashed(self):
+        workspace = self.make_workspace()
+        self.pack(workspace)
+        self.poison_cached_hash(workspace, 'data/output1')
+        write_file(workspace.directory / 'output/output1', 'changed output')
+
+        bead = self.pack(workspace)
+
+        bead.validate()
+
+    def test_output_changes(self):
+        workspace = self.make_workspace()
+        assert workspace.output_changes() is None
+        self.pack(workspace)
+        assert not workspace.output_changes()
+
+        write_file(workspace.directory / 'output/output2', 'new output')
+        changes = workspace.output_changes()
+        assert ('output/output2',) == changes.new
+        assert () == changes.changed
+        assert () == changes.deleted
+
+
+class Test_meta_versions(TestCase):
+
+    def make_bead(self, meta_version_name):
+        output = self.new_temp_dir() / 'bead.zip'
+        ws = m.Workspace(self.new_temp_dir() / 'a bead')
+        ws.create(A_KIND)
+        write_file(ws.directory / 'source1', 'code to produce output')
+        write_file(ws.directory / 'output/output1', 'output')
+        with setenv('BEAD_META_VERSION', meta_version_name):
+            ws.pack(output, '20150910T093724802366+0200', comment='')
+        return Archive(output)
+
+    def test_all_meta_versions_make_valid_archives(self):
+        for meta_version in meta.META_VERSIONS:
+            bead = self.make_bead(meta_version.name)
+            bead.validate()
+            assert meta_version.id == bead.meta_version
+
+    def test_content_id_depends_on_meta_version(self):
+        content_ids = {
+            self.make_bead(meta_version.name).content_id
+            for meta_version in meta.META_VERSIONS}
+        assert len(meta.META_VERSIONS) == len(content_ids)
+
+    def test_unknown_meta_version_is_invalid(self):
+        bead_path = self.make_bead('sha512').archive_filename
+        unzipped = self.new_temp_dir()
+        unzip(bead_path, unzipped)
+        bead_meta = tech.persistence.file_load(unzipped / layouts.Archive.BEAD_META)
+        bead_meta[meta.META_VERSION] = 'unknown'
+        tech.persistence.file_dump(bead_meta, unzipped / layouts.Archive.BEAD_META)
+        modified_bead_path = self.new_temp_dir() / 'modified.zip'
+        zip_up(unzipped, modified_bead_path)
+
+        self.assertRaises(InvalidArchive, lambda: Archive(modified_bead_path).content_id)
+
+
+class Test_tree_hash(TestCase):
+
+    CHUNK_SIZE = 16
+    # 4 full chunks and a partial one
+    OUTPUT = b''.join(b'%-16d' % i for i in range(4)) + b'last'
+
+    def make_bead(self, compression):
+        output = self.new_temp_dir() / 'bead.zip'
+        ws = m.Workspace(self.new_temp_dir() / 'a bead')
+        ws.create(A_KIND)
+        write_file(ws.directory / 'source1', 'code to produce output')
+        write_file(ws.directory / 'output/output1', self.OUTPUT)
+        with setenv('BEAD_META_VERSION', meta.META_VERSION_BLAKE2B_TREE.name):
+            with setenv('BEAD_TREE_CHUNK_SIZE', str(self.CHUNK_SIZE)):
+                with setenv('BEAD_ZIP_COMPRESSION', compression):
+                    ws.pack(output, timestamp(), comment='')
+        return Archive(output)
+
+    def test_stored_bead_is_valid(self):
+        bead = self.make_bead('stored')
+        bead.validate(paranoid=True)
+        assert self.CHUNK_SIZE == bead.chunk_size
+
+    def test_deflated_bead_is_valid(self):
+        self.make_bead('deflated').validate(paranoid=True)
+
+    def test_intact_chunks(self):
+        for compression in ('stored', 'deflated'):
+            bead = self.make_bead(compression)
+            assert [] == bead.verify_chunks('data/output1')
+            assert [] == bead.verify_chunks('data/output1', 4, 4)
+
+    def test_damaged_chunk_is_found_by_range_verification(self):
+        bead = self.make_bead('stored')
+        with open(bead.archive_filename, 'r+b') as f:
+            archive_bytes = f.read()
+            f.seek(archive_bytes.index(b'2' + b' ' * 15))
+            f.write(b'X')
+        zipopener.close_all()
+
+        assert [2] == bead.verify_chunks('data/output1')
+        assert [2] == bead.verify_chunks('data/output1', 1, 3)
+        assert [] == bead.verify_chunks('data/output1', 3)
+        with self.assertRaises(DamagedArchive):
+            bead.validate(paranoid=True)
+
 
 def make_bead(path, filespecs):
     with temp_dir() as root:
         workspace = m.Workspace(root / 'workspace')
         workspace.create(A_KIND)
         for filename, content in filespecs.items():
+            ensure_directory(os.path.dirname(workspace.directory / filename))
             write_file(workspace.directory / filename, content)
         workspace.pack(path, timestamp(), 'no comment')
 
@@ -208,6 +419,11 @@ class Test_load(TestCase):
         self.when_loading_a_bead()
         self.then_extracted_files_under_input_are_readonly()
 
+    def test_loaded_inputs_have_no_write_permissions(self):
+        self.given_a_workspace()
+        self.when_loading_a_bead_with_subdirectories()
+        self.then_loaded_paths_have_no_write_permissions()
+
     def test_load_adds_input_to_bead_meta(self):
         self.given_a_workspace()
         self.when_loading_a_bead()
@@ -218,6 +434,34 @@ class Test_load(TestCase):
         self.when_loading_a_bead()
         self.then_another_bead_can_be_loaded()
 
+    def test_damaged_bead_is_not_loaded(self):
+        self.given_a_workspace()
+        self.when_loading_a_damaged_bead_with_verification()
+        self.then_input_is_not_loaded()
+
+    def test_damaged_bead_does_not_replace_loaded_data(self):
+        self.given_a_workspace()
+        self.when_loading_a_bead()
+        self.when_loading_a_damaged_bead_with_verification()
+        self.then_data_files_in_bead_are_available_in_workspace()
+
+    def test_only_selected_files_are_loaded(self):
+        self.given_a_workspace()
+        self.when_loading_a_bead_with_subdirectories(include=['a/*'])
+        self.then_loaded_files_are('a/b/output2')
+        assert (('a/*',), ()) == self.workspace.get_input_patterns('bead1')
+
+    def test_recorded_patterns_are_used_for_reload(self):
+        self.given_a_workspace()
+        self.when_loading_a_bead_with_subdirectories(exclude=['*2'])
+        self.when_loading_a_bead_with_subdirectories()
+        self.then_loaded_files_are('output1')
+
+    def test_damage_in_not_selected_files_is_ignored(self):
+        self.given_a_workspace()
+        self.when_loading_selected_files_of_a_damaged_bead_with_verification(include=['output1'])
+        self.then_loaded_files_are('output1')
+
     # implementation
 
     __workspace_dir = None
@@ -244,6 +488,44 @@ class Test_load(TestCase):
     def when_loading_a_bead(self):
         self._load_a_bead('bead1')
 
+    def when_loading_a_bead_with_subdirectories(self, include=None, exclude=None):
+        path_of_bead_to_load = self.new_temp_dir() / 'bead.zip'
+        make_bead(
+            path_of_bead_to_load,
+            {'output/output1': b'data1', 'output/a/b/output2': b'data2'})
+        self.workspace.load(
+            'bead1', Archive(path_of_bead_to_load), include=include, exclude=exclude)
+
+    def when_loading_a_damaged_bead_with_verification(self):
+        path_of_bead_to_load = self.new_temp_dir() / 'bead.zip'
+        make_bead(path_of_bead_to_load, {'output/output1': b'data'})
+        with zipfile.ZipFile(path_of_bead_to_load, 'a') as z:
+            z.writestr(layouts.Archive.DATA / 'output2', b'not in manifest')
+        bead = Archive(path_of_bead_to_load)
+        self.assertRaises(
+            DamagedArchive, self.workspace.load, 'bead1', bead, verify=True)
+
+    def when_loading_selected_files_of_a_damaged_bead_with_verification(self, include):
+        path_of_bead_to_load = self.new_temp_dir() / 'bead.zip'
+        make_bead(path_of_bead_to_load, {'output/output1': b'data'})
+        with zipfile.ZipFile(path_of_bead_to_load, 'a') as z:
+            z.writestr(layouts.Archive.DATA / 'output2', b'not in manifest')
+        bead = Archive(path_of_bead_to_load)
+        self.workspace.load('bead1', bead, verify=True, include=include)
+
+    def then_loaded_files_are(self, *paths):
+        root = self.__workspace_dir / 'input/bead1'
+        loaded_files = {
+            os.path.relpath(path, root)
+            for path in tech.fs.all_subpaths(root)
+            if os.path.isfile(path)}
+        assert set(paths) == loaded_files
+
+    def then_input_is_not_loaded(self):
+        assert not self.workspace.has_input('bead1')
+        assert not self.workspace.is_loaded('bead1')
+        assert [] == os.listdir(self.__workspace_dir / layouts.Workspace.INPUT)
+
     def then_data_files_in_bead_are_available_in_workspace(self):
         with open(self.__workspace_dir / 'input/bead1/output1', 'rb') as f:
             assert b'data for bead1' == f.read()
@@ -256,6 +538,14 @@ class Test_load(TestCase):
         if os.name == 'posix':
             self.assertRaises(IOError, open, root / 'new-file', 'wb')
 
+    def then_loaded_paths_have_no_write_permissions(self):
+        root = self.__workspace_dir / 'input/bead1'
+        paths = list(tech.fs.all_subpaths(root))
+        expected_paths = {root, root / 'a', root / 'a/b', root / 'output1', root / 'a/b/output2'}
+        assert expected_paths == set(paths)
+        for path in paths:
+            assert not os.stat(path).st_mode & 0o222, path
+
     def then_input_info_is_added_to_bead_meta(self):
         assert self.workspace.has_input('bead1')
         assert self.workspace.is_loaded('bead1')
@@ -393,3 +683,150 @@ class Test_is_valid(TestCase):
         zip_up(unzipped_archive_path, modified_archive_path)
 
         self.assertRaises(InvalidArchive, Archive(modified_archive_path).validate)
+
+    def test_all_changed_files_are_reported(self, unzipped_archive_path):
+        write_file(unzipped_archive_path / layouts.Archive.CODE / 'code1', b'HACKED')
+        write_file(unzipped_archive_path / layouts.Archive.DATA / 'data1', b'HACKED')
+        modified_archive_path = self.new_temp_dir() / 'modified_archive.zip'
+        zip_up(unzipped_archive_path, modified_archive_path)
+
+        with self.assertRaises(DamagedArchive) as cm:
+            Archive(modified_archive_path).validate(jobs=2)
+        assert ['code/code1', 'data/data1'] == cm.exception.damaged_members
+
+    def test_parallel_validation_reads_the_central_directory_once(self, unzipped_archive_path):
+        archive_path = self.new_temp_dir() / 'unindexed_archive.zip'
+        zip_up(unzipped_archive_path, archive_path)
+        zipopener.close_all()
+
+        with mock.patch.object(zipindex, 'open_zip', wraps=zipindex.open_zip) as open_zip:
+            Archive(archive_path).validate(jobs=4)
+        assert 1 == open_zip.call_count
+
+    def test_missing_files_are_reported(self, unzipped_archive_path):
+        os.remove(unzipped_archive_path / layouts.Archive.CODE / 'code1')
+        os.remove(unzipped_archive_path / layouts.Archive.DATA / 'data1')
+        modified_archive_path = self.new_temp_dir() / 'modified_archive.zip'
+        zip_up(unzipped_archive_path, modified_archive_path)
+
+        with self.assertRaises(DamagedArchive) as cm:
+            Archive(modified_archive_path).validate()
+        assert ['code/code1', 'data/data1'] == cm.exception.damaged_members
+
+    def test_validation_with_one_job(self, archive_with_two_files_path):
+        Archive(archive_with_two_files_path).validate(jobs=1)
+
+    def test_successful_verification_is_recorded(self, archive_with_two_files_path):
+        Archive(archive_with_two_files_path).validate()
+
+        assert Archive(archive_with_two_files_path).is_verified
+
+    def test_scoped_verification_is_not_recorded(self, archive_with_two_files_path):
+        Archive(archive_with_two_files_path).validate(zip_dirs=())
+
+        assert not Archive(archive_with_two_files_path).is_verified
+
+    def test_scoped_verification_is_recorded_for_its_scope(self, archive_with_two_files_path):
+        Archive(archive_with_two_files_path).validate(zip_dirs=[layouts.Archive.CODE])
+
+        archive = Archive(archive_with_two_files_path)
+        assert archive.is_verified_under([layouts.Archive.CODE])
+        assert not archive.is_verified_under([layouts.Archive.DATA])
+        assert archive.validate(zip_dirs=[layouts.Archive.CODE]) is None
+
+    def test_verified_extraction_is_recorded(self, archive_with_two_files_path):
+        Archive(archive_with_two_files_path).validate(zip_dirs=())
+        Archive(archive_with_two_files_path).unpack_data_to(self.new_temp_dir(), verify=True)
+
+        archive = Archive(archive_with_two_files_path)
+        assert archive.is_verified_under([layouts.Archive.DATA])
+        assert not archive.is_verified
+
+    def test_extraction_without_verified_meta_is_not_recorded(
+            self, archive_with_two_files_path):
+        Archive(archive_with_two_files_path).unpack_data_to(self.new_temp_dir(), verify=True)
+
+        assert not Archive(archive_with_two_files_path).is_verified_under([layouts.Archive.DATA])
+
+    def test_changed_archive_is_not_verified(self, archive_path):
+        Archive(archive_path).validate()
+        with zipfile.ZipFile(archive_path, 'a') as z:
+            z.writestr(layouts.Archive.DATA / 'extra_file', b'something')
+        zipopener.close_all()
+
+        assert not Archive(archive_path).is_verified
+        self.assertRaises(InvalidArchive, Archive(archive_path).validate)
+
+    def test_paranoid_verification_ignores_recorded_verification(self, workspace, timestamp):
+        write_file(workspace.directory / 'output/data1', 'content of data1')
+        archive_path = self.new_temp_dir() / 'bead.zip'
+        with setenv('BEAD_ZIP_COMPRESSION', 'stored'):
+            workspace.pack(archive_path, timestamp, comment='')
+        Archive(archive_path).validate()
+        # damage content without changing size and modification time
+        stat = os.stat(archive_path)
+        with open(archive_path, 'r+b') as f:
+            content = f.read()
+            f.seek(content.index(b'content of data1'))
+            f.write(b'CONTENT')
+        os.utime(archive_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        zipopener.close_all()
+        # members are read through the member index
+        assert zipindex.has_current_index(archive_path)
+
+        assert Archive(archive_path).validate() is None
+        with mock.patch.object(zipindex, 'open_zip', wraps=zipindex.open_zip) as open_zip:
+            with mock.patch.object(zipindex, 'ZipFile', side_effect=AssertionError):
+                with self.assertRaises(DamagedArchive) as cm:
+                    Archive(archive_path).validate(paranoid=True)
+        open_zip.assert_called()
+        assert ['data/data1'] == cm.exception.damaged_members
+
+    def test_structure_verification_reads_no_content(self, archive_with_two_files_path):
+        cost = Archive(archive_with_two_files_path).validate(level=verification.STRUCTURE)
+
+        assert (verification.STRUCTURE, 0, 0) == (cost.level, cost.members, cost.bytes_read)
+
+    def test_structure_verification_finds_missing_files(self, unzipped_archive_path):
+        os.remove(unzipped_archive_path / layouts.Archive.CODE / 'code1')
+        modified_archive_path = self.new_temp_dir() / 'modified_archive.zip'
+        zip_up(unzipped_archive_path, modified_archive_path)
+
+        with self.assertRaises(DamagedArchive) as cm:
+            Archive(modified_archive_path).validate(level=verification.STRUCTURE)
+        assert ['code/code1'] == cm.exception.damaged_members
+
+    def test_crc_verification_finds_corrupt_files(self, workspace, timestamp):
+        write_file(workspace.directory / 'output/data1', 'content of data1')
+        archive_path = self.new_temp_dir() / 'bead.zip'
+        with setenv('BEAD_ZIP_COMPRESSION', 'stored'):
+            workspace.pack(archive_path, timestamp, comment='')
+        with open(archive_path, 'r+b') as f:
+            content = f.read()
+            f.seek(content.index(b'content of data1'))
+            f.write(b'CONTENT')
+        zipopener.close_all()
+
+        Archive(archive_path).validate(level=verification.STRUCTURE)
+        with self.assertRaises(DamagedArchive) as cm:
+            Archive(archive_path).validate(level=verification.CRC)
+        assert ['data/data1'] == cm.exception.damaged_members
+
+    def test_only_full_verification_finds_changed_files(self, unzipped_archive_path):
+        # a rezipped file has a matching CRC-32
+        write_file(unzipped_archive_path / layouts.Archive.DATA / 'data1', b'HACKED')
+        modified_archive_path = self.new_temp_dir() / 'modified_archive.zip'
+        zip_up(unzipped_archive_path, modified_archive_path)
+
+        cost = Archive(modified_archive_path).validate(level=verification.CRC)
+        assert verification.CRC == cost.level
+        assert cost.bytes_read >= len('code1HACKED')
+        self.assertRaises(
+            DamagedArchive, Archive(modified_archive_path).validate, level=verification.FULL)
+
+    def test_crc_verification_is_not_recorded(self, archive_with_two_files_path):
+        Archive(archive_with_two_files_path).validate(level=verification.CRC)
+
+        assert not Archive(archive_with_two_files_path).is_verified
+        assert Archive(archive_with_two_files_path).validate() is not None
+        assert Archive(archive_with_two_files_path).validate(level=verification.CRC) is None
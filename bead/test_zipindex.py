@@ -0,0 +1,96 @@
+from .test import TestCase
+from . import zipindex as m
+
+import os
+import zipfile
+
+from . import zipopener
+
+MEMBERS = {
+    'stored': (zipfile.ZIP_STORED, b'stored content'),
+    'dir/deflated': (zipfile.ZIP_DEFLATED, b'deflated content ' * 100),
+    'dir/lzma': (zipfile.ZIP_LZMA, b'lzma content ' * 100),
+    'ékezet': (zipfile.ZIP_DEFLATED, b'non-ascii name'),
+}
+
+
+class Test_index(TestCase):
+
+    def test_members_are_read_through_index(self):
+        self.given_an_indexed_zip_file()
+        self.when_zip_is_opened()
+        self.then_zip_is_indexed()
+        self.then_members_are_readable()
+
+    def test_index_of_changed_zip_file_is_ignored(self):
+        self.given_an_indexed_zip_file()
+        self.given_zip_file_is_changed()
+        self.when_zip_is_opened()
+        self.then_zip_is_not_indexed()
+        self.then_members_are_readable()
+
+    def test_malformed_index_is_ignored(self):
+        self.given_an_indexed_zip_file()
+        self.given_index_is_truncated()
+        self.when_zip_is_opened()
+        self.then_zip_is_not_indexed()
+        self.then_members_are_readable()
+
+    def test_member_data_offset_matches_local_header(self):
+        self.given_an_indexed_zip_file()
+        self.when_zip_is_opened()
+        self.then_data_offsets_match_local_headers()
+
+    # implementation
+
+    __zip_path = None
+    __zipfile = None
+
+    def given_an_indexed_zip_file(self):
+        self.__zip_path = self.new_temp_dir() / 'archive.zip'
+        with zipfile.ZipFile(self.__zip_path, 'w') as z:
+            for name, (compress_type, content) in MEMBERS.items():
+                z.writestr(name, content, compress_type=compress_type)
+        m.write_index(self.__zip_path)
+        assert os.path.exists(m.index_path(self.__zip_path))
+
+    def given_zip_file_is_changed(self):
+        with zipfile.ZipFile(self.__zip_path, 'a') as z:
+            z.writestr('new', b'new')
+
+    def given_index_is_truncated(self):
+        index_path = m.index_path(self.__zip_path)
+        with open(index_path, 'rb') as f:
+            index = f.read()
+        with open(index_path, 'wb') as f:
+            f.write(index[:-3])
+
+    def when_zip_is_opened(self):
+        self.__zipfile = m.open_zip(self.__zip_path)
+        self.addCleanup(self.__zipfile.close)
+
+    def then_zip_is_indexed(self):
+        assert isinstance(self.__zipfile, m.IndexedZipFile)
+
+    def then_zip_is_not_indexed(self):
+        assert not isinstance(self.__zipfile, m.IndexedZipFile)
+
+    def then_members_are_readable(self):
+        for name, (compress_type, content) in MEMBERS.items():
+            assert compress_type == self.__zipfile.getinfo(name).compress_type
+            with self.__zipfile.open(name) as f:
+                assert content == f.read()
+        assert set(MEMBERS) <= set(self.__zipfile.namelist())
+        self.assertRaises(KeyError, self.__zipfile.getinfo, 'missing')
+
+    def then_data_offsets_match_local_headers(self):
+        with open(self.__zip_path, 'rb') as f:
+            for info in self.__zipfile.infolist():
+                assert info.data_offset == zipopener.member_data_offset(f, _plain(info))
+
+
+def _plain(info):
+    # a copy without the recorded data offset
+    plain = zipfile.ZipInfo(info.filename)
+    plain.header_offset = info.header_offset
+    return plain
@@ -0,0 +1,90 @@
+from .test import TestCase, setenv
+from . import zipmmap as m
+
+import io
+import mmap
+import os
+import zipfile
+
+from .archive import Archive
+from . import compression
+from . import tech
+from . import workspace
+
+BIG = os.urandom(mmap.ALLOCATIONGRANULARITY + 1000)
+CONTENT = b'stored content ' * 100
+
+
+class Test_map_member(TestCase):
+
+    def test_view_is_the_content(self):
+        member = self.map('member')
+        assert CONTENT == member.view
+        assert member.view.readonly
+
+    def test_member_after_allocation_granularity(self):
+        assert BIG == self.map('big').view
+        assert CONTENT == self.map('member after big').view
+
+    def test_empty_member(self):
+        member = self.map('empty')
+        assert b'' == member.view
+        assert b'' == member.read()
+
+    def test_read_and_seek(self):
+        with self.map('member') as member:
+            assert CONTENT[:6] == member.read(6)
+            member.seek(-7, io.SEEK_END)
+            assert CONTENT[-7:] == member.read()
+            member.seek(1)
+            buffer = bytearray(5)
+            assert 5 == member.readinto(buffer)
+            assert CONTENT[1:6] == buffer
+            assert 6 == member.tell()
+
+    def test_close_with_exported_view(self):
+        member = self.map('member')
+        view = member.view[:6]
+        member.close()
+        assert CONTENT[:6] == view
+
+    # implementation
+
+    __zip_path = None
+
+    def map(self, name):
+        if self.__zip_path is None:
+            self.__zip_path = self.new_temp_dir() / 'archive.zip'
+            with zipfile.ZipFile(self.__zip_path, 'w') as z:
+                z.writestr('empty', b'')
+                z.writestr('member', CONTENT)
+                z.writestr('big', BIG)
+                z.writestr('member after big', CONTENT)
+        with zipfile.ZipFile(self.__zip_path) as z:
+            member = m.map_member(self.__zip_path, z.getinfo(name))
+        self.addCleanup(member.close)
+        return member
+
+
+class Test_open_member(TestCase):
+
+    def test_stored_member_is_mapped(self):
+        with self.open_member('stored', 'data/file') as f:
+            assert CONTENT == f.view
+            assert CONTENT == f.read()
+
+    def test_compressed_member_is_streamed(self):
+        with self.open_member('deflated', 'data/file') as f:
+            assert not hasattr(f, 'view')
+            assert CONTENT == f.read()
+
+    # implementation
+
+    def open_member(self, compression_spec, zip_path):
+        ws = workspace.Workspace(self.new_temp_dir() / 'ws')
+        ws.create('kind')
+        tech.fs.write_file(ws.directory / 'output/file', CONTENT)
+        archive_path = self.new_temp_dir() / 'bead.zip'
+        with setenv(compression.COMPRESSION_ENV_VAR, compression_spec):
+            ws.pack(archive_path, tech.timestamp.timestamp(), comment='')
+        return Archive(archive_path).open_member(zip_path)
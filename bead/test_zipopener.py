@@ -0,0 +1,69 @@
+from .test import TestCase
+from . import zipopener as m
+
+from concurrent.futures import ThreadPoolExecutor
+import zipfile
+
+
+class Test_OpenZipLRUCache(TestCase):
+
+    def make_zip(self, members=1):
+        path = self.new_temp_dir() / 'archive.zip'
+        with zipfile.ZipFile(path, 'w') as z:
+            for i in range(members):
+                z.writestr(f'member{i}', b'content')
+        return path
+
+    def make_cache(self, **limits):
+        cache = m.OpenZipLRUCache(**limits)
+        self.addCleanup(cache.close_all)
+        return cache
+
+    def test_hits_and_misses(self):
+        cache = self.make_cache()
+        zip1 = self.make_zip()
+        assert cache.open(zip1) is cache.open(zip1)
+        stats = cache.stats()
+        assert (1, 1, 0) == (stats.hits, stats.misses, stats.evictions)
+
+    def test_least_recently_used_is_evicted_over_file_descriptor_limit(self):
+        cache = self.make_cache(max_file_descriptors=2)
+        zip1, zip2, zip3 = self.make_zip(), self.make_zip(), self.make_zip()
+        cache.open(zip1)
+        cache.open(zip2)
+        cache.open(zip1)
+        cache.open(zip3)
+
+        stats = cache.stats()
+        assert 1 == stats.evictions
+        assert 2 == stats.open_file_descriptors
+        # zip2 was evicted
+        cache.open(zip1)
+        assert 3 == cache.stats().misses
+        cache.open(zip2)
+        assert 4 == cache.stats().misses
+
+    def test_eviction_over_memory_limit(self):
+        small_zip = self.make_zip(members=1)
+        big_zip = self.make_zip(members=100)
+        cache = self.make_cache(max_memory=50 * m.ZIPINFO_MEMORY_ESTIMATE)
+        cache.open(small_zip)
+        cache.open(big_zip)
+
+        stats = cache.stats()
+        assert 1 == stats.evictions
+        assert 1 == stats.open_zip_files
+        assert stats.estimated_memory > cache.max_memory
+
+    def test_parallel_use(self):
+        cache = self.make_cache(max_file_descriptors=3)
+        zips = [self.make_zip() for _ in range(5)]
+
+        def read(i):
+            return cache.open(zips[i % len(zips)]).read('member0')
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            assert {b'content'} == set(executor.map(read, range(200)))
+        stats = cache.stats()
+        assert 200 == stats.hits + stats.misses
+        assert stats.open_file_descriptors <= 3
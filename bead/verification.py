@@ -0,0 +1,48 @@
+'''
+I am defining how thoroughly archives are verified.
+
+Levels, from the cheapest:
+
+structure - meta is well formed, the manifest covers the code and data members
+            and all of them are present - no member content is read
+crc       - members are also decompressed, checking their zip CRC-32
+full      - members are also hashed, checking their manifest hash
+            (CRC-32 detects accidental damage only, not deliberate changes)
+
+The default level is full, it can be overridden with the BEAD_VERIFY environment variable.
+'''
+
+import os
+
+import attr
+
+STRUCTURE = 'structure'
+CRC = 'crc'
+FULL = 'full'
+LEVELS = (STRUCTURE, CRC, FULL)
+
+LEVEL_ENV_VAR = 'BEAD_VERIFY'
+
+
+def level(requested=None):
+    '''
+    Verification level to use.
+
+    Explicitly requested level > $BEAD_VERIFY > full.
+    Raises ValueError on unknown levels.
+    '''
+    if requested is None:
+        requested = os.environ.get(LEVEL_ENV_VAR) or FULL
+    if requested not in LEVELS:
+        raise ValueError(f'Unknown verification level: {requested!r}')
+    return requested
+
+
+@attr.s(auto_attribs=True, frozen=True)
+class Cost:
+    level: str
+    # members checked at this level
+    members: int
+    # uncompressed bytes read
+    bytes_read: int
+    seconds: float
@@ -3,23 +3,22 @@ Proto-Beads & their filesystem layout
 '''
 
 import os
-import zipfile
 
+from tracelog import TRACELOG
+from . import compression
+from . import hashcache
 from . import layouts
 from . import meta
 from . import tech
+from . import zipcreator
+from . import zipindex
 from .bead import Bead
 
 # technology modules
 persistence = tech.persistence
-securehash = tech.securehash
 fs = tech.fs
 
 
-# generated with `uuidgen -t`
-META_VERSION = 'aaa947a6-1f7a-11e6-ba3a-0021cc73492e'
-
-
 class Workspace(Bead):
 
     directory = None
@@ -119,6 +118,40 @@ class Workspace(Bead):
             if os.path.exists(zipfilename):
                 os.remove(zipfilename)
             raise
+        zipindex.try_write_index(zipfilename)
+
+    def output_changes(self):
+        '''
+        Changes of output files since the last save (without reading the files).
+
+        None is returned, if the workspace has not been saved yet.
+        '''
+        cache = hashcache.HashCache.for_workspace(self)
+        if not cache.exists:
+            return None
+        output_dir = layouts.Workspace.OUTPUT
+        changes = cache.changes(
+            _files_under(self.directory / output_dir, layouts.Archive.DATA),
+            layouts.Archive.DATA)
+
+        def workspace_paths(zip_paths):
+            return tuple(
+                output_dir / os.path.relpath(zip_path, layouts.Archive.DATA)
+                for zip_path in zip_paths)
+        return hashcache.FileChanges(
+            workspace_paths(changes.new),
+            workspace_paths(changes.changed),
+            workspace_paths(changes.deleted))
+
+    @property
+    def compression_stats(self):
+        '''
+        Compression statistics of the last save (compression.Stats), None if never saved.
+        '''
+        try:
+            return compression.Stats.load(self.directory / layouts.Workspace.COMPRESSION_STATS)
+        except (OSError, persistence.ReadError):
+            return None
 
     def has_input(self, input_nick):
         '''
@@ -132,14 +165,26 @@ class Workspace(Bead):
         return os.path.isdir(
             self.directory / layouts.Workspace.INPUT / input_nick)
 
-    def add_input(self, input_nick, kind, content_id, freeze_time_str):
+    def add_input(self, input_nick, kind, content_id, freeze_time_str, include=(), exclude=()):
         m = self.meta
-        m[meta.INPUTS][input_nick] = {
+        spec = {
             meta.INPUT_KIND: kind,
             meta.INPUT_CONTENT_ID: content_id,
             meta.INPUT_FREEZE_TIME: freeze_time_str}
+        if include:
+            spec[meta.INPUT_INCLUDE] = list(include)
+        if exclude:
+            spec[meta.INPUT_EXCLUDE] = list(exclude)
+        m[meta.INPUTS][input_nick] = spec
         self.meta = m
 
+    def get_input_patterns(self, input_nick):
+        '''
+        Glob patterns (include, exclude) of files to load for input_nick.
+        '''
+        spec = self.meta[meta.INPUTS].get(input_nick, {})
+        return tuple(spec.get(meta.INPUT_INCLUDE, ())), tuple(spec.get(meta.INPUT_EXCLUDE, ()))
+
     def delete_input(self, input_nick):
         assert self.has_input(input_nick)
         if self.is_loaded(input_nick):
@@ -180,22 +225,51 @@ class Workspace(Bead):
         input_map[input_nick] = bead_name
         self.input_map = input_map
 
-    def load(self, input_nick, bead):
+    def load(
+            self, input_nick, bead,
+            verify=False, jobs=None, store=None, include=None, exclude=None):
         '''
         Make output data files in bead available under input directory
+
+        Already loaded data is replaced only after the new data is fully extracted.
+        With `verify` the data files are checked against the bead's manifest
+        while they are extracted - damaged beads leave the input untouched.
+        Files are extracted by `jobs` threads in parallel, already read only.
+
+        With an InputStore as `store`, the input is made of links to files
+        in the shared store (see bead.inputstore).
+
+        Only the files selected by the `include` and `exclude` glob patterns
+        are loaded (see meta.file_selector). The patterns are recorded
+        with the input, None means the patterns recorded for the input earlier.
         '''
+        recorded_include, recorded_exclude = self.get_input_patterns(input_nick)
+        if include is None:
+            include = recorded_include
+        if exclude is None:
+            exclude = recorded_exclude
         input_dir = self.directory / layouts.Workspace.INPUT
         fs.make_writable(input_dir)
         try:
+            destination_dir = input_dir / input_nick
+            staging_dir = input_dir / f'.{input_nick}.loading'
+            if os.path.exists(staging_dir):
+                fs.rmtree(staging_dir)
+            bead.unpack_data_to(
+                staging_dir, verify=verify, jobs=jobs, readonly=True, store=store,
+                selected=meta.file_selector(include, exclude))
+            if os.path.exists(destination_dir):
+                fs.rmtree(destination_dir)
+            os.rename(staging_dir, destination_dir)
+            fs.make_readonly(destination_dir)
             self.add_input(
                 input_nick,
-                bead.kind, bead.content_id, bead.freeze_time_str)
-            destination_dir = input_dir / input_nick
-            bead.unpack_data_to(destination_dir)
-            for f in fs.all_subpaths(destination_dir):
-                fs.make_readonly(f)
+                bead.kind, bead.content_id, bead.freeze_time_str,
+                include, exclude)
         finally:
             fs.make_readonly(input_dir)
+        if store is not None and store.bytes_added:
+            store.evict()
 
     def unload(self, input_nick):
         '''
@@ -234,61 +308,46 @@ class Workspace(Bead):
         return ws
 
 
-class _ZipCreator:
-    def __init__(self):
-        self.hashes = {}
-        self.zipfile = None
-
-    def add_hash(self, path, hash):
-        assert path not in self.hashes
-        self.hashes[path] = hash
-
-    def add_file(self, path, zip_path):
-        self.zipfile.write(path, zip_path)
-        self.add_hash(
-            zip_path,
-            securehash.file(open(path, 'rb'), os.path.getsize(path)))
+def _files_under(path, zip_path):
+    '''
+    Yield (path, zip_path) pairs for all files under path, in sorted order.
+    '''
+    if os.path.isdir(path):
+        for f in sorted(os.listdir(path)):
+            yield from _files_under(path / f, zip_path / f)
+    else:
+        assert os.path.isfile(path), '%s is neither a file nor a directory' % path
+        yield path, zip_path
 
-    def add_path(self, path, zip_path):
-        if os.path.isdir(path):
-            self.add_directory(path, zip_path)
-        else:
-            assert os.path.isfile(path), '%s is neither a file nor a directory' % path
-            self.add_file(path, zip_path)
 
-    def add_directory(self, path, zip_path):
-        for f in os.listdir(path):
-            self.add_path(path / f, zip_path / f)
-
-    def add_string_content(self, zip_path, string):
-        bytes = string.encode('utf-8')
-        self.zipfile.writestr(zip_path, bytes)
-        self.add_hash(zip_path, securehash.bytes(bytes))
+class _ZipCreator(zipcreator.ZipCreator):
 
     def create(self, zip_file_name, workspace, timestamp, comment):
         assert workspace.is_valid
-        user_compression_preference = os.environ.get('BEAD_ZIP_COMPRESSION')
-        compression = {
-            'off': zipfile.ZIP_STORED,
-            'stored': zipfile.ZIP_STORED,
-            # these are not universally supported compression methods
-            # 'lzma': zipfile.ZIP_LZMA,
-            # 'bz2': zipfile.ZIP_BZIP2,
-            'deflated': zipfile.ZIP_DEFLATED,
-        }.get(user_compression_preference, zipfile.ZIP_DEFLATED)
+        self.compression_policy = compression.workspace_policy(workspace)
+        self.hash_cache = hashcache.HashCache.for_workspace(
+            workspace, version=f'{self.meta_version.id}:{self.chunk_size}')
+        with self.writing(zip_file_name, comment):
+            self.add_data(workspace)
+            self.add_code(workspace)
+            self.add_meta(
+                workspace.kind, workspace.inputs, workspace.name, workspace.input_map, timestamp)
+        self.save_hash_cache()
+        self.save_compression_stats(workspace)
+
+    def save_hash_cache(self):
         try:
-            with zipfile.ZipFile(
-                zip_file_name,
-                mode='w',
-                compression=compression,
-                allowZip64=True,
-            ) as self.zipfile:
-                self.zipfile.comment = comment.encode('utf-8')
-                self.add_data(workspace)
-                self.add_code(workspace)
-                self.add_meta(workspace, timestamp)
-        finally:
-            self.zipfile = None
+            self.hash_cache.save()
+        except OSError:
+            # the archive is fine, the files will be hashed again on the next save
+            TRACELOG(f'Could not save hash cache {self.hash_cache.path}')
+
+    def save_compression_stats(self, workspace):
+        try:
+            self.compression_stats.save(
+                workspace.directory / layouts.Workspace.COMPRESSION_STATS)
+        except OSError:
+            TRACELOG('Could not save compression stats')
 
     def add_code(self, workspace):
         source_directory = workspace.directory
@@ -300,30 +359,14 @@ class _ZipCreator:
                 layouts.Workspace.META,
                 layouts.Workspace.TEMP}
 
-        for f in sorted(os.listdir(source_directory)):
-            if is_code(f):
-                self.add_path(
-                    source_directory / f,
-                    layouts.Archive.CODE / f)
+        self.add_files(
+            file
+            for f in sorted(os.listdir(source_directory))
+            if is_code(f)
+            for file in _files_under(source_directory / f, layouts.Archive.CODE / f))
 
     def add_data(self, workspace):
-        self.add_directory(
-            workspace.directory / layouts.Workspace.OUTPUT,
-            layouts.Archive.DATA)
-
-    def add_meta(self, workspace, timestamp):
-        bead_meta = {
-            meta.META_VERSION: META_VERSION,
-            meta.KIND: workspace.kind,
-            meta.FREEZE_TIME: timestamp,
-            meta.INPUTS: {
-                input.name: {
-                    meta.INPUT_KIND: input.kind,
-                    meta.INPUT_CONTENT_ID: input.content_id,
-                    meta.INPUT_FREEZE_TIME: input.freeze_time_str}
-                for input in workspace.inputs},
-            meta.FREEZE_NAME: workspace.name}
-
-        self.add_string_content(layouts.Archive.BEAD_META, persistence.dumps(bead_meta))
-        self.add_string_content(layouts.Archive.MANIFEST, persistence.dumps(self.hashes))
-        persistence.zip_dump(workspace.input_map, self.zipfile, layouts.Archive.INPUT_MAP)
+        self.add_files(
+            _files_under(
+                workspace.directory / layouts.Workspace.OUTPUT,
+                layouts.Archive.DATA))
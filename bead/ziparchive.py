@@ -1,16 +1,26 @@
+from concurrent.futures import ThreadPoolExecutor
 from copy import deepcopy
+import functools
+import io
 import os
-import shutil
+import threading
+import time
+from zipfile import ZIP_STORED, ZipExtFile
+
+from tracelog import TRACELOG
 
 from .bead import UnpackableBead
-from .exceptions import InvalidArchive
+from .exceptions import InvalidArchive, DamagedArchive
 from . import tech
 from . import layouts
 from . import meta
+from . import verification
+from . import zipmmap
 from . import zipopener
 
 # technology modules
 timestamp = tech.timestamp
+parallel = tech.parallel
 securehash = tech.securehash
 persistence = tech.persistence
 
@@ -31,6 +41,8 @@ class ZipArchive(UnpackableBead):
         self.box_name = box_name
         self._meta = self._load_meta()
         self._content_id = None
+        self.__chunks = None
+        self.__manifest = None
 
     @property
     def zipfile(self):
@@ -39,7 +51,7 @@ class ZipArchive(UnpackableBead):
         except (zipopener.BadZipFile, OSError, IOError):
             raise InvalidArchive(self.archive_filename)
 
-    def validate(self):
+    def validate(self, jobs=None, zip_dirs=None, level=verification.FULL):
         '''
         verify, that
         - all files under code, data, meta are present in the manifest
@@ -51,15 +63,43 @@ class ZipArchive(UnpackableBead):
             - has freeze time
             - has freezed name
             - has inputs (even if empty)
+
+        How member content is checked depends on the verification `level`:
+        not at all (structure), by zip CRC-32 (crc) or by manifest hash (full),
+        see the `verification` module.
+        Members are checked by `jobs` threads in parallel
+        (see `tech.parallel.jobs` for the default).
+
+        When `zip_dirs` is given, only the content of the members under these
+        archive directories is checked (meta is checked always).
+
+        Returns the verification.Cost of the check,
+        raises DamagedArchive listing the bad members if content does not match,
+        and InvalidArchive on other problems.
         '''
+        start = time.perf_counter()
+        level = verification.level(level)
         if not all(self._checks()):
-            raise InvalidArchive
+            raise InvalidArchive(self.archive_filename)
+        infos, missing_members = self._manifest_infos_under(zip_dirs)
+        if missing_members:
+            raise DamagedArchive(self.archive_filename, missing_members)
+        if level == verification.STRUCTURE:
+            infos = []
+        damaged_members = self._damaged_members(
+            infos, parallel.jobs(jobs), hash=level == verification.FULL)
+        if damaged_members:
+            raise DamagedArchive(self.archive_filename, damaged_members)
+        return verification.Cost(
+            level=level,
+            members=len(infos),
+            bytes_read=sum(info.file_size for info, _ in infos),
+            seconds=time.perf_counter() - start)
 
     def _checks(self):
         yield self._has_well_formed_meta()
         yield self._bead_creation_time_is_in_the_past()
         yield self._extra_file() is None
-        yield self._file_with_different_content_id() is None
 
     def _has_well_formed_meta(self):
         meta = self.meta
@@ -89,19 +129,166 @@ class ZipArchive(UnpackableBead):
                     # unexpected extra file!
                     return name
 
-    def _file_with_different_content_id(self):
-        for name, hash in self.manifest.items():
+    def _manifest_infos_under(self, zip_dirs):
+        '''
+        ([(ZipInfo, hash)], missing member names) for manifest entries under zip_dirs.
+        '''
+        zipfile = self.zipfile
+        missing = []
+        infos = []
+        for name, hash in self._manifest_items_under(zip_dirs):
             try:
-                info = self.zipfile.getinfo(name)
+                infos.append((zipfile.getinfo(name), hash))
             except KeyError:
-                return name
-            archived_hash = securehash.file(self.zipfile.open(info), info.file_size)
-            if hash != archived_hash:
-                return name
+                missing.append(name)
+        return infos, sorted(missing)
+
+    def _damaged_members(self, infos, jobs, hash):
+        '''
+        Names of members that are corrupt (CRC-32 mismatch)
+        or - with `hash` - are not matching their manifest hash.
+
+        All members are checked, so that every damaged one is reported.
+        '''
+        # biggest first, so that workers are not waiting for a last big file
+        infos = sorted(infos, key=lambda info_hash: info_hash[0].file_size, reverse=True)
+
+        with zipopener.PerThreadMemberHandles(self.archive_filename, self.zipfile) as members, \
+                securehash.ChunkExecutor(jobs) as chunk_executor:
+            def is_damaged(info_hash):
+                info, manifest_hash = info_hash
+                try:
+                    if hash:
+                        archived_hash = self._hash_member(members, info, chunk_executor)
+                    else:
+                        _read_member(members, info)
+                        archived_hash = manifest_hash
+                except zipopener.CORRUPT_MEMBER_ERRORS:
+                    archived_hash = None
+                return manifest_hash != archived_hash
+
+            with ThreadPoolExecutor(max_workers=jobs) as executor:
+                damaged = executor.map(is_damaged, infos)
+                return sorted(
+                    info.filename
+                    for (info, _), is_damaged in zip(infos, damaged)
+                    if is_damaged)
+
+    def _hash_member(self, zipfile, info, chunk_executor=None):
+        '''
+        Manifest entry for the content of a member.
+
+        Chunks of big, stored (uncompressed) members of tree hashing meta versions
+        are read directly from the archive and hashed in parallel,
+        compressed members are decompressed serially, while their chunks are hashed
+        in parallel.
+        '''
+        meta_version = self.meta_version_spec
+        chunk_size = self.chunk_size
+        is_big_stored_member = (
+            chunk_size is not None
+            and info.file_size > chunk_size
+            and info.compress_type == ZIP_STORED)
+        if is_big_stored_member:
+            chunk_hashes = securehash.tree_chunk_hashes(
+                self._stored_member_reader(info),
+                info.file_size, chunk_size, meta_version.hash_algorithm, chunk_executor)
+            return securehash.tree_root(
+                chunk_hashes, info.file_size, chunk_size, meta_version.hash_algorithm)
+        return meta_version.hash_file(
+            zipfile.open(info), info.file_size, chunk_size, chunk_executor)
+
+    def _stored_member_reader(self, info):
+        '''
+        Positional reader for the content of a stored member - usable from many threads.
+        '''
+        with open(self.archive_filename, 'rb') as f:
+            data_offset = zipopener.member_data_offset(f, info)
+
+        def read_at(offset, length):
+            return tech.fs.read_at(self.archive_filename, data_offset + offset, length)
+        return read_at
+
+    def verify_chunks(self, zip_path, first_chunk=0, last_chunk=None, jobs=None):
+        '''
+        Check the content of a range of chunks of a member.
+
+        Only the selected chunks are read and hashed, which makes it cheap
+        to re-check a part of a BIG file.
+        Available only for tree hashing meta versions.
+
+        Returns the indexes of the damaged chunks,
+        raises DamagedArchive if the recorded chunk hashes are not matching the manifest.
+        '''
+        chunk_hashes = self._recorded_chunk_hashes(zip_path)
+        if last_chunk is None:
+            last_chunk = len(chunk_hashes) - 1
+        if not 0 <= first_chunk <= last_chunk < len(chunk_hashes):
+            raise IndexError('Chunk range out of bounds', first_chunk, last_chunk)
+        chunk_indexes = range(first_chunk, last_chunk + 1)
+        try:
+            archived_hashes = self._hash_chunks(zip_path, chunk_indexes, parallel.jobs(jobs))
+        except zipopener.CORRUPT_MEMBER_ERRORS:
+            return list(chunk_indexes)
+        return [
+            index
+            for index, archived_hash in zip(chunk_indexes, archived_hashes)
+            if archived_hash != chunk_hashes[index]]
+
+    def _recorded_chunk_hashes(self, zip_path):
+        meta_version = self.meta_version_spec
+        if not meta_version.tree_hash:
+            raise ValueError('Meta version has no chunk hashes', meta_version.name)
+        # chunk hashes are stored in meta, which must be intact to be trusted
+        self.validate(zip_dirs=())
+        size = self.zipfile.getinfo(zip_path).file_size
+        content_hash = self.manifest[zip_path]
+        chunk_size = self.chunk_size
+        chunk_count = securehash.chunk_count(size, chunk_size)
+        if chunk_count == 1:
+            return [content_hash]
+        chunk_hashes = self._chunks[meta.CHUNK_HASHES].get(zip_path)
+        if chunk_hashes is None:
+            raise ValueError('No chunk hashes recorded', zip_path)
+        chunks_match_content = (
+            len(chunk_hashes) == chunk_count
+            and content_hash == securehash.tree_root(
+                chunk_hashes, size, chunk_size, meta_version.hash_algorithm))
+        if not chunks_match_content:
+            raise DamagedArchive(self.archive_filename, [layouts.Archive.CHUNKS])
+        return chunk_hashes
+
+    def _hash_chunks(self, zip_path, chunk_indexes, jobs):
+        info = self.zipfile.getinfo(zip_path)
+        hash_chunks = functools.partial(
+            securehash.tree_chunk_hashes,
+            size=info.file_size,
+            chunk_size=self.chunk_size,
+            algorithm=self.meta_version_spec.hash_algorithm,
+            chunk_indexes=chunk_indexes)
+        if info.compress_type == ZIP_STORED:
+            with ThreadPoolExecutor(max_workers=jobs) as executor:
+                return hash_chunks(self._stored_member_reader(info), executor=executor)
+
+        # compressed data can be read only sequentially
+        with self.zipfile.open(info) as member:
+            def read_at(offset, length):
+                member.seek(offset)
+                return member.read(length)
+            return hash_chunks(read_at)
+
+    def _manifest_items_under(self, zip_dirs):
+        manifest = self.manifest
+        if zip_dirs is None:
+            return manifest.items()
+        prefixes = tuple(zip_dir + '/' for zip_dir in (layouts.Archive.META, *zip_dirs))
+        return [(name, hash) for name, hash in manifest.items() if name.startswith(prefixes)]
 
     @property
     def manifest(self):
-        return self.zip_load(layouts.Archive.MANIFEST)
+        if self.__manifest is None:
+            self.__manifest = self.zip_load(layouts.Archive.MANIFEST)
+        return self.__manifest
 
     @property
     def content_id(self):
@@ -110,12 +297,37 @@ class ZipArchive(UnpackableBead):
         return self._content_id
 
     def calculate_content_id(self):
-        # there is currently only one meta version
-        # and it must match the one defined in the workspace module
-        assert self._meta[meta.META_VERSION] == 'aaa947a6-1f7a-11e6-ba3a-0021cc73492e'
-        zipinfo = self.zipfile.getinfo(layouts.Archive.MANIFEST)
+        try:
+            zipinfo = self.zipfile.getinfo(layouts.Archive.MANIFEST)
+        except KeyError:
+            raise InvalidArchive(self.archive_filename, 'No manifest')
         with self.zipfile.open(zipinfo) as f:
-            return securehash.file(f, zipinfo.file_size)
+            return self.meta_version_spec.content_id(f, zipinfo.file_size)
+
+    @property
+    def meta_version_spec(self) -> meta.MetaVersion:
+        try:
+            return meta.get_meta_version(self.meta_version)
+        except LookupError:
+            raise InvalidArchive(self.archive_filename, 'Unknown meta version', self.meta_version)
+
+    @property
+    def chunk_size(self):
+        '''
+        Size of the chunks of tree hashed members - None, if the meta version has no tree hash.
+        '''
+        if not self.meta_version_spec.tree_hash:
+            return None
+        return self._chunks[meta.CHUNK_SIZE]
+
+    @property
+    def _chunks(self):
+        if self.__chunks is None:
+            try:
+                self.__chunks = self.zip_load(layouts.Archive.CHUNKS)
+            except:
+                raise InvalidArchive(self.archive_filename, 'Missing chunk hashes')
+        return self.__chunks
 
     @property
     def meta_version(self):
@@ -156,42 +368,349 @@ class ZipArchive(UnpackableBead):
         except:
             raise InvalidArchive(self.archive_filename)
 
+    def open_member(self, zip_path):
+        '''
+            Open member zip_path for reading as a binary file - without extracting it.
+
+            Stored members are memory mapped: the returned file has a read only
+            memoryview of the content in its `view` attribute, which can be used
+            without any copying (see zipmmap.MappedMember).
+            Compressed members are decompressed while read, they have no `view`.
+
+            The content is not verified against the manifest.
+        '''
+        zipfile = self.zipfile
+        info = zipfile.getinfo(zip_path)
+        if info.compress_type != ZIP_STORED:
+            return zipfile.open(info)
+        try:
+            return zipmmap.map_member(self.archive_filename, info)
+        except zipopener.BadZipFile:
+            raise DamagedArchive(self.archive_filename, [zip_path])
+
+    def open_data(self, path):
+        '''
+            Open data file at path (relative to the data directory) for reading as a binary file.
+
+            The content is verified against the manifest while it is read:
+            reading past its end raises DamagedArchive on mismatch.
+            Every file has its own file handle, so files can be read in parallel.
+        '''
+        zip_path = layouts.Archive.DATA / path
+        try:
+            info = self.zipfile.getinfo(zip_path)
+            hash = self.manifest[zip_path]
+        except KeyError:
+            raise DamagedArchive(self.archive_filename, [zip_path])
+        return io.BufferedReader(
+            _VerifyingReader(
+                self._open_member_with_own_handle(info),
+                self.meta_version_spec.hasher(info.file_size, self.chunk_size),
+                hash,
+                functools.partial(DamagedArchive, self.archive_filename, [zip_path])),
+            securehash.READ_BLOCK_SIZE)
+
+    def iter_data(self, selected=None):
+        '''
+            Yield (path, file) pairs for the data files in archive order.
+
+            `path` is relative to the data directory, `file` is as with `open_data`.
+            Files are closed, when the next one is yielded.
+            If `selected` is given, only the paths it accepts are yielded.
+        '''
+        zip_dir_prefix = layouts.Archive.DATA + '/'
+        names = _names_under(self.zipfile.namelist(), layouts.Archive.DATA, selected)
+        for name in names:
+            path = name[len(zip_dir_prefix):]
+            with self.open_data(path) as file:
+                yield path, file
+
+    def _open_member_with_own_handle(self, info):
+        f = open(self.archive_filename, 'rb')
+        try:
+            f.seek(zipopener.member_data_offset(f, info))
+            return ZipExtFile(f, 'r', info, close_fileobj=True)
+        except BaseException:
+            f.close()
+            raise
+
     def extract_file(self, zip_path, fs_path):
         '''
             Extract zip_path from zipfile to fs_path.
         '''
         fs_path = os.path.normpath(fs_path)
-
         upperdirs = os.path.dirname(fs_path)
         if upperdirs:
             tech.fs.ensure_directory(upperdirs)
+        self._extract_member(self.zipfile, zip_path, fs_path)
 
-        with self.zipfile.open(zip_path) as source:
-            with open(fs_path, 'wb') as target:
-                shutil.copyfileobj(source, target)
+    def _extract_member_and_hash(self, zipfile, zip_path, fs_path, readonly=False):
+        '''
+            Extract zip_path from zipfile to fs_path and return the hash of its content.
 
-    def extract_dir(self, zip_dir, fs_dir):
+            None is returned, if the member is corrupt.
         '''
-            Extract all files from zipfile under zip_dir to fs_dir.
+        try:
+            return self._extract_member(zipfile, zip_path, fs_path, hash=True, readonly=readonly)
+        except zipopener.CORRUPT_MEMBER_ERRORS:
+            return None
+
+    def _extract_member_checking_crc(self, zipfile, zip_path, fs_path, readonly=False):
         '''
+            Extract zip_path from zipfile to fs_path and return whether it is not corrupt.
+        '''
+        try:
+            self._extract_member(zipfile, zip_path, fs_path, readonly=readonly)
+            return True
+        except zipopener.CORRUPT_MEMBER_ERRORS:
+            return False
+
+    def _extract_member(self, zipfile, zip_path, fs_path, hash=False, readonly=False):
+        info = zipfile.getinfo(zip_path)
+        hasher = self.meta_version_spec.hasher(info.file_size, self.chunk_size)
+        with zipfile.open(info) as source:
+            with tech.fs.create_file(fs_path, readonly=readonly) as target:
+                while True:
+                    block = source.read(securehash.READ_BLOCK_SIZE)
+                    if not block:
+                        break
+                    if hash:
+                        hasher.update(block)
+                    target.write(block)
+        return hasher.hexdigest() if hash else None
+
+    def extract_dir(
+            self, zip_dir, fs_dir,
+            verify=False, jobs=None, readonly=False, store=None, selected=None):
+        '''
+            Extract all files from zipfile under zip_dir to fs_dir.
+
+            If `selected` is given, only files whose path relative to zip_dir
+            it accepts are extracted (and verified).
 
+            With `readonly` the files are created without write permission
+            and the directories under fs_dir (but not fs_dir itself)
+            are made read only after extraction.
+
+            Members are extracted by `jobs` threads in parallel, each reading
+            the archive through its own file handle
+            (see `tech.parallel.jobs` for the default).
+
+            The zip CRC-32 of the extracted files is always checked,
+            with `verify` they are also checked against the manifest
+            while they are written: on mismatch the extracted files are removed
+            and DamagedArchive is raised.
+
+            With an InputStore as `store` files are extracted into the store
+            (always verified, and only if not already there),
+            and fs_dir gets links to the stored - read only - files.
+        '''
+        fs_dir_existed = os.path.exists(fs_dir)
         tech.fs.ensure_directory(fs_dir)
 
+        fs_paths = self._fs_paths_under(zip_dir, fs_dir, selected)
+        directories = _directories_between(fs_dir, fs_paths.values())
+        for directory in directories:
+            tech.fs.ensure_directory(directory)
+
+        verify = verify or store is not None
+        manifest = self.manifest if verify else {}
+        if store is None:
+            damaged_members = self._extract_members(
+                fs_paths, manifest, verify, parallel.jobs(jobs), readonly)
+        else:
+            damaged_members = self._link_members_from_store(
+                fs_paths, manifest, parallel.jobs(jobs), store)
+        if verify and not damaged_members:
+            # members in the manifest, but not in the archive
+            damaged_members = sorted(
+                name
+                for name in _names_under(manifest, zip_dir, selected)
+                if name not in fs_paths)
+        if damaged_members:
+            if fs_dir_existed:
+                _remove_files(fs_paths.values())
+            else:
+                tech.fs.rmtree(fs_dir)
+            raise DamagedArchive(self.archive_filename, damaged_members)
+        if readonly:
+            for directory in directories:
+                tech.fs.make_readonly(directory)
+        TRACELOG(
+            f'{fs_dir}: created {len(fs_paths)} files' +
+            (f', made {len(directories)} directories read only' if readonly else ''))
+
+    def _fs_paths_under(self, zip_dir, fs_dir, selected=None):
+        '''
+            Map (selected) members under zip_dir to their extraction path - biggest members first.
+        '''
         zip_dir_prefix = zip_dir + '/'
-        zip_dir_prefix_len = len(zip_dir_prefix)
+        # only the last of duplicate names is extracted - as with getinfo()
+        infos = {info.filename: info for info in self.zipfile.infolist()}
+        infos = {name: infos[name] for name in _names_under(infos, zip_dir, selected)}
+        return {
+            name: os.path.normpath(fs_dir / name[len(zip_dir_prefix):])
+            for name, info in sorted(
+                infos.items(), key=lambda name_info: name_info[1].file_size, reverse=True)}
+
+    def _extract_members(self, fs_paths, manifest, verify, jobs, readonly):
+        '''
+            Extract members in parallel and return the damaged ones:
+            the corrupt ones (CRC-32 mismatch), and with `verify` the ones
+            not matching their manifest hash.
 
-        for zip_path in self.zipfile.namelist():
-            if not zip_path.startswith(zip_dir_prefix):
-                continue
-            fs_path = fs_dir / zip_path[zip_dir_prefix_len:]
-            self.extract_file(zip_path, fs_path)
+            Stops at the first mismatch.
+        '''
+        mismatch_found = threading.Event()
+
+        with zipopener.PerThreadMemberHandles(self.archive_filename, self.zipfile) as members:
+            def is_damaged(zip_path):
+                if mismatch_found.is_set():
+                    return False
+                fs_path = fs_paths[zip_path]
+                if verify:
+                    extracted_hash = self._extract_member_and_hash(
+                        members, zip_path, fs_path, readonly=readonly)
+                    is_intact = manifest.get(zip_path) == extracted_hash
+                else:
+                    is_intact = self._extract_member_checking_crc(
+                        members, zip_path, fs_path, readonly=readonly)
+                if not is_intact:
+                    mismatch_found.set()
+                    return True
+                return False
+
+            with ThreadPoolExecutor(max_workers=jobs) as executor:
+                damaged = executor.map(is_damaged, fs_paths)
+                return sorted(
+                    zip_path
+                    for zip_path, is_damaged in zip(fs_paths, damaged)
+                    if is_damaged)
+
+    def _link_members_from_store(self, fs_paths, manifest, jobs, store):
+        '''
+            Link members from store - adding the missing ones - and return the damaged ones.
+        '''
+        damaged_members = sorted(zip_path for zip_path in fs_paths if zip_path not in manifest)
+        if damaged_members:
+            return damaged_members
+
+        # members with the same content are stored once
+        zip_path_by_missing_hash = {}
+        for zip_path in fs_paths:
+            hash = manifest[zip_path]
+            size = self.zipfile.getinfo(zip_path).file_size
+            if hash not in zip_path_by_missing_hash and not store.has(hash, size):
+                zip_path_by_missing_hash[hash] = zip_path
+        with store.staging() as staging_dir:
+            staged_paths = {
+                zip_path: staging_dir / hash
+                for hash, zip_path in zip_path_by_missing_hash.items()}
+            damaged_members = self._extract_members(
+                staged_paths, manifest, True, jobs, readonly=True)
+            if damaged_members:
+                return damaged_members
+            for hash, zip_path in zip_path_by_missing_hash.items():
+                store.add(hash, staged_paths[zip_path])
+
+        not_linked = {
+            zip_path: fs_path
+            for zip_path, fs_path in fs_paths.items()
+            if not store.link(manifest[zip_path], fs_path)}
+        # evicted by someone else in the meantime
+        return self._extract_members(not_linked, manifest, True, jobs, readonly=True)
 
     def unpack_code_to(self, fs_dir):
         self.extract_dir(layouts.Archive.CODE, fs_dir)
 
-    def unpack_data_to(self, fs_dir):
-        self.extract_dir(layouts.Archive.DATA, fs_dir)
+    def unpack_data_to(
+            self, fs_dir, verify=False, jobs=None, readonly=False, store=None, selected=None):
+        self.extract_dir(
+            layouts.Archive.DATA, fs_dir,
+            verify=verify, jobs=jobs, readonly=readonly, store=store, selected=selected)
 
     def unpack_meta_to(self, workspace):
         workspace.meta = self.meta
         workspace.input_map = self.input_map
+
+
+def _read_member(zipfile, info):
+    '''
+    Read through the member - zipfile checks its CRC-32 at the end.
+    '''
+    with zipfile.open(info) as member:
+        while member.read(securehash.READ_BLOCK_SIZE):
+            pass
+
+
+class _VerifyingReader(io.RawIOBase):
+    '''
+        Raw reader over a member, that checks its hash when the end is reached.
+    '''
+
+    def __init__(self, member, hasher, expected_hash, make_error):
+        super().__init__()
+        self._member = member
+        self._hasher = hasher
+        self._expected_hash = expected_hash
+        self._make_error = make_error
+        self._verified = False
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        try:
+            size = self._member.readinto(buffer)
+        except zipopener.CORRUPT_MEMBER_ERRORS:
+            raise self._make_error()
+        if size:
+            with memoryview(buffer) as view:
+                self._hasher.update(view[:size])
+        elif not self._verified:
+            if self._hasher.hexdigest() != self._expected_hash:
+                raise self._make_error()
+            self._verified = True
+        return size
+
+    def close(self):
+        if not self.closed:
+            self._member.close()
+        super().close()
+
+
+def _names_under(names, zip_dir, selected=None):
+    '''
+        Names under zip_dir, whose zip_dir relative path is accepted by `selected` (if given).
+    '''
+    zip_dir_prefix = zip_dir + '/'
+    return [
+        name
+        for name in names
+        if name.startswith(zip_dir_prefix)
+        and (selected is None or selected(name[len(zip_dir_prefix):]))]
+
+
+def _directories_between(fs_dir, fs_paths):
+    '''
+        Directories strictly under fs_dir, that contain fs_paths - parents first.
+    '''
+    fs_dir = os.path.normpath(fs_dir)
+    directories = set()
+    for fs_path in fs_paths:
+        directory = os.path.dirname(fs_path)
+        while directory != fs_dir and directory not in directories:
+            directories.add(directory)
+            directory = os.path.dirname(directory)
+    return sorted(directories)
+
+
+def _remove_files(paths):
+    for path in paths:
+        if os.path.exists(path):
+            try:
+                os.remove(path)
+            except PermissionError:
+                # read only files can not be removed e.g. on Windows
+                tech.fs.make_writable(path)
+                os.remove(path)
@@ -0,0 +1,320 @@
+'''
+I am creating bead archives.
+
+Members are hashed while they are compressed, so their content is read only once.
+'''
+
+import collections
+from concurrent.futures import ThreadPoolExecutor
+import contextlib
+import itertools
+import os
+import time
+import zipfile
+
+from . import compression
+from . import layouts
+from . import meta
+from . import tech
+from . import zipwriter
+
+# technology modules
+persistence = tech.persistence
+parallel = tech.parallel
+securehash = tech.securehash
+
+
+META_VERSION_ENV_VAR = 'BEAD_META_VERSION'
+
+# files at least this big are compressed directly into the archive even with parallel jobs:
+# spilling would write and read them once more (and need room for them)
+DIRECT_WRITE_MIN_SIZE = 64 * 1024 ** 2
+
+
+def meta_version_for_new_archives():
+    '''
+    Meta version for new archives - raises ValueError on unknown $BEAD_META_VERSION.
+    '''
+    user_meta_version_preference = os.environ.get(META_VERSION_ENV_VAR)
+    if not user_meta_version_preference:
+        return meta.DEFAULT_META_VERSION
+    try:
+        return meta.get_meta_version(user_meta_version_preference)
+    except LookupError:
+        known_names = ', '.join(meta_version.name for meta_version in meta.META_VERSIONS)
+        raise ValueError(
+            f'Unknown meta version in ${META_VERSION_ENV_VAR}:'
+            f' {user_meta_version_preference!r} (known: {known_names})')
+
+
+def tree_chunk_size():
+    try:
+        return int(os.environ['BEAD_TREE_CHUNK_SIZE'])
+    except (KeyError, ValueError):
+        return meta.DEFAULT_TREE_CHUNK_SIZE
+
+
+class _NullHasher:
+    def update(self, block):
+        pass
+
+
+class _SpoolingHasher:
+    '''
+    Hasher for content of unknown size.
+
+    Hashes are prefixed with the content size, so the content is spooled
+    to a temporary file and it is hashed only at the end.
+    '''
+
+    def __init__(self, meta_version, chunk_size, executor, spill_directory):
+        self.meta_version = meta_version
+        self.chunk_size = chunk_size
+        self.executor = executor
+        self.spool = zipwriter.spill_file(spill_directory)
+
+    def update(self, block):
+        self.spool.write(block)
+
+    def hashes(self):
+        size = self.spool.tell()
+        self.spool.seek(0)
+        hasher = self.meta_version.hasher(size, self.chunk_size, self.executor)
+        hash = securehash.update_from_file(hasher, self.spool).hexdigest()
+        return hash, hasher.chunk_hashes if self.meta_version.tree_hash else [hash]
+
+
+def _copy_and_hash(first_block, source, target, hasher):
+    bytes_copied = 0
+    block = first_block
+    while block:
+        hasher.update(block)
+        target.write(block)
+        bytes_copied += len(block)
+        block = source.read(securehash.READ_BLOCK_SIZE)
+    return bytes_copied
+
+
+def _blocks(content):
+    '''
+    Blocks of content given as bytes, a binary file or an iterable of bytes.
+    '''
+    if isinstance(content, (bytes, bytearray, memoryview)):
+        yield content
+    elif hasattr(content, 'read'):
+        yield from iter(lambda: content.read(securehash.READ_BLOCK_SIZE), b'')
+    else:
+        yield from content
+
+
+class ZipCreator:
+    '''
+    Writer of a new archive.
+
+    The meta version, tree chunk size and number of jobs default to
+    the user's preferences given in the environment.
+    '''
+
+    def __init__(self):
+        self.hashes = {}
+        # chunk hashes of multi-chunk files (tree hashing meta versions only)
+        self.chunks = {}
+        self.zipfile = None
+        self.compression_policy = compression.Policy()
+        self.compression_stats = compression.Stats()
+        self.meta_version = meta_version_for_new_archives()
+        self.chunk_size = tree_chunk_size() if self.meta_version.tree_hash else None
+        self.jobs = parallel.jobs()
+        self.executor = None
+        # spill files are written next to the archive
+        self.spill_directory = None
+        # optional hashcache.HashCache for add_files
+        self.hash_cache = None
+
+    @contextlib.contextmanager
+    def writing(self, zip_file_name, comment):
+        '''
+        Open the archive for adding members, it is complete at exit.
+        '''
+        self.spill_directory = os.path.dirname(os.path.abspath(zip_file_name))
+        try:
+            with securehash.ChunkExecutor(self.jobs) as self.executor:
+                with zipfile.ZipFile(
+                    zip_file_name,
+                    mode='w',
+                    compression=self.compression_policy.default.compress_type,
+                    compresslevel=self.compression_policy.default.level,
+                    allowZip64=True,
+                ) as self.zipfile:
+                    self.zipfile.comment = comment.encode('utf-8')
+                    yield self
+        finally:
+            self.zipfile = None
+            self.executor = None
+            self.spill_directory = None
+
+    def add_hash(self, path, hash):
+        assert path not in self.hashes
+        self.hashes[path] = hash
+
+    def add_file_hashes(self, zip_path, hash, chunk_hashes):
+        self.add_hash(zip_path, hash)
+        if len(chunk_hashes) > 1:
+            self.chunks[zip_path] = chunk_hashes
+
+    def compress_file(self, path, zip_path, target):
+        '''
+        Compress file into the target ZipFile and hash it in a single pass.
+
+        The file is read only once, and it is not hashed at all,
+        if its hash is in the hash cache.
+        Returns the hash and the chunk hashes (a single chunk without tree hashing).
+        '''
+        zipinfo = zipfile.ZipInfo.from_file(path, zip_path)
+        with open(path, 'rb') as source:
+            stat = os.fstat(source.fileno())
+            first_block = source.read(securehash.READ_BLOCK_SIZE)
+            method = self.compression_policy.method_for(zip_path, first_block)
+            method.apply(zipinfo)
+            hashes = None
+            if self.hash_cache is not None:
+                hashes = self.hash_cache.get(zip_path, stat)
+            if hashes is None:
+                hasher = self.meta_version.hasher(
+                    zipinfo.file_size, self.chunk_size, self.executor)
+            else:
+                hasher = _NullHasher()
+            start = time.perf_counter()
+            with target.open(zipinfo, 'w') as compressed:
+                bytes_copied = _copy_and_hash(first_block, source, compressed, hasher)
+            self.compression_stats.add(method, zipinfo, time.perf_counter() - start)
+        if bytes_copied != zipinfo.file_size or bytes_copied != stat.st_size:
+            raise RuntimeError(f'{path} has changed while saving')
+        if hashes is None:
+            hash = hasher.hexdigest()
+            hashes = (hash, hasher.chunk_hashes if self.meta_version.tree_hash else [hash])
+        if self.hash_cache is not None:
+            self.hash_cache.put(zip_path, stat, *hashes)
+        return hashes
+
+    def compress_to_spill_file(self, path, zip_path):
+        '''
+        Compress file into a temporary zip file - can be run in parallel.
+        '''
+        spill = zipwriter.spill_file(self.spill_directory)
+        try:
+            with zipfile.ZipFile(
+                spill, mode='w', allowZip64=True
+            ) as spill_zip:
+                hashes = self.compress_file(path, zip_path, spill_zip)
+            return (spill, spill_zip.getinfo(zip_path)) + hashes
+        except:
+            spill.close()
+            raise
+
+    def add_spilled_file(self, spill, zipinfo, hash, chunk_hashes):
+        with spill:
+            zipwriter.copy_member(spill, zipinfo, self.zipfile)
+        self.add_file_hashes(zipinfo.filename, hash, chunk_hashes)
+
+    def add_file(self, path, zip_path):
+        self.add_file_hashes(zip_path, *self.compress_file(path, zip_path, self.zipfile))
+
+    def add_files(self, files):
+        '''
+        Add files given as (path, zip_path) pairs to the archive, in the given order.
+
+        With more than one job the files are compressed in parallel
+        and copied into the archive in order: the archive is the same
+        as with serial compression.
+        Big files (see DIRECT_WRITE_MIN_SIZE) are compressed directly into the archive,
+        their chunks are still hashed in parallel.
+        '''
+        if self.jobs == 1:
+            for path, zip_path in files:
+                self.add_file(path, zip_path)
+            return
+
+        with ThreadPoolExecutor(max_workers=self.jobs) as compressors:
+            pending = collections.deque()
+
+            def add_spilled_files(max_pending):
+                while len(pending) > max_pending:
+                    self.add_spilled_file(*pending.popleft().result())
+
+            for path, zip_path in files:
+                if os.path.getsize(path) >= DIRECT_WRITE_MIN_SIZE:
+                    add_spilled_files(max_pending=0)
+                    self.add_file(path, zip_path)
+                else:
+                    pending.append(compressors.submit(self.compress_to_spill_file, path, zip_path))
+                    # limit the number of spill files
+                    add_spilled_files(max_pending=2 * self.jobs)
+            add_spilled_files(max_pending=0)
+
+    def add_stream(self, zip_path, content, size=None):
+        '''
+        Compress and hash content in a single pass.
+
+        The content is given as bytes, a binary file or an iterable of bytes.
+        Without its `size` (not needed for bytes) the content is also spooled
+        to a temporary file for hashing.
+        '''
+        if isinstance(content, (bytes, bytearray, memoryview)):
+            size = len(content)
+        blocks = _blocks(content)
+        first_block = next(blocks, b'')
+        zipinfo = zipfile.ZipInfo(zip_path, date_time=time.localtime(time.time())[:6])
+        zipinfo.external_attr = 0o644 << 16
+        method = self.compression_policy.method_for(zip_path, first_block)
+        method.apply(zipinfo)
+        if size is None:
+            hasher = _SpoolingHasher(
+                self.meta_version, self.chunk_size, self.executor, self.spill_directory)
+        else:
+            zipinfo.file_size = size
+            hasher = self.meta_version.hasher(size, self.chunk_size, self.executor)
+        start = time.perf_counter()
+        bytes_copied = 0
+        with self.zipfile.open(zipinfo, 'w', force_zip64=size is None) as compressed:
+            for block in itertools.chain([first_block], blocks):
+                hasher.update(block)
+                compressed.write(block)
+                bytes_copied += len(block)
+        self.compression_stats.add(method, zipinfo, time.perf_counter() - start)
+        if size is None:
+            hashes = hasher.hashes()
+        elif bytes_copied != size:
+            raise ValueError(f'{zip_path}: expected {size} bytes, got {bytes_copied}')
+        else:
+            hash = hasher.hexdigest()
+            hashes = (hash, hasher.chunk_hashes if self.meta_version.tree_hash else [hash])
+        self.add_file_hashes(zip_path, *hashes)
+
+    def add_string_content(self, zip_path, string):
+        bytes = string.encode('utf-8')
+        self.zipfile.writestr(zip_path, bytes)
+        self.add_hash(zip_path, self.meta_version.hash_bytes(bytes, self.chunk_size))
+
+    def add_meta(self, kind, inputs, freeze_name, input_map, timestamp):
+        '''
+        Add the meta members - after all the code and data members.
+        '''
+        bead_meta = {
+            meta.META_VERSION: self.meta_version.id,
+            meta.KIND: kind,
+            meta.FREEZE_TIME: timestamp,
+            meta.INPUTS: {
+                input.name: {
+                    meta.INPUT_KIND: input.kind,
+                    meta.INPUT_CONTENT_ID: input.content_id,
+                    meta.INPUT_FREEZE_TIME: input.freeze_time_str}
+                for input in inputs},
+            meta.FREEZE_NAME: freeze_name}
+
+        if self.meta_version.tree_hash:
+            chunks = {meta.CHUNK_SIZE: self.chunk_size, meta.CHUNK_HASHES: self.chunks}
+            self.add_string_content(layouts.Archive.CHUNKS, persistence.dumps(chunks))
+        self.add_string_content(layouts.Archive.BEAD_META, persistence.dumps(bead_meta))
+        self.add_string_content(layouts.Archive.MANIFEST, persistence.dumps(self.hashes))
+        persistence.zip_dump(input_map, self.zipfile, layouts.Archive.INPUT_MAP)
@@ -0,0 +1,202 @@
+"""
+Reading the central directory of a zip file with many members is slow in Python,
+E.g. opening a zip file with >100000 members can take 15s.
+
+This module maintains a compact binary index of the members next to the archive
+(`index_path`), which is much faster to load, and enables reading members
+with direct seeks to their data - without parsing the central directory
+or the local file headers.
+
+The index is used only if the archive has not changed since the index was made
+(its size and modification time are recorded in the index).
+"""
+
+import os
+import struct
+from zipfile import ZipExtFile, ZipFile, ZipInfo
+
+from tracelog import TRACELOG
+
+from . import tech
+
+__all__ = (
+    'index_path', 'write_index', 'try_write_index', 'read_index', 'open_zip', 'IndexedZipFile')
+
+INDEX_SUFFIX = '.zindex'
+
+MAGIC = b'BEADZIX1'
+# magic, archive size, archive mtime_ns, member count
+HEADER = struct.Struct('<8sQqI')
+# header offset, data offset, compressed size, size, CRC, compress type, flag bits,
+# name length - followed by the utf-8 encoded name
+MEMBER = struct.Struct('<4QI3H')
+
+
+class IndexedZipInfo(ZipInfo):
+    __slots__ = ('data_offset',)
+
+
+def index_path(zip_path):
+    return os.path.splitext(zip_path)[0] + INDEX_SUFFIX
+
+
+def _archive_stamp(zip_path):
+    stat = os.stat(zip_path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def write_index(zip_path):
+    '''
+    Create or replace the index for the zip file at zip_path.
+    '''
+    from .zipopener import member_data_offset
+
+    stamp = _archive_stamp(zip_path)
+    parts = []
+    with ZipFile(zip_path) as zipfile, open(zip_path, 'rb') as f:
+        infos = zipfile.infolist()
+        parts.append(HEADER.pack(MAGIC, *stamp, len(infos)))
+        for info in infos:
+            name = info.filename.encode('utf-8')
+            parts.append(
+                MEMBER.pack(
+                    info.header_offset, member_data_offset(f, info),
+                    info.compress_size, info.file_size, info.CRC,
+                    info.compress_type, info.flag_bits, len(name)))
+            parts.append(name)
+    if _archive_stamp(zip_path) != stamp:
+        # changed while indexing
+        return
+    tech.fs.replace_file(index_path(zip_path), b''.join(parts))
+
+
+def try_write_index(zip_path):
+    '''
+    Create or replace the index for the zip file at zip_path, if possible.
+    '''
+    try:
+        write_index(zip_path)
+    except OSError:
+        # the archive is fine, it is just slower to open
+        TRACELOG(f'Could not write index for {zip_path}')
+
+
+def read_index(zip_path):
+    '''
+    Load members of zip file from its index (a list of IndexedZipInfo).
+
+    None is returned if there is no valid, up-to-date index.
+    '''
+    try:
+        with open(index_path(zip_path), 'rb') as f:
+            index = f.read()
+        stamp = _archive_stamp(zip_path)
+    except OSError:
+        return None
+    try:
+        return _parse_index(index, stamp)
+    except (struct.error, UnicodeDecodeError, ValueError):
+        TRACELOG(f'Ignoring malformed index {index_path(zip_path)}')
+        return None
+
+
+def has_current_index(zip_path):
+    '''
+    Is there an up-to-date index for the zip file? Only the header of the index is read.
+    '''
+    try:
+        with open(index_path(zip_path), 'rb') as f:
+            header = f.read(HEADER.size)
+        stamp = _archive_stamp(zip_path)
+        magic, size, mtime_ns, _member_count = HEADER.unpack(header)
+    except (OSError, struct.error):
+        return False
+    return magic == MAGIC and (size, mtime_ns) == stamp
+
+
+def _parse_index(index, stamp):
+    magic, size, mtime_ns, member_count = HEADER.unpack_from(index)
+    if magic != MAGIC or (size, mtime_ns) != stamp:
+        return None
+    infos = []
+    offset = HEADER.size
+    for _ in range(member_count):
+        (header_offset, data_offset, compress_size, file_size, crc,
+         compress_type, flag_bits, name_length) = MEMBER.unpack_from(index, offset)
+        offset += MEMBER.size
+        name = index[offset:offset + name_length].decode('utf-8')
+        offset += name_length
+        info = IndexedZipInfo(name)
+        info.header_offset = header_offset
+        info.data_offset = data_offset
+        info.compress_size = compress_size
+        info.file_size = file_size
+        info.CRC = crc
+        info.compress_type = compress_type
+        info.flag_bits = flag_bits
+        infos.append(info)
+    if offset != len(index):
+        raise ValueError('Unexpected data at end of index')
+    return infos
+
+
+class IndexedZipFile:
+    '''
+    Read only subset of the ZipFile interface backed by an index.
+
+    Members are opened with their own file handles, so they can be read
+    from multiple threads in parallel.
+    '''
+
+    def __init__(self, filename, infos):
+        self.filename = filename
+        self._infos = infos
+        self.NameToInfo = {info.filename: info for info in infos}
+
+    def infolist(self):
+        return list(self._infos)
+
+    def namelist(self):
+        return [info.filename for info in self._infos]
+
+    def getinfo(self, name):
+        info = self.NameToInfo.get(name)
+        if info is None:
+            raise KeyError(f'There is no item named {name!r} in the archive')
+        return info
+
+    def open(self, name, mode='r'):
+        if mode != 'r':
+            raise ValueError('IndexedZipFile is read only')
+        info = name if isinstance(name, ZipInfo) else self.getinfo(name)
+        f = open(self.filename, 'rb')
+        try:
+            f.seek(info.data_offset)
+            return ZipExtFile(f, mode, info, close_fileobj=True)
+        except BaseException:
+            f.close()
+            raise
+
+    def read(self, name):
+        with self.open(name) as f:
+            return f.read()
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_exc):
+        self.close()
+
+
+def open_zip(filename):
+    '''
+    Open zip file for reading - using its index, if it is up-to-date.
+    '''
+    infos = read_index(filename)
+    if infos is None:
+        return ZipFile(filename)
+    TRACELOG(f'Using index for {filename}')
+    return IndexedZipFile(filename, infos)
@@ -0,0 +1,98 @@
+'''
+I am providing zero-copy access to the content of stored (uncompressed) zip members.
+
+The content of a stored member is a contiguous byte range of the zip file,
+which is memory mapped read only and exposed as a memoryview.
+'''
+
+import io
+import mmap
+
+from .zipopener import BadZipFile, member_data_offset
+
+__all__ = ('MappedMember', 'map_member')
+
+
+class MappedMember(io.RawIOBase):
+    '''
+    Read only binary file over the memory mapped content of a stored member.
+
+    `view` is a read only memoryview of the content - usable without copying,
+    e.g. by numpy.frombuffer or pyarrow.py_buffer.
+
+    Closing the file unmaps the content, unless views of it are still in use,
+    in which case the mapping is released only after them.
+    '''
+
+    def __init__(self, view, mapping=None):
+        super().__init__()
+        self.view = view
+        self._mapping = mapping
+        self._position = 0
+
+    @property
+    def size(self):
+        return len(self.view)
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        self._checkClosed()
+        start = min(self._position, self.size)
+        end = min(start + len(buffer), self.size)
+        with memoryview(buffer) as target:
+            target.cast('B')[:end - start] = self.view[start:end]
+        self._position = end
+        return end - start
+
+    def readall(self):
+        self._checkClosed()
+        start = min(self._position, self.size)
+        self._position = self.size
+        return bytes(self.view[start:])
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        self._checkClosed()
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._position, io.SEEK_END: self.size}[whence]
+        if base + offset < 0:
+            raise ValueError(f'Negative seek position {base + offset}')
+        self._position = base + offset
+        return self._position
+
+    def tell(self):
+        self._checkClosed()
+        return self._position
+
+    def close(self):
+        if not self.closed and self._mapping is not None:
+            try:
+                self.view.release()
+                self._mapping.close()
+            except BufferError:
+                # exported views are still alive - the mapping is closed with them
+                pass
+        super().close()
+
+
+def map_member(filename, zipinfo):
+    '''
+    Memory map the content of the stored member described by zipinfo in zip file filename.
+    '''
+    if zipinfo.file_size == 0:
+        return MappedMember(memoryview(b''))
+    with open(filename, 'rb') as f:
+        data_offset = member_data_offset(f, zipinfo)
+        # mappings must start at a multiple of the allocation granularity
+        map_offset = data_offset - data_offset % mmap.ALLOCATIONGRANULARITY
+        try:
+            mapping = mmap.mmap(
+                f.fileno(), data_offset - map_offset + zipinfo.file_size,
+                access=mmap.ACCESS_READ, offset=map_offset)
+        except ValueError:
+            raise BadZipFile('Truncated member', zipinfo.filename)
+    view = memoryview(mapping)[data_offset - map_offset:]
+    return MappedMember(view, mapping)
@@ -0,0 +1,67 @@
+"""
+Python's zipfile can not add already compressed members to a zip file.
+
+For compressing members in parallel, each member is compressed into its own
+(temporary) zip file by workers, and this module copies the compressed member
+into the final zip file - without decompressing and compressing it again.
+
+The copied bytes are the same as if the member was written directly
+into the final zip file.
+"""
+
+import copy
+import tempfile
+from zipfile import ZipFile
+
+from .tech import securehash
+from .zipopener import member_data_offset
+
+__all__ = ('spill_file', 'copy_member')
+
+# members smaller than this are compressed in memory
+SPILL_MEMORY_LIMIT = 1024 ** 2
+
+
+def spill_file(directory=None):
+    '''
+    Temporary file for a zip file of a single compressed member.
+
+    Bigger spill files are written to disk into `directory`
+    (the default temporary directory, if None).
+    '''
+    return tempfile.SpooledTemporaryFile(max_size=SPILL_MEMORY_LIMIT, dir=directory)
+
+
+def copy_member(source_file, source_zipinfo, target: ZipFile):
+    '''
+    Append the member `source_zipinfo` of zip file `source_file` to zip file `target`.
+
+    The local file header and the compressed data are copied verbatim,
+    so the member need not be decompressed.
+    '''
+    data_offset = member_data_offset(source_file, source_zipinfo)
+    member_size = data_offset - source_zipinfo.header_offset + source_zipinfo.compress_size
+
+    zipinfo = copy.copy(source_zipinfo)
+    # uses zipfile internals, the same way as ZipFile.write
+    with target._lock:
+        if target._writing:
+            raise ValueError("Can't write to ZIP archive while an open writing handle exists")
+        target._writecheck(zipinfo)
+        target._didModify = True
+        target.fp.seek(target.start_dir)
+        zipinfo.header_offset = target.fp.tell()
+        source_file.seek(source_zipinfo.header_offset)
+        _copy_bytes(source_file, target.fp, member_size)
+        target.filelist.append(zipinfo)
+        target.NameToInfo[zipinfo.filename] = zipinfo
+        target.start_dir = target.fp.tell()
+
+
+def _copy_bytes(source, target, size):
+    while size:
+        block = source.read(min(size, securehash.READ_BLOCK_SIZE))
+        if not block:
+            raise EOFError('Unexpected end of zip file')
+        target.write(block)
+        size -= len(block)
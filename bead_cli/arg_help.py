@@ -8,3 +8,17 @@ INPUT_NICK = (
     'name of input,'
     + ' its workspace relative location is "input/%(metavar)s"')
 BOX = 'Name of box to store bead'
+REINDEX_BOX = 'name of box to reindex (default: all boxes)'
+REINDEX_JOBS = 'number of processes to use for reindexing archives'
+JOBS = 'number of threads to use for verifying and extracting archives'
+INCLUDE = (
+    'load only input files matching %(metavar)s (can be repeated),'
+    + ' remembered for later loads and updates')
+EXCLUDE = (
+    'do not load input files matching %(metavar)s (can be repeated),'
+    + ' remembered for later loads and updates')
+PARANOID = 'verify archives even if they are recorded as already verified'
+VERIFICATION_LEVEL = (
+    'how thoroughly archives are verified: structure only, zip CRC-32 checksums (crc),'
+    + ' or cryptographic hashes (full)')
+VERIFY_ALL = 'verify all archive members, not only the ones being extracted'
@@ -3,3 +3,6 @@ WORKSPACE  = 'DIRECTORY'
 BEAD_REF   = 'BEAD-REF'
 INPUT_NICK = 'INPUT-NAME'
 BOX = 'BOX-NAME'
+JOBS = 'N'
+PATTERN = 'GLOB'
+VERIFICATION_LEVEL = 'LEVEL'
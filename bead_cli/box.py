@@ -1,10 +1,17 @@
 import os
+import time
 
+from bead import boxindex
 from bead import tech
+from bead import zipindex
 from bead.archive import Archive
 from .cmdparse import Command
-from .common import OPTIONAL_ENV, die
+from .common import OPTIONAL_ENV, DefaultArgSentinel, die
 from .web import rewire
+from . import arg_help
+from . import arg_metavar
+
+ALL_BOXES = DefaultArgSentinel('all boxes')
 
 
 class CmdAdd(Command):
@@ -82,7 +89,7 @@ class CmdForget(Command):
 
 class CmdXmeta(Command):
     '''
-    eXport eXtended meta attributes to a file next to zip archive.
+    eXport eXtended meta attributes and member index to files next to zip archive.
     '''
     def declare(self, arg):
         arg('zip_archive_filename')
@@ -91,6 +98,58 @@ class CmdXmeta(Command):
         archive = Archive(args.zip_archive_filename)
         archive.save_cache()
         print(f'Saved {archive.cache_path}')
+        zipindex.write_index(archive.archive_filename)
+        print(f'Saved {zipindex.index_path(archive.archive_filename)}')
+
+
+class CmdReindex(Command):
+    '''
+    Create missing xmeta caches and member indexes for all archives in boxes,
+    and the box indexes - boxes without an index are scanned on every query.
+
+    Archives are processed in parallel, an interrupted reindex continues where it stopped.
+    '''
+    def declare(self, arg):
+        arg('box_name', nargs='?', default=ALL_BOXES, type=str,
+            metavar=arg_metavar.BOX, help=arg_help.REINDEX_BOX)
+        arg('-j', '--jobs', metavar=arg_metavar.JOBS, type=int,
+            default=DefaultArgSentinel(f'${tech.parallel.JOBS_ENV_VAR} or number of CPUs'),
+            help=arg_help.REINDEX_JOBS)
+        arg(OPTIONAL_ENV)
+
+    def run(self, args):
+        boxes = args.get_env().get_boxes()
+        if args.box_name is not ALL_BOXES:
+            boxes = [box for box in boxes if box.name == args.box_name]
+            if not boxes:
+                die(f'Unknown box {args.box_name}')
+        jobs = None if isinstance(args.jobs, DefaultArgSentinel) else args.jobs
+        for box in boxes:
+            reindex_box(box, tech.parallel.jobs(jobs))
+
+
+def reindex_box(box, jobs):
+    file_names = boxindex.archives_to_reindex(box.directory)
+    print(f'Box {box.name}: {len(file_names)} archives to reindex')
+    start = time.perf_counter()
+    archives = bytes_read = 0
+    invalid = []
+    for result in boxindex.reindex_archives([box.directory / f for f in file_names], jobs):
+        archives += 1
+        bytes_read += result.size
+        if result.error:
+            invalid.append(result)
+    seconds = time.perf_counter() - start
+    try:
+        box.index.refresh()
+    except boxindex.UnavailableIndex as e:
+        print(f'WARNING: could not update the box index: {e}')
+    if archives:
+        print(
+            f'\tReindexed {archives} archives ({bytes_read} bytes) in {seconds:.2f}s,'
+            f' {archives / seconds:.1f} archives/s')
+    for result in invalid:
+        print(f'\tInvalid archive {result.path}: {result.error}')
 
 
 class CmdRewire(Command):
@@ -112,7 +171,10 @@ class CmdRewire(Command):
             die(f'Unknown box {name}')
         rewire_options = tech.persistence.file_load(args.rewire_options_json)
         rewire_specs = rewire_options.get(name, [])
-        # This could be painfully slow, if there are many beads and their metadata
-        # is not exported/cached with xmeta
-        for bead in box.all_beads():
-            rewire.apply(bead, rewire_specs)
+        # beads are found by their content ids in the box index
+        rewired = set()
+        for spec in rewire_specs:
+            for bead in box.find_by_content_id(spec['content_id']):
+                if bead.archive_filename not in rewired:
+                    rewired.add(bead.archive_filename)
+                    rewire.apply(bead, rewire_specs)
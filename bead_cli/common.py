@@ -1,12 +1,16 @@
 import os
 import sys
 
+import attr
+
 from bead.exceptions import InvalidArchive
 from bead.workspace import Workspace
 from bead import spec as bead_spec
 from bead.archive import Archive
+from bead import verification
 from bead import box as bead_box
 from bead.tech.fs import Path
+from bead.tech import parallel
 from bead.tech.timestamp import time_from_user, parse_iso8601
 from . import arg_help
 from . import arg_metavar
@@ -98,6 +102,49 @@ class DefaultArgSentinel:
         return self.description
 
 
+def VERIFICATION(parser):
+    '''
+    Define options on how to verify archives
+    '''
+    parser.arg(
+        '-j', '--jobs', metavar=arg_metavar.JOBS, type=int,
+        default=DefaultArgSentinel(f'${parallel.JOBS_ENV_VAR} or number of CPUs'),
+        help=arg_help.JOBS)
+    parser.arg(
+        '--paranoid', default=False, action='store_true',
+        help=arg_help.PARANOID)
+    parser.arg(
+        '--verify-all', dest='verify_all', default=False, action='store_true',
+        help=arg_help.VERIFY_ALL)
+    parser.arg(
+        '--verify', dest='verification_level', metavar=arg_metavar.VERIFICATION_LEVEL,
+        choices=verification.LEVELS,
+        default=DefaultArgSentinel(f'${verification.LEVEL_ENV_VAR} or {verification.FULL}'),
+        help=arg_help.VERIFICATION_LEVEL)
+
+
+@attr.s(auto_attribs=True, frozen=True)
+class Verification:
+    jobs: int
+    # verify even archives that are already known to be valid
+    paranoid: bool = False
+    # verify all members, not only the ones being extracted
+    all_members: bool = False
+    level: str = verification.FULL
+
+
+def get_verification(args) -> Verification:
+    jobs = None if isinstance(args.jobs, DefaultArgSentinel) else args.jobs
+    level = args.verification_level
+    try:
+        level = verification.level(None if isinstance(level, DefaultArgSentinel) else level)
+    except ValueError as e:
+        die(f'{e} in ${verification.LEVEL_ENV_VAR}')
+    return Verification(
+        jobs=parallel.jobs(jobs), paranoid=args.paranoid, all_members=args.verify_all,
+        level=level)
+
+
 def BEAD_TIME(parser):
     parser.arg('-t', '--time', dest='bead_time', type=time_from_user, default=TIME_LATEST)
 
@@ -136,11 +183,34 @@ def resolve_bead(env, bead_ref_base, time):
     return unionbox.get_at(bead_spec.BEAD_NAME, bead_ref_base, time)
 
 
-def verify_with_feedback(archive: Archive):
+def verify_with_feedback(archive: Archive, verification: Verification, zip_dirs=None):
+    '''
+    Verify the meta and the members under zip_dirs (all members, if None).
+
+    All members are verified, if the user asked for it.
+    '''
+    if verification.all_members:
+        zip_dirs = None
     print(f'Verifying archive {archive.archive_filename} ...', end='', flush=True)
     try:
-        archive.validate()
-        print(' OK', flush=True)
-    except InvalidArchive:
+        cost = archive.validate(
+            jobs=verification.jobs, zip_dirs=zip_dirs, paranoid=verification.paranoid,
+            level=verification.level)
+        print(f' OK ({format_cost(cost)})', flush=True)
+    except InvalidArchive as e:
         print(' DAMAGED!', flush=True)
+        print_damaged_members(e)
         raise
+
+
+def format_cost(cost):
+    if cost is None:
+        return 'verified before'
+    return (
+        f'{cost.level}: {cost.members} files, {cost.bytes_read} bytes read,'
+        f' {cost.seconds:.2f}s')
+
+
+def print_damaged_members(exception: InvalidArchive):
+    for name in getattr(exception, 'damaged_members', ()):
+        print(f'  damaged: {name}', flush=True)
@@ -6,15 +6,18 @@ from .cmdparse import Command
 from . import arg_metavar
 from . import arg_help
 from .common import (
-    OPTIONAL_WORKSPACE, OPTIONAL_ENV,
+    OPTIONAL_WORKSPACE, OPTIONAL_ENV, VERIFICATION, get_verification,
     DefaultArgSentinel, assert_valid_workspace,
-    verify_with_feedback,
+    verify_with_feedback, print_damaged_members,
     die, warning
 )
 from .common import BEAD_REF_BASE_defaulting_to, BEAD_OFFSET, BEAD_TIME, resolve_bead, TIME_LATEST
 from bead.box import UnionBox
+from bead.inputstore import InputStore
+from bead import layouts
 from bead.meta import BeadName
 import bead.spec as bead_spec
+from bead import verification as bead_verification
 from bead.workspace import Workspace
 
 # input_nick
@@ -39,6 +42,30 @@ def INPUT_NICK(parser):
         metavar=arg_metavar.INPUT_NICK, help=arg_help.INPUT_NICK)
 
 
+def INPUT_PATTERNS(parser):
+    '''
+    Declare --include and --exclude glob patterns of input files to load
+    '''
+    parser.arg(
+        '--include', metavar=arg_metavar.PATTERN, action='append',
+        help=arg_help.INCLUDE)
+    parser.arg(
+        '--exclude', metavar=arg_metavar.PATTERN, action='append',
+        help=arg_help.EXCLUDE)
+
+
+def _patterns_changed(workspace, input_nick, include, exclude):
+    recorded_include, recorded_exclude = workspace.get_input_patterns(input_nick)
+    return (
+        (include is not None and tuple(include) != recorded_include)
+        or (exclude is not None and tuple(exclude) != recorded_exclude))
+
+
+def _die_on_patterns_for_all_inputs(args):
+    if args.include is not None or args.exclude is not None:
+        die('--include and --exclude can be given only for a single input')
+
+
 # bead_ref
 SAME_BEAD_NEWEST_VERSION = DefaultArgSentinel('same bead, newest version')
 USE_INPUT_NICK = DefaultArgSentinel(f'use {arg_metavar.INPUT_NICK}')
@@ -53,8 +80,10 @@ class CmdAdd(Command):
         arg(INPUT_NICK)
         arg(BEAD_REF_BASE_defaulting_to(USE_INPUT_NICK))
         arg(BEAD_TIME)
+        arg(INPUT_PATTERNS)
         arg(OPTIONAL_WORKSPACE)
         arg(OPTIONAL_ENV)
+        arg(VERIFICATION)
 
     def run(self, args):
         input_nick = args.input_nick
@@ -73,7 +102,9 @@ class CmdAdd(Command):
         except LookupError:
             die(f'Not a known bead name: {bead_ref_base}')
 
-        _check_load_with_feedback(workspace, args.input_nick, bead)
+        _check_load_with_feedback(
+            workspace, args.input_nick, bead, get_verification(args),
+            args.include, args.exclude)
 
 
 class CmdMap(Command):
@@ -130,8 +161,10 @@ class CmdUpdate(Command):
         arg(BEAD_REF_BASE_defaulting_to(SAME_BEAD_NEWEST_VERSION))
         arg(BEAD_TIME)
         arg(BEAD_OFFSET)
+        arg(INPUT_PATTERNS)
         arg(OPTIONAL_WORKSPACE)
         arg(OPTIONAL_ENV)
+        arg(VERIFICATION)
 
     def run(self, args):
         if args.input_nick is ALL_INPUTS:
@@ -142,6 +175,7 @@ class CmdUpdate(Command):
     def update_all_inputs(self, args):
         assert args.bead_ref_base is SAME_BEAD_NEWEST_VERSION
         assert not args.bead_offset, "--next, --prev can not be specified when updating all inputs"
+        _die_on_patterns_for_all_inputs(args)
         workspace = get_workspace(args)
         env = args.get_env()
         unionbox = UnionBox(env.get_boxes())
@@ -160,7 +194,7 @@ class CmdUpdate(Command):
                 else:
                     warning(f'Could not find bead for "{input.name}" with name "{bead_name}"')
             else:
-                _update_input(workspace, input, bead)
+                _update_input(workspace, input, bead, get_verification(args))
         print('All inputs are up to date.')
 
     def update_one_input(self, args):
@@ -200,13 +234,18 @@ class CmdUpdate(Command):
             assert args.bead_offset == 0
             bead = resolve_bead(env, bead_ref_base, args.bead_time)
         if bead:
-            _update_input(workspace, input, bead)
+            _update_input(
+                workspace, input, bead, get_verification(args), args.include, args.exclude)
         else:
             die('Can not find matching bead')
 
 
-def _update_input(workspace, input, bead):
-    if workspace.is_loaded(input.name) and input.content_id == bead.content_id:
+def _update_input(workspace, input, bead, verification, include=None, exclude=None):
+    if (
+        workspace.is_loaded(input.name)
+        and input.content_id == bead.content_id
+        and not _patterns_changed(workspace, input.name, include, exclude)
+    ):
         assert input.kind == bead.kind
         assert input.freeze_time == bead.freeze_time
         print(
@@ -215,7 +254,7 @@ def _update_input(workspace, input, bead):
     else:
         if input.kind != bead.kind:
             warning(f'Updating input "{input.name}" with a bead of different kind')
-        _check_load_with_feedback(workspace, input.name, bead)
+        _check_load_with_feedback(workspace, input.name, bead, verification, include, exclude)
 
 
 class CmdLoad(Command):
@@ -225,57 +264,89 @@ class CmdLoad(Command):
 
     def declare(self, arg):
         arg(OPTIONAL_INPUT_NICK)
+        arg(INPUT_PATTERNS)
         arg(OPTIONAL_WORKSPACE)
         arg(OPTIONAL_ENV)
+        arg(VERIFICATION)
 
     def run(self, args):
         input_nick = args.input_nick
         workspace = get_workspace(args)
         env = args.get_env()
+        verification = get_verification(args)
         if input_nick is ALL_INPUTS:
+            _die_on_patterns_for_all_inputs(args)
             inputs = workspace.inputs
             if inputs:
                 for input in inputs:
-                    _load(env, workspace, input)
+                    _load(env, workspace, input, verification)
             else:
                 warning('No inputs defined to load.')
         else:
             if not workspace.has_input(input_nick):
                 die(f'No input with name {input_nick}')
-            _load(env, workspace, workspace.get_input(input_nick))
+            _load(
+                env, workspace, workspace.get_input(input_nick), verification,
+                args.include, args.exclude)
 
 
-def _load(env, workspace, input):
+def _load(env, workspace, input, verification, include=None, exclude=None):
     assert input is not None
-    if not workspace.is_loaded(input.name):
+    if (
+        not workspace.is_loaded(input.name)
+        or _patterns_changed(workspace, input.name, include, exclude)
+    ):
         name = workspace.get_input_bead_name(input.name)
         content_id = input.content_id
-        bead = None
-        for box in env.get_boxes():
-            bead = box.find_bead(name, content_id)
-            if bead:
-                break
+        bead = UnionBox(env.get_boxes()).find_bead(name, content_id)
         if bead is None:
             warning(
                 f'Could not find archive named "{name}" for input "{input.name}" - not loaded!')
             return
-        _check_load_with_feedback(workspace, input.name, bead)
+        if bead.name != name:
+            print(f'Loading "{input.name}" from "{bead.name}" - "{name}" has been renamed?')
+        _check_load_with_feedback(workspace, input.name, bead, verification, include, exclude)
     else:
         print(f'"{input.name}" is already loaded - skipping')
 
 
-def _check_load_with_feedback(workspace: Workspace, input_nick, bead):
+def get_input_store():
+    try:
+        return InputStore.from_environment()
+    except ValueError as e:
+        die(str(e))
+
+
+def _check_load_with_feedback(
+    workspace: Workspace, input_nick, bead, verification, include=None, exclude=None
+):
+    store = get_input_store()
+    # data is verified while it is extracted, so it is read only once
     try:
-        verify_with_feedback(bead)
+        verify_with_feedback(bead, verification, zip_dirs=())
     except InvalidArchive:
         warning(f'Bead for {input_nick} is found but damaged - not loading.')
+        return
+    if workspace.is_loaded(input_nick):
+        print(f'Current data in {input_nick} will be replaced')
+    print(f'Loading new data to {input_nick} ...', end='', flush=True)
+    try:
+        workspace.load(
+            input_nick, bead,
+            verify=(
+                verification.level == bead_verification.FULL
+                and (verification.paranoid
+                     or not bead.is_verified_under([layouts.Archive.DATA]))),
+            jobs=verification.jobs,
+            store=store,
+            include=include,
+            exclude=exclude)
+    except InvalidArchive as e:
+        print(' DAMAGED!', flush=True)
+        print_damaged_members(e)
+        warning(f'Bead for {input_nick} is found but damaged - not loading.')
     else:
         workspace.set_input_bead_name(input_nick, bead.name)
-        if workspace.is_loaded(input_nick):
-            print(f'Removing current data from {input_nick}')
-            workspace.unload(input_nick)
-        print(f'Loading new data to {input_nick} ...', end='', flush=True)
-        workspace.load(input_nick, bead)
         print(' Done')
 
 
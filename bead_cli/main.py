@@ -74,7 +74,7 @@ def make_argument_parser(defaults):
 
             'xmeta',
             box.CmdXmeta,
-            'eXport eXtended meta attributes to a file next to zip archive.',
+            'eXport eXtended meta attributes and member index to files next to zip archive.',
 
             'version',
             CmdVersion,
@@ -124,7 +124,11 @@ def make_argument_parser(defaults):
 
             'rewire',
             box.CmdRewire,
-            'Remap inputs.'))
+            'Remap inputs.',
+
+            'reindex',
+            box.CmdReindex,
+            'Create missing xmeta caches and member indexes of archives in boxes.'))
 
     return parser
 
@@ -1,10 +1,12 @@
 from glob import glob
 import os
+from unittest import mock
 
 from bead.test import TestCase
 
 from .test_robot import Robot
 
+from bead.box import Box
 from bead.tech.timestamp import timestamp
 from bead.workspace import Workspace
 
@@ -126,6 +128,27 @@ class Test_box_commands(TestCase):
         robot.cli('box', 'forget', 'non-existing')
         assert 'WARNING' in robot.stdout
 
+    def test_reindex(self, robot, dir1):
+        robot.cli('box', 'add', 'box', dir1)
+        robot.write_file(f'{dir1}/junk.zip', 'not a zip file')
+        robot.cli('new', 'bead')
+        robot.cd('bead')
+        robot.cli('save')
+        robot.cd('..')
+
+        robot.cli('box', 'reindex', '--jobs', '2')
+        assert 'Box box: 2 archives to reindex' in robot.stdout
+        assert 'Reindexed 2 archives' in robot.stdout
+        assert 'Invalid archive' in robot.stdout and 'junk.zip' in robot.stdout
+        assert glob(robot.cwd / dir1 / 'bead_*.xmeta')
+
+        robot.cli('box', 'reindex', 'box')
+        assert 'Box box: 1 archives to reindex' in robot.stdout
+
+    def test_reindex_unknown_box(self, robot):
+        self.assertRaises(SystemExit, robot.cli, 'box', 'reindex', 'unknown')
+        assert 'unknown' in robot.stderr
+
     def test_rewire(self, robot, dir1):
         # This is a long test, but easy to explain:
         # There are 3 beads a, b, and x stored in a box ('hack-box')
@@ -166,12 +189,12 @@ class Test_box_commands(TestCase):
         # "renamed" ~> x
         # b -> x
 
-        # test of test setup: 'input load' should fail due to the renamed input a
+        # test of test setup: 'input load' finds the renamed input a only by its content id
         robot.cli('develop x')
         robot.cd('x')
         robot.cli('input load')
-        assert 'WARNING' in robot.stderr
-        assert not os.path.exists(robot.cwd / 'input/input-a')
+        assert 'has been renamed' in robot.stdout
+        assert 'a' == robot.read_file('input/input-a/README')
         assert 'b' == robot.read_file('input/input-b/README')
         robot.cd('..')
         robot.cli('zap x')
@@ -179,7 +202,8 @@ class Test_box_commands(TestCase):
 
         # test: fix input loading by modifying the input-map with rewire commands
         robot.cli('web rewire-options rewire.json')
-        robot.cli('box rewire hack-box rewire.json')
+        with mock.patch.object(Box, 'all_beads', side_effect=AssertionError('scanned all beads')):
+            robot.cli('box rewire hack-box rewire.json')
 
         # "renamed" -> x
         # b -> x
@@ -189,5 +213,6 @@ class Test_box_commands(TestCase):
         robot.cd('x')
         robot.cli('input load')
         assert robot.stderr == ''
+        assert 'has been renamed' not in robot.stdout
         assert 'a' == robot.read_file('input/input-a/README')
         assert 'b' == robot.read_file('input/input-b/README')
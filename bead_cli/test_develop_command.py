@@ -1,9 +1,12 @@
 import os
+import warnings
+import zipfile
 
 from bead.test import TestCase
 
 from bead.workspace import Workspace
 from bead import layouts
+from bead import tech
 from . import test_fixtures as fixtures
 
 
@@ -54,3 +57,38 @@ class Test_develop(TestCase, fixtures.RobotAndBeads):
         os.makedirs(robot.cwd / bead_a)
         self.assertRaises(SystemExit, robot.cli, 'develop', bead_a)
         assert 'ERROR' in robot.stderr
+
+    def test_paranoid_verification_with_jobs(self, robot, bead_a):
+        robot.cli('develop', '--paranoid', '--jobs', '2', bead_a)
+
+        assert Workspace(robot.cwd / bead_a).is_valid
+
+    def test_damaged_data_is_not_verified_if_not_extracted(self, robot, bead_with_damaged_data):
+        robot.cli('develop', bead_with_damaged_data, 'ws')
+
+        assert Workspace(robot.cwd / 'ws').is_valid
+
+    def test_damaged_data_is_detected_with_extract_output(self, robot, bead_with_damaged_data):
+        self.assertRaises(SystemExit, robot.cli, 'develop', '-x', bead_with_damaged_data, 'ws')
+        assert 'damaged: data/README' in robot.stdout
+        assert not os.path.exists(robot.cwd / 'ws')
+
+    def test_damaged_data_is_detected_with_verify_all(self, robot, bead_with_damaged_data):
+        self.assertRaises(
+            SystemExit, robot.cli, 'develop', '--verify-all', bead_with_damaged_data, 'ws')
+        assert 'damaged: data/README' in robot.stdout
+
+    # fixtures
+    def bead_with_damaged_data(self):
+        bead_path = self.new_temp_dir() / 'damaged_bead.zip'
+        ws = Workspace(self.new_temp_dir() / 'damaged_bead')
+        ws.create('kind')
+        tech.fs.write_file(ws.directory / 'code', 'code')
+        tech.fs.write_file(ws.directory / 'output/README', 'README')
+        ws.pack(bead_path, fixtures.TS1, comment='')
+        with zipfile.ZipFile(bead_path, 'a') as z:
+            with warnings.catch_warnings():
+                # duplicate name
+                warnings.simplefilter('ignore')
+                z.writestr(layouts.Archive.DATA / 'README', 'DAMAGED')
+        return bead_path
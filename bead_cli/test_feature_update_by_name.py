@@ -71,11 +71,9 @@ class Test_feature_update_by_name(TestCase, fixtures.RobotAndBeads):
         self.assert_loaded(robot, 'input1', fixtures.TS4)
         self.assert_loaded(robot, 'input2', fixtures.TS4)
 
-    def test_load_finds_renamed_bead_only_after_rewiring_input_map(
+    def test_load_finds_renamed_bead_by_content_id(
         self, robot, bead_a, bead_b, box, beads: Dict[str, Archive]
     ):
-        # reason: speed
-        # reason: implementation simplicity
         cd = robot.cd
         cli = robot.cli
 
@@ -91,14 +89,16 @@ class Test_feature_update_by_name(TestCase, fixtures.RobotAndBeads):
         # unload input
         cli('input', 'unload', 'b')
 
-        # try to load input again
+        # load input again - found under its new name
         cli('input', 'load', 'b')
-        self.assert_not_loaded(robot, 'b')
+        self.assert_loaded(robot, 'b', bead_b)
+        assert 'has been renamed' in robot.stdout
 
+        cli('input', 'unload', 'b')
         cli('input', 'map', 'b', 'c')
-        print(robot.stderr)
         cli('input', 'load', 'b')
         self.assert_loaded(robot, 'b', bead_b)
+        assert 'has been renamed' not in robot.stdout
 
 
 def _copy(box, bead_name, bead_freeze_time, new_name):
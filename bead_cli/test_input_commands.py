@@ -1,7 +1,11 @@
-from bead.test import TestCase
+from bead.test import TestCase, setenv
 
 import os
+from unittest import mock
+from bead.inputstore import STORE_ENV_VAR
+from bead import verification
 from bead.workspace import Workspace
+from bead.ziparchive import ZipArchive
 from . import test_fixtures as fixtures
 
 
@@ -69,6 +73,29 @@ class Test_input_commands(TestCase, fixtures.RobotAndBeads):
         assert 'input_a' in robot.stderr
         assert 'input_b' in robot.stderr
 
+    def test_load_renamed_bead(self, robot, box, bead_with_inputs, bead_a):
+        robot.cli('develop', bead_with_inputs)
+        robot.cd(bead_with_inputs)
+        os.rename(
+            box.directory / f'{bead_a}_{fixtures.TS1}.zip',
+            box.directory / f'renamed_{fixtures.TS1}.zip')
+        robot.cli('input', 'load', 'input_a')
+        self.assert_loaded(robot, 'input_a', bead_a)
+        assert 'renamed' in robot.stdout
+
+    def test_repeated_load_does_not_verify_again(self, robot, bead_a):
+        robot.cli('new', 'test-workspace')
+        robot.cd('test-workspace')
+        robot.cli('input', 'add', bead_a)
+        robot.cli('input', 'unload', bead_a)
+        with mock.patch('bead.ziparchive.ZipArchive.validate') as validate:
+            with mock.patch.object(
+                ZipArchive, 'extract_dir', autospec=True, side_effect=ZipArchive.extract_dir
+            ) as extract_dir:
+                robot.cli('input', 'load', bead_a)
+        validate.assert_not_called()
+        assert not extract_dir.call_args.kwargs['verify']
+
     def test_load_only_one_input(self, robot, bead_with_inputs, bead_a):
         robot.cli('develop', bead_with_inputs)
         robot.cd(bead_with_inputs)
@@ -85,6 +112,45 @@ class Test_input_commands(TestCase, fixtures.RobotAndBeads):
         robot.cd(bead_with_inputs)
         robot.cli('input', 'load')
 
+    def test_load_through_input_store(self, robot, bead_a):
+        store_dir = self.new_temp_dir()
+        robot.cli('new', 'test-workspace')
+        robot.cd('test-workspace')
+        with setenv(STORE_ENV_VAR, store_dir):
+            robot.cli('input', 'add', bead_a)
+        self.assert_loaded(robot, bead_a, bead_a)
+        # linked from the store
+        assert 2 == os.stat(robot.cwd / f'input/{bead_a}/README').st_nlink
+
+    def test_selective_load(self, robot, bead_a):
+        robot.cli('new', 'test-workspace')
+        robot.cd('test-workspace')
+        robot.cli('input', 'add', bead_a, '--exclude', 'READ*')
+        self.assert_not_loaded(robot, bead_a)
+        assert os.path.isdir(robot.cwd / f'input/{bead_a}')
+
+        # patterns are remembered
+        robot.cli('input', 'unload')
+        robot.cli('input', 'load')
+        self.assert_not_loaded(robot, bead_a)
+
+        robot.cli('input', 'load', bead_a, '--exclude', 'x', '--include', '*')
+        self.assert_loaded(robot, bead_a, bead_a)
+
+    def test_load_with_crc_verification(self, robot, bead_a):
+        robot.cli('new', 'test-workspace')
+        robot.cd('test-workspace')
+        robot.cli('input', 'add', bead_a, '--verify', verification.CRC)
+        self.assert_loaded(robot, bead_a, bead_a)
+        assert f'OK ({verification.CRC}:' in robot.stdout
+
+    def test_unknown_verification_level_in_environment(self, robot, bead_a):
+        robot.cli('new', 'test-workspace')
+        robot.cd('test-workspace')
+        with setenv(verification.LEVEL_ENV_VAR, 'sha1'):
+            self.assertRaises(SystemExit, robot.cli, 'input', 'add', bead_a)
+        assert verification.LEVEL_ENV_VAR in robot.stderr
+
     def test_add_with_unrecognized_bead_name_exits_with_error(self, robot, bead_a):
         robot.cli('develop', bead_a)
         robot.cd(bead_a)
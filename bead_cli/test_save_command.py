@@ -1,6 +1,7 @@
 import os
+from unittest import mock
 
-from bead.test import TestCase, skipIf
+from bead.test import TestCase, setenv, skipIf
 
 from . import test_fixtures as fixtures
 from bead.workspace import Workspace
@@ -98,3 +99,39 @@ class Test_more_than_one_boxes(TestCase):
             SystemExit,
             robot.cli, 'save', 'unknown-box', '--workspace', 'bead')
         assert 'ERROR' in robot.stderr
+
+
+class Test_compression(TestCase, fixtures.RobotAndBeads):
+
+    def test_verbose_save_reports_compression(self, robot, box):
+        robot.cli('new', 'bead')
+        robot.cd('bead')
+        robot.write_file('output/data.csv', 'a,b,c\n' * 1000)
+        robot.cli('save', '--verbose')
+        assert 'Compression:' in robot.stdout
+        assert 'deflated' in robot.stdout
+
+    def test_verbose_save_without_compression_stats(self, robot, box):
+        robot.cli('new', 'bead')
+        robot.cd('bead')
+        with mock.patch.object(
+            Workspace, 'compression_stats', new_callable=mock.PropertyMock, return_value=None
+        ):
+            robot.cli('save', '--verbose')
+        assert 'Successfully stored bead' in robot.stdout
+        assert 'Compression:' not in robot.stdout
+
+    def test_unknown_meta_version_in_environment(self, robot, box):
+        robot.cli('new', 'bead')
+        robot.cd('bead')
+        with setenv('BEAD_META_VERSION', 'md5'):
+            self.assertRaises(SystemExit, robot.cli, 'save')
+        assert '$BEAD_META_VERSION' in robot.stderr
+        assert 'blake2b-tree' in robot.stderr
+
+    def test_invalid_compression_config(self, robot, box):
+        robot.cli('new', 'bead')
+        robot.cd('bead')
+        robot.write_file('.bead-meta/compression', '{"method": "zstd"}')
+        self.assertRaises(SystemExit, robot.cli, 'save')
+        assert 'zstd' in robot.stderr
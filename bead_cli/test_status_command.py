@@ -1,3 +1,5 @@
+import os
+
 from bead.test import TestCase
 
 from . import test_fixtures as fixtures
@@ -70,6 +72,40 @@ class Test_status(TestCase, fixtures.RobotAndBeads):
         assert bead_a.freeze_time_str in robot.stdout
         assert bead_a.content_id in robot.stdout
 
+    def test_renamed_input(self, robot, box, bead_with_inputs, bead_a):
+        robot.cli('develop', bead_with_inputs)
+        robot.cd(bead_with_inputs)
+        os.rename(
+            box.directory / f'{bead_a}_{fixtures.TS1}.zip',
+            box.directory / f'renamed_{fixtures.TS1}.zip')
+        robot.cli('status')
+
+        assert 'no candidates :(' not in robot.stdout
+        assert f'-r box # {fixtures.TS1} as renamed' in robot.stdout
+
     def test_invalid_workspace(self, robot):
         robot.cli('status')
         assert 'WARNING' in robot.stderr
+
+    def test_output_changes_since_last_save(self, robot, box):
+        robot.cli('new', 'bead')
+        robot.cd('bead')
+        robot.write_file('output/unchanged', 'unchanged')
+        robot.write_file('output/changed', 'old content')
+        robot.write_file('output/deleted', 'deleted')
+        robot.cli('status')
+        assert 'since last save' not in robot.stdout
+
+        robot.cli('save')
+        robot.cli('status')
+        assert 'No output changes since last save' in robot.stdout
+
+        robot.write_file('output/changed', 'new content')
+        robot.write_file('output/new', 'new')
+        os.remove(robot.cwd / 'output/deleted')
+        robot.cli('status')
+        assert 'Output changes since last save' in robot.stdout
+        assert 'new:      output/new' in robot.stdout
+        assert 'changed:  output/changed' in robot.stdout
+        assert 'deleted:  output/deleted' in robot.stdout
+        assert 'unchanged' not in robot.stdout
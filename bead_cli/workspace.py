@@ -2,7 +2,10 @@ from bead.exceptions import InvalidArchive
 import os
 import sys
 
+from bead import compression
 from bead import tech
+from bead import zipcreator
+from bead.box import UnionBox
 from bead.workspace import Workspace
 from bead import layouts
 import bead.spec as bead_spec
@@ -10,7 +13,7 @@ import bead.spec as bead_spec
 from .cmdparse import Command
 from .common import assert_valid_workspace, die, warning
 from .common import DefaultArgSentinel
-from .common import OPTIONAL_WORKSPACE, OPTIONAL_ENV
+from .common import OPTIONAL_WORKSPACE, OPTIONAL_ENV, VERIFICATION, get_verification
 from .common import BEAD_REF_BASE, BEAD_TIME, resolve_bead
 from .common import verify_with_feedback
 from . import arg_metavar
@@ -78,12 +81,15 @@ class CmdSave(Command):
             metavar=arg_metavar.BOX, help=arg_help.BOX)
         arg(OPTIONAL_WORKSPACE)
         arg(OPTIONAL_ENV)
+        arg('-v', '--verbose', default=False, action='store_true',
+            help='show compression statistics')
 
     def run(self, args):
         box_name = args.box_name
         workspace = args.workspace
         env = args.get_env()
         assert_valid_workspace(workspace)
+        assert_valid_save_settings(workspace)
         # XXX: (usability) save - support saving directly to a directory outside of workspace
         if box_name is USE_THE_ONLY_BOX:
             boxes = env.get_boxes()
@@ -109,6 +115,33 @@ class CmdSave(Command):
                 die(f'Unknown box: {box_name}')
         location = box.store(workspace, timestamp())
         print(f'Successfully stored bead at {location}.')
+        if args.verbose:
+            stats = workspace.compression_stats
+            if stats is not None:
+                print_compression_stats(stats)
+
+
+def assert_valid_save_settings(workspace):
+    try:
+        compression.workspace_policy(workspace)
+    except ValueError as e:
+        die(f'Invalid compression settings: {e}')
+    try:
+        zipcreator.meta_version_for_new_archives()
+    except ValueError as e:
+        die(str(e))
+
+
+def print_compression_stats(stats):
+    print('Compression:')
+    for spec, method_stats in sorted(stats.by_method.items()):
+        files = method_stats[compression.FILES]
+        bytes_in = method_stats[compression.BYTES_IN]
+        bytes_out = method_stats[compression.BYTES_OUT]
+        seconds = method_stats[compression.SECONDS]
+        print(
+            f'\t{spec:<12} {files} files, {bytes_in} -> {bytes_out} bytes'
+            f' (saved {bytes_in - bytes_out}), {seconds:.2f}s')
 
 
 DERIVE_FROM_BEAD_NAME = DefaultArgSentinel('derive one from bead name')
@@ -130,6 +163,7 @@ class CmdDevelop(Command):
             default=False, action='store_true',
             help='Extract output data as well (normally it is not needed!).')
         arg(OPTIONAL_ENV)
+        arg(VERIFICATION)
 
     def run(self, args):
         extract_output = args.extract_output
@@ -138,8 +172,14 @@ class CmdDevelop(Command):
             bead = resolve_bead(env, args.bead_ref_base, args.bead_time)
         except LookupError:
             die('Bead not found!')
+        verification = get_verification(args)
+        # only the members being extracted are verified
+        if extract_output:
+            zip_dirs = (layouts.Archive.CODE, layouts.Archive.DATA)
+        else:
+            zip_dirs = (layouts.Archive.CODE,)
         try:
-            verify_with_feedback(bead)
+            verify_with_feedback(bead, verification, zip_dirs=zip_dirs)
         except InvalidArchive:
             die('Bead is damaged')
         if args.workspace is DERIVE_FROM_BEAD_NAME:
@@ -155,7 +195,7 @@ class CmdDevelop(Command):
 
         if extract_output:
             output_directory = workspace.directory / layouts.Workspace.OUTPUT
-            bead.unpack_data_to(output_directory)
+            bead.unpack_data_to(output_directory, jobs=verification.jobs)
 
         print(f'Extracted source into {workspace.directory}')
         # XXX: try to load smaller inputs?
@@ -186,21 +226,7 @@ def print_inputs(env, workspace, verbose):
                 print(f'\tKind:        {input.kind}')
                 print(f'\tContent id:  {input.content_id}')
             print('\tBox[es]:')
-            has_box = False
-            for box in boxes:
-                try:
-                    context = box.get_context(
-                        bead_spec.BEAD_NAME, input_bead_name, input.freeze_time)
-                except LookupError:
-                    # not in this box
-                    continue
-                bead = context.best
-                has_box = True
-                exact_match = bead.content_id == input.content_id
-                print(f'\t {"*" if exact_match else "?"} -r {box.name} # {bead.freeze_time_str}')
-            if not has_box:
-                print('\t - no candidates :(')
-                print('\t   Maybe it has been renamed? or is it in an unreachable box?')
+            print_input_boxes(boxes, input, input_bead_name)
             is_not_first_input = True
 
         print('')
@@ -211,9 +237,49 @@ def print_inputs(env, workspace, verbose):
         print('No inputs defined')
 
 
+def print_input_boxes(boxes, input, input_bead_name):
+    has_box = False
+    for box in boxes:
+        try:
+            context = box.get_context(
+                bead_spec.BEAD_NAME, input_bead_name, input.freeze_time)
+        except LookupError:
+            # not in this box
+            continue
+        bead = context.best
+        has_box = True
+        exact_match = bead.content_id == input.content_id
+        print(f'\t {"*" if exact_match else "?"} -r {box.name} # {bead.freeze_time_str}')
+    if not has_box:
+        renamed = list(UnionBox(boxes).find_by_content_id(input.content_id))
+        for bead in renamed:
+            print(f'\t * -r {bead.box_name} # {bead.freeze_time_str} as {bead.name}')
+        if not renamed:
+            print('\t - no candidates :(')
+            print('\t   Maybe it has been renamed? or is it in an unreachable box?')
+
+
+def print_output_changes(workspace):
+    changes = workspace.output_changes()
+    if changes is None:
+        # never saved
+        return
+    if changes:
+        print('Output changes since last save:')
+        for label, paths in (
+                ('new', changes.new),
+                ('changed', changes.changed),
+                ('deleted', changes.deleted)):
+            for path in paths:
+                print(f'\t{label + ":":<9} {path}')
+    else:
+        print('No output changes since last save')
+    print()
+
+
 class CmdStatus(Command):
     '''
-    Show workspace status - name of bead, inputs and their unpack status.
+    Show workspace status - name of bead, changed outputs, inputs and their unpack status.
     '''
 
     def declare(self, arg):
@@ -232,6 +298,7 @@ class CmdStatus(Command):
             if kind_needed:
                 print(f'Bead kind: {workspace.kind}')
             print()
+            print_output_changes(workspace)
             print_inputs(env, workspace, verbose)
         else:
             warning(f'Invalid workspace ({workspace.directory})')